@@ -0,0 +1,341 @@
+########
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Micro-benchmarks of the plugin CPU hot paths with regression gates.
+
+Timings are normalized by a pure python calibration loop, so baselines
+stored in ``benchmarks/baselines.json`` are comparable between machines.
+
+Usage:
+
+    python -m benchmarks.bench_hot_paths            # report
+    python -m benchmarks.bench_hot_paths --check    # fail on regressions
+    python -m benchmarks.bench_hot_paths --update   # store new baselines
+"""
+
+import os
+import sys
+import json
+import timeit
+import argparse
+import collections
+
+import kubernetes
+from mock import MagicMock
+
+from cloudify.mocks import MockCloudifyContext
+from cloudify.state import current_ctx
+
+from cloudify_kubernetes.k8s import (CloudifyKubernetesClient,
+                                     KubernetesResourceDefinition,
+                                     get_mapping)
+# cloudify_importer hack used by tasks requires the k8s package to be
+# already imported
+import cloudify_kubernetes.tasks as tasks
+from cloudify_kubernetes.workflows import merge_definitions
+
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), 'baselines.json')
+DEFAULT_THRESHOLD = 0.5
+REPEAT = 9
+MIN_DURATION = 0.2
+# Slower measurements of regressed path are repeated, regression is
+# reported only when all of them exceed threshold
+RECHECKS = 2
+
+# Absolute slowdown (normalized) below which path never regresses, noise
+# of sub-microsecond paths easily exceeds relative threshold
+DEFAULT_ABSOLUTE_FLOOR = 0.002
+ABSOLUTE_FLOORS = {
+    'get_mapping': 0.001,
+    'resource_definition_small_pod': 0.002,
+    'resource_definition_large_deployment': 0.002,
+}
+
+
+class _Response(object):
+
+    def __init__(self, data):
+        self.data = data
+
+
+def _calibration():
+    total = 0
+    for i in range(10000):
+        total += i % 7
+    return total
+
+
+def small_pod():
+    return {
+        'apiVersion': 'v1',
+        'kind': 'Pod',
+        'metadata': {'name': 'nginx', 'namespace': 'default',
+                     'labels': {'app': 'nginx'}},
+        'spec': {
+            'containers': [{
+                'name': 'nginx',
+                'image': 'nginx:1.13',
+                'ports': [{'containerPort': 80}]
+            }]
+        },
+        'status': {'phase': 'Running'}
+    }
+
+
+def large_deployment(containers=500):
+    return {
+        'apiVersion': 'extensions/v1beta1',
+        'kind': 'Deployment',
+        'metadata': {'name': 'large', 'namespace': 'default',
+                     'generation': 1, 'labels': {'app': 'large'}},
+        'spec': {
+            'replicas': 3,
+            'template': {
+                'metadata': {'labels': {'app': 'large'}},
+                'spec': {
+                    'containers': [{
+                        'name': 'container-{0}'.format(index),
+                        'image': 'registry/image-{0}:1.0'.format(index),
+                        'args': ['--port', str(8000 + index)],
+                        'env': [{'name': 'VARIABLE_{0}'.format(env),
+                                 'value': str(env)} for env in range(5)],
+                        'ports': [{'containerPort': 8000 + index}],
+                        'resources': {
+                            'limits': {'cpu': '100m', 'memory': '64Mi'},
+                            'requests': {'cpu': '50m', 'memory': '32Mi'}
+                        }
+                    } for index in range(containers)]
+                }
+            }
+        },
+        'status': {
+            'observedGeneration': 1,
+            'replicas': 3,
+            'updatedReplicas': 3,
+            'readyReplicas': 3,
+            'availableReplicas': 3,
+            'conditions': [{
+                'type': 'Available', 'status': 'True',
+                'reason': 'MinimumReplicasAvailable',
+                'lastUpdateTime': '2017-01-01T00:00:00Z'
+            }]
+        }
+    }
+
+
+def large_configmap(size=5 * 1024 * 1024, keys=500):
+    value = 'x' * (size // keys)
+    return {
+        'apiVersion': 'v1',
+        'kind': 'ConfigMap',
+        'metadata': {'name': 'large', 'namespace': 'default'},
+        'data': {'key-{0}'.format(index): value for index in range(keys)}
+    }
+
+
+def _model(api_client, data, model):
+    return api_client.deserialize(_Response(json.dumps(data)), model)
+
+
+def _definition(data):
+    return {k: v for k, v in data.items() if k != 'status'}
+
+
+def _snake_case_status(model):
+    return tasks.JsonCleanuper(model).to_dict()
+
+
+def hot_paths():
+    """Return ordered mapping of benchmark name to callable."""
+
+    api_client = kubernetes.client.ApiClient()
+    pod, deployment, configmap = \
+        small_pod(), large_deployment(), large_configmap()
+
+    pod_model = _model(api_client, pod, 'V1Pod')
+    deployment_model = _model(
+        api_client, deployment, 'ExtensionsV1beta1Deployment')
+    configmap_model = _model(api_client, configmap, 'V1ConfigMap')
+
+    pod_changes = {'metadata': {'labels': {'tier': 'web'}},
+                   'spec': {'containers': [{'name': 'nginx',
+                                            'image': 'nginx:1.14'}]}}
+    deployment_changes = {'spec': {'replicas': 5, 'template': {
+        'metadata': {'labels': {'version': '2'}}}}}
+
+    api_configuration = MagicMock()
+    api_configuration.prepare_api = MagicMock(return_value=kubernetes.client)
+    client = CloudifyKubernetesClient(MagicMock(), api_configuration)
+
+    pod_definition = KubernetesResourceDefinition(**_definition(pod))
+    deployment_definition = KubernetesResourceDefinition(
+        **_definition(deployment))
+
+    pod_status = _snake_case_status(pod_model)
+    deployment_status = _snake_case_status(deployment_model)
+
+    benchmarks = collections.OrderedDict()
+    benchmarks['json_cleanuper_small_pod'] = \
+        lambda: tasks.JsonCleanuper(pod_model).to_dict()
+    benchmarks['json_cleanuper_large_deployment'] = \
+        lambda: tasks.JsonCleanuper(deployment_model).to_dict()
+    benchmarks['json_cleanuper_large_configmap'] = \
+        lambda: tasks.JsonCleanuper(configmap_model).to_dict()
+    benchmarks['merge_definitions_small_pod'] = \
+        lambda: merge_definitions(_definition(pod), pod_changes)
+    benchmarks['merge_definitions_large_deployment'] = \
+        lambda: merge_definitions(_definition(deployment), deployment_changes)
+    benchmarks['resource_definition_small_pod'] = \
+        lambda: KubernetesResourceDefinition(**_definition(pod))
+    benchmarks['resource_definition_large_deployment'] = \
+        lambda: KubernetesResourceDefinition(**_definition(deployment))
+    benchmarks['get_mapping'] = lambda: get_mapping('Deployment')
+    benchmarks['prepare_payload_small_pod'] = \
+        lambda: client._prepare_payload('V1Pod', pod_definition)
+    benchmarks['prepare_payload_large_deployment'] = \
+        lambda: client._prepare_payload(
+            'AppsV1beta1Deployment', deployment_definition)
+    benchmarks['status_check_pod'] = \
+        lambda: tasks._do_resource_status_check('Pod', pod_status)
+    benchmarks['status_check_large_deployment'] = \
+        lambda: tasks._do_resource_status_check(
+            'Deployment', deployment_status)
+    return benchmarks
+
+
+def measure(function):
+    """Return median time of single call in seconds."""
+    timer = timeit.Timer(function)
+    number = 1
+    duration = timer.timeit(number)
+    while duration < MIN_DURATION / 10 and number < 10 ** 6:
+        number *= 10
+        duration = timer.timeit(number)
+    # each repeat takes about MIN_DURATION
+    number = max(number, int(number * MIN_DURATION / duration))
+    timings = sorted(timer.repeat(REPEAT, number))
+    return timings[len(timings) // 2] / number
+
+
+def measure_normalized(function):
+    duration = measure(function)
+    return duration / min(measure(_calibration), measure(_calibration))
+
+
+def is_regression(name, normalized, baseline, threshold):
+    if not baseline:
+        return False
+    return normalized > baseline * (1 + threshold) and \
+        normalized - baseline > ABSOLUTE_FLOORS.get(
+            name, DEFAULT_ABSOLUTE_FLOOR)
+
+
+def run(baselines=None, threshold=DEFAULT_THRESHOLD):
+    baselines = baselines or {}
+    _ctx = MockCloudifyContext(node_id='benchmark', node_name='benchmark')
+    _ctx.logger.setLevel('ERROR')
+    current_ctx.set(_ctx)
+    try:
+        results = collections.OrderedDict()
+        benchmarks = hot_paths()
+        calibration = measure(_calibration)
+        for name, function in benchmarks.items():
+            duration = measure(function)
+            # calibrate around each hot path, so CPU frequency changes
+            # during the run do not skew results
+            next_calibration = measure(_calibration)
+            results[name] = duration / min(calibration, next_calibration)
+            calibration = next_calibration
+
+        # single slow measurement is usually noise of other processes
+        for name in results:
+            for _ in range(RECHECKS):
+                if not is_regression(name, results[name],
+                                     baselines.get(name), threshold):
+                    break
+                results[name] = min(results[name],
+                                    measure_normalized(benchmarks[name]))
+        return results
+    finally:
+        current_ctx.clear()
+
+
+def load_baselines(path):
+    if not os.path.isfile(path):
+        return {}
+    with open(path) as baselines_file:
+        return json.load(baselines_file)
+
+
+def save_baselines(path, results):
+    with open(path, 'w') as baselines_file:
+        json.dump(
+            collections.OrderedDict(
+                (name, round(normalized, 6))
+                for name, normalized in results.items()),
+            baselines_file, indent=2, separators=(',', ': '))
+        baselines_file.write('\n')
+
+
+def report(results, baselines, threshold):
+    """Print results and return names of regressed hot paths."""
+    regressions = []
+    header = '{0:<40} {1:>12} {2:>10} {3:>8}'
+    row = '{0:<40} {1:>12.4f} {2:>10} {3:>8}'
+    print(header.format('hot path', 'normalized', 'baseline', 'status'))
+
+    for name, normalized in results.items():
+        baseline = baselines.get(name)
+        status = 'new'
+        if baseline:
+            status = 'ok'
+            if is_regression(name, normalized, baseline, threshold):
+                status = 'SLOWER'
+                regressions.append(name)
+            elif normalized < baseline / (1 + threshold):
+                status = 'faster'
+        print(row.format(name, normalized,
+                         '{0:.4f}'.format(baseline) if baseline else '-',
+                         status))
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--baselines', default=BASELINES_PATH)
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Allowed slowdown relative to baseline '
+                             '(0.5 means 50%%)')
+    parser.add_argument('--check', action='store_true',
+                        help='Exit with error if any hot path regressed')
+    parser.add_argument('--update', action='store_true',
+                        help='Store results as new baselines')
+    args = parser.parse_args()
+
+    baselines = load_baselines(args.baselines)
+    results = run(baselines, args.threshold)
+    regressions = report(results, baselines, args.threshold)
+
+    if args.update:
+        save_baselines(args.baselines, results)
+        print('Baselines saved to {0}'.format(args.baselines))
+    elif args.check and regressions:
+        print('Regressed hot paths: {0}'.format(', '.join(regressions)))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
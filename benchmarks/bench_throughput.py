@@ -0,0 +1,209 @@
+########
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""End-to-end throughput benchmark of plugin operations.
+
+Operations are executed through ``MockCloudifyContext`` against the
+in-memory fake Kubernetes API server, so real client, serialization and
+HTTP costs are measured without a cluster.
+
+Usage:
+
+    python -m benchmarks.bench_throughput --iterations 100 --latency 0.001
+"""
+
+import time
+import argparse
+import collections
+
+from cloudify.exceptions import OperationRetry, RecoverableError
+from cloudify.state import current_ctx
+
+from cloudify_kubernetes.tests.fake_api_server import (
+    FakeKubernetesApiServer,
+    FakeOperationContext
+)
+# cloudify_importer hack used by tasks requires the k8s package to be
+# already imported
+import cloudify_kubernetes.tasks as tasks
+
+MAX_OPERATION_ATTEMPTS = 20
+
+FILE_TEMPLATE = """
+apiVersion: v1
+kind: ConfigMap
+metadata:
+  name: {{ name }}
+data:
+  key: {{ value }}
+"""
+
+
+def _pod_definition(name):
+    return {
+        'apiVersion': 'v1',
+        'kind': 'Pod',
+        'metadata': {'name': name, 'labels': {'app': 'benchmark'}},
+        'spec': {
+            'containers': [{
+                'name': 'nginx',
+                'image': 'nginx:1.13',
+                'ports': [{'containerPort': 80}]
+            }]
+        }
+    }
+
+
+class Measurement(object):
+
+    def __init__(self, name):
+        self.name = name
+        self.durations = []
+        self.api_calls = 0
+        self.retries = 0
+
+    def percentile(self, percent):
+        durations = sorted(self.durations)
+        index = int(round(percent / 100.0 * (len(durations) - 1)))
+        return durations[index]
+
+    @property
+    def ops_per_second(self):
+        return len(self.durations) / sum(self.durations)
+
+    @property
+    def api_calls_per_operation(self):
+        return float(self.api_calls) / len(self.durations)
+
+
+class ThroughputBenchmark(object):
+
+    def __init__(self, server, iterations, files):
+        self.server = server
+        self.iterations = iterations
+        self.files = files
+        self.measurements = collections.OrderedDict()
+
+    def _measure(self, name, task, **kwargs):
+        measurement = self.measurements.setdefault(name, Measurement(name))
+        calls_before = len(self.server.calls)
+        start = time.time()
+
+        for _ in range(MAX_OPERATION_ATTEMPTS):
+            try:
+                task(**kwargs)
+                break
+            except (OperationRetry, RecoverableError):
+                # Cloudify would reschedule the task, here it is
+                # repeated at once so only plugin costs are measured.
+                measurement.retries += 1
+
+        measurement.durations.append(time.time() - start)
+        measurement.api_calls += len(self.server.calls) - calls_before
+
+    def _run_resource(self, iteration):
+        _ctx = FakeOperationContext(
+            self.server,
+            node_id='pod_{0}'.format(iteration),
+            properties={
+                'definition': _pod_definition('pod-{0}'.format(iteration)),
+                'options': {'namespace': 'default'}
+            }
+        )
+        current_ctx.set(_ctx)
+        self._measure('resource_create', tasks.resource_create)
+        self._measure('resource_read', tasks.resource_read)
+        self._measure('resource_delete', tasks.resource_delete)
+
+    def _run_multiple_files(self, iteration):
+        templates = {}
+        files = []
+        for index in range(self.files):
+            path = 'configmap-{0}.yaml'.format(index)
+            templates[path] = FILE_TEMPLATE
+            files.append({
+                'resource_path': path,
+                'template_variables': {
+                    'name': 'configmap-{0}-{1}'.format(iteration, index),
+                    'value': index
+                }
+            })
+
+        _ctx = FakeOperationContext(
+            self.server,
+            node_id='files_{0}'.format(iteration),
+            properties={'files': files},
+            templates=templates
+        )
+        current_ctx.set(_ctx)
+        self._measure('multiple_file_resource_create',
+                      tasks.multiple_file_resource_create)
+        self._measure('multiple_file_resource_delete',
+                      tasks.multiple_file_resource_delete)
+        _ctx.cleanup()
+
+    def run(self):
+        try:
+            for iteration in range(self.iterations):
+                self._run_resource(iteration)
+                if self.files:
+                    self._run_multiple_files(iteration)
+        finally:
+            current_ctx.clear()
+        return self.measurements.values()
+
+
+def report(measurements):
+    header = '{0:<32} {1:>6} {2:>10} {3:>9} {4:>9} {5:>10} {6:>8}'
+    row = '{0:<32} {1:>6} {2:>10.1f} {3:>9.2f} {4:>9.2f} {5:>10.2f} {6:>8}'
+    lines = [header.format('operation', 'ops', 'ops/sec', 'p50 ms',
+                           'p99 ms', 'calls/op', 'retries')]
+    for measurement in measurements:
+        lines.append(row.format(
+            measurement.name,
+            len(measurement.durations),
+            measurement.ops_per_second,
+            measurement.percentile(50) * 1000,
+            measurement.percentile(99) * 1000,
+            measurement.api_calls_per_operation,
+            measurement.retries
+        ))
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--iterations', type=int, default=50,
+                        help='Number of resources driven through lifecycle')
+    parser.add_argument('--files', type=int, default=5,
+                        help='Files per multiple-file resource (0 disables)')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='Fake API server latency per request (seconds)')
+    parser.add_argument('--error-rate', type=float, default=0,
+                        help='Probability of injected 500 errors (0..1)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with FakeKubernetesApiServer(latency=args.latency,
+                                 error_rate=args.error_rate,
+                                 seed=args.seed) as server:
+        measurements = ThroughputBenchmark(
+            server, args.iterations, args.files).run()
+
+    print(report(measurements))
+
+
+if __name__ == '__main__':
+    main()
@@ -15,6 +15,8 @@
 #
 
 import sys
+import json
+import hashlib
 from cloudify import ctx
 from cloudify.exceptions import (
     OperationRetry,
@@ -25,7 +27,9 @@ from cloudify.utils import exception_to_error_cause
 from .k8s import (CloudifyKubernetesClient,
                   KubernetesApiAuthenticationVariants,
                   KubernetesApiConfigurationVariants,
+                  resolve_configuration,
                   KuberentesApiInitializationFailedError,
+                  KuberentesApiOperationError,
                   KuberentesInvalidPayloadClassError,
                   KuberentesInvalidApiClassError,
                   KuberentesInvalidApiMethodError,
@@ -34,6 +38,10 @@ from .k8s import (CloudifyKubernetesClient,
 
 NODE_PROPERTY_AUTHENTICATION = 'authentication'
 NODE_PROPERTY_CONFIGURATION = 'configuration'
+NODE_PROPERTY_DAEMON = 'daemon'
+NODE_PROPERTY_KUBECONFIG_CACHE = 'kubeconfig_cache'
+NODE_PROPERTY_RATE_LIMIT = 'rate_limit'
+INSTANCE_RUNTIME_PROPERTY_RESOLVED_CONFIGURATION = 'resolved_configuration'
 RELATIONSHIP_TYPE_MANAGED_BY_MASTER = (
     'cloudify.kubernetes.relationships.managed_by_master'
 )
@@ -45,16 +53,68 @@ def _retrieve_master(resource_instance):
             return relationship.target
 
 
-def _retrieve_property(resource_instance, property_name):
+def _retrieve_master_node(resource_instance):
+    """Node and node instance of Master managing the resource, Master
+    itself in its own operations.
+    """
+
     target = _retrieve_master(resource_instance)
-    configuration = target.node.properties.get(property_name, {})
+    if target is None:
+        return ctx.node, resource_instance
+    return target.node, target.instance
+
+
+def _merge_property(node, instance, property_name):
+    # node properties are not modified
+    configuration = dict(node.properties.get(property_name) or {})
     configuration.update(
-        target.instance.runtime_properties.get(property_name, {})
+        instance.runtime_properties.get(property_name) or {}
     )
 
     return configuration
 
 
+def _retrieve_property(resource_instance, property_name):
+    node, instance = _retrieve_master_node(resource_instance)
+    return _merge_property(node, instance, property_name)
+
+
+def _configuration_digest(configuration):
+    return hashlib.sha256(
+        json.dumps(configuration, sort_keys=True, default=str)).hexdigest()
+
+
+def resolved_configuration(node, instance):
+    """Resolve configuration variant of Master node (properties updated
+    by runtime properties) once, to be stored in its runtime properties.
+    """
+
+    configuration = _merge_property(
+        node, instance, NODE_PROPERTY_CONFIGURATION)
+    return {
+        'digest': _configuration_digest(configuration),
+        'configuration': resolve_configuration(configuration)
+    }
+
+
+def _retrieve_configuration(resource_instance):
+    """Configuration resolved by Master node, unless Master configuration
+    was changed since then.
+    """
+
+    node, instance = _retrieve_master_node(resource_instance)
+    configuration = _merge_property(
+        node, instance, NODE_PROPERTY_CONFIGURATION)
+
+    resolved = instance.runtime_properties.get(
+        INSTANCE_RUNTIME_PROPERTY_RESOLVED_CONFIGURATION)
+    if resolved and \
+            resolved.get('digest') == _configuration_digest(configuration):
+        return resolved['configuration']
+
+    return configuration
+
+
 def resource_task(retrieve_resource_definition, retrieve_mapping):
     def decorator(task, **kwargs):
         def wrapper(**kwargs):
@@ -62,7 +122,7 @@ def resource_task(retrieve_resource_definition, retrieve_mapping):
                 kwargs['resource_definition'] = \
                     retrieve_resource_definition(**kwargs)
                 kwargs['api_mapping'] = retrieve_mapping(**kwargs)
-                task(**kwargs)
+                return task(**kwargs)
             except (KuberentesMappingNotFoundError,
                     KuberentesInvalidPayloadClassError,
                     KuberentesInvalidApiClassError,
@@ -81,6 +141,15 @@ def resource_task(retrieve_resource_definition, retrieve_mapping):
                     '{0}'.format(str(e)),
                     causes=[exception_to_error_cause(exc_value, exc_traceback)]
                 )
+            except KuberentesApiOperationError as e:
+                _, exc_value, exc_traceback = sys.exc_info()
+                # Request rejected as invalid will not succeed on retry
+                error_class = NonRecoverableError \
+                    if e.is_invalid_request else RecoverableError
+                raise error_class(
+                    '{0}'.format(str(e)),
+                    causes=[exception_to_error_cause(exc_value, exc_traceback)]
+                )
             except Exception as e:
                 _, exc_value, exc_traceback = sys.exc_info()
                 raise RecoverableError(
@@ -93,31 +162,46 @@ def resource_task(retrieve_resource_definition, retrieve_mapping):
 
 def with_kubernetes_client(function):
     def wrapper(**kwargs):
-        configuration_property = _retrieve_property(
-            ctx.instance,
-            NODE_PROPERTY_CONFIGURATION
-        )
+        configuration_property = _retrieve_configuration(ctx.instance)
 
         authentication_property = _retrieve_property(
             ctx.instance,
             NODE_PROPERTY_AUTHENTICATION
         )
 
+        rate_limit_property = _retrieve_property(
+            ctx.instance,
+            NODE_PROPERTY_RATE_LIMIT
+        )
+
+        daemon_property = _retrieve_property(
+            ctx.instance,
+            NODE_PROPERTY_DAEMON
+        )
+
         try:
             kwargs['client'] = CloudifyKubernetesClient(
                 ctx.logger,
                 KubernetesApiConfigurationVariants(
                     ctx.logger,
                     configuration_property,
-                    download_resource=ctx.download_resource
+                    download_resource=ctx.download_resource,
+                    blueprint_id=ctx.blueprint.id,
+                    deployment_id=ctx.deployment.id,
+                    # multi-tenant managers only
+                    tenant_name=getattr(ctx, 'tenant_name', None),
+                    kubeconfig_cache=_retrieve_property(
+                        ctx.instance, NODE_PROPERTY_KUBECONFIG_CACHE)
                 ),
                 KubernetesApiAuthenticationVariants(
                     ctx.logger,
                     authentication_property
-                )
+                ),
+                rate_limit=rate_limit_property,
+                daemon=daemon_property
             )
 
-            function(**kwargs)
+            return function(**kwargs)
         except KuberentesApiInitializationFailedError as e:
             _, exc_value, exc_traceback = sys.exc_info()
             raise RecoverableError(
@@ -16,9 +16,16 @@
 from .authentication import KubernetesApiAuthenticationVariants  # noqa
 from .client import (KubernetesResourceDefinition, # noqa
                      CloudifyKubernetesClient) # noqa
-from .config import KubernetesApiConfigurationVariants  # noqa
+from .config import (KubernetesApiConfigurationVariants,  # noqa
+                     connection_descriptor,  # noqa
+                     resolve_configuration)  # noqa
 from .mapping import (get_mapping, # noqa
                       KubernetesApiMapping) # noqa
+from .drift import (definition_drift, # noqa
+                    KubernetesResourceDrift) # noqa
+from .readiness import (evaluate_readiness, # noqa
+                        readiness_evaluator, # noqa
+                        KubernetesResourceReadiness) # noqa
 from .exceptions import (KuberentesError, # noqa
                          KuberentesApiInitializationFailedError,  # noqa
                          KuberentesApiOperationError,  # noqa
@@ -0,0 +1,158 @@
+# #######
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import json
+import stat
+import errno
+import uuid
+import hashlib
+import tempfile
+
+
+DEFAULT_CACHE_DIRECTORY = os.path.join(
+    tempfile.gettempdir(), 'cloudify-kubernetes-cache'
+)
+DEFAULT_CACHE_SIZE = 64 * 1024 * 1024
+
+
+def private_directory(directory):
+    """Create directory accessible only by current user or check that
+    existing one is. Directories in shared temporary directory can be
+    created first by other user (or be symlinks), content of such directory
+    must not be trusted.
+
+    :return: True when directory is safe to use.
+    """
+
+    try:
+        os.makedirs(directory, 0o700)
+    except OSError as e:
+        # created by concurrent operation (or by other user)
+        if e.errno != errno.EEXIST:
+            raise
+
+    directory_stat = os.lstat(directory)
+    return stat.S_ISDIR(directory_stat.st_mode) and \
+        directory_stat.st_uid == os.geteuid() and \
+        stat.S_IMODE(directory_stat.st_mode) == 0o700
+
+
+def materialize_file(path, directory):
+    """Copy file to private directory under name of its content hash, so
+    the copy is shared and does not change while source (e.g. temporary
+    file written by kubeconfig loader) is removed.
+    """
+
+    with open(path, 'rb') as source:
+        content = source.read()
+
+    target = os.path.join(directory, hashlib.sha256(content).hexdigest())
+    if not os.path.isfile(target):
+        temporary_path = os.path.join(
+            directory, '.{0}'.format(uuid.uuid4().hex))
+        descriptor = os.open(temporary_path,
+                             os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(descriptor, 'wb') as temporary_file:
+            temporary_file.write(content)
+        os.rename(temporary_path, target)
+
+    return target
+
+
+def cache_key(*parts):
+    """Content address of entry identified by (JSON serializable) parts."""
+    return hashlib.sha256(
+        json.dumps(parts, sort_keys=True, default=str)).hexdigest()
+
+
+class KubernetesLocalCache(object):
+    """Content-addressed cache in agent local directory, shared by all
+    operation processes, with least recently used entries evicted when
+    total size exceeds ``size`` bytes.
+
+    Entries are written to temporary file and renamed, so concurrent
+    readers never see partial content. Last use is tracked by modification
+    time of entry file. Cache is not ``available`` when its directory is
+    not private to current user.
+    """
+
+    def __init__(self, size=DEFAULT_CACHE_SIZE,
+                 directory=DEFAULT_CACHE_DIRECTORY):
+        self.size = int(size)
+        self.directory = directory
+        # nothing is cached in directory which is not private
+        self.available = private_directory(directory)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        """Content of entry or None when not cached."""
+
+        if not self.available:
+            return None
+
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as entry_file:
+                content = entry_file.read()
+            os.utime(path, None)
+        except (IOError, OSError) as e:
+            # missing or evicted by concurrent operation
+            if e.errno != errno.ENOENT:
+                raise
+            return None
+
+        return content
+
+    def put(self, key, content):
+        if not self.available or len(content) > self.size:
+            return
+
+        descriptor, temporary_path = tempfile.mkstemp(
+            dir=self.directory, prefix='.')
+        try:
+            with os.fdopen(descriptor, 'wb') as entry_file:
+                entry_file.write(content)
+            os.rename(temporary_path, self._path(key))
+        except Exception:
+            os.remove(temporary_path)
+            raise
+
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if name.startswith('.'):
+                continue
+            try:
+                stat = os.stat(self._path(name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+            total += stat.st_size
+
+        for _, size, name in sorted(entries):
+            if total <= self.size:
+                break
+            try:
+                os.remove(self._path(name))
+            except OSError:
+                # evicted by concurrent operation
+                pass
+            total -= size
@@ -13,19 +13,63 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import json
+import math
+import time
 import inspect
 
 from kubernetes.client.rest import ApiException
 from kubernetes.client import V1DeleteOptions
-
-from .exceptions import (KuberentesApiOperationError,
+from kubernetes.watch import Watch
+from urllib3.exceptions import HTTPError
+
+from .daemon import (DEFAULT_DAEMON_DIRECTORY,
+                     DEFAULT_IDLE_TIMEOUT,
+                     KubernetesClientDaemonConnection,
+                     KubernetesDaemonPoolManager)
+from .exceptions import (KuberentesError,
+                         KuberentesApiOperationError,
                          KuberentesInvalidApiClassError,
                          KuberentesInvalidApiMethodError,
                          KuberentesInvalidPayloadClassError)
-from .operations import (KubernetesDeleteOperation,
+from .operations import (KubernetesDeleteCollectionOperation,
+                         KubernetesDeleteOperation,
+                         KubernetesDiscoveryOperation,
+                         KubernetesListOperation,
+                         KubernetesReadMetadataOperation,
                          KubernetesReadOperation,
                          KubernetesUpdateOperation,
                          KubernetesCreateOperation)
+from .ratelimit import KubernetesApiRateLimiter, RETRY_MAX_DELAY
+
+
+RATE_LIMIT_QPS = 'qps'
+RATE_LIMIT_BURST = 'burst'
+RATE_LIMIT_MAX_RETRIES = 'max_retries'
+
+DAEMON_ENABLED = 'enabled'
+DAEMON_IDLE_TIMEOUT = 'idle_timeout'
+DAEMON_DIRECTORY = 'directory'
+
+# Transient errors (429 Too Many Requests, 5xx) are retried inside call
+DEFAULT_MAX_RETRIES = 5
+RETRY_INITIAL_DELAY = 0.5
+
+# Metadata-only representation of any resource, API servers which do not
+# support it fall back to plain JSON
+PARTIAL_OBJECT_METADATA_ACCEPT = \
+    'application/json;as=PartialObjectMetadata;g=meta.k8s.io;v=v1beta1,' \
+    'application/json'
+
+# Server-side apply, body is sent as YAML (JSON is valid YAML)
+APPLY_PATCH_CONTENT_TYPE = 'application/apply-patch+yaml'
+DEFAULT_FIELD_MANAGER = 'cloudify'
+
+
+class _RawResponse(object):
+
+    def __init__(self, data):
+        self.data = data
 
 
 class KubernetesResourceDefinition(object):
@@ -77,15 +121,53 @@ class KubernetesResourceDefinition(object):
 
 class CloudifyKubernetesClient(object):
 
-    def __init__(self, logger, api_configuration, api_authentication=None):
+    def __init__(self, logger, api_configuration, api_authentication=None,
+                 rate_limit=None, daemon=None):
         self.logger = logger
         self.api = api_configuration.prepare_api()
 
         if api_authentication:
             api_authentication.authenticate(self.api)
 
+        rate_limit = rate_limit or {}
+        self.max_retries = rate_limit.get(
+            RATE_LIMIT_MAX_RETRIES, DEFAULT_MAX_RETRIES)
+        self.rate_limiter = None
+        self._metadata_api_client = None
+        self._apply_api_clients = {}
+        if rate_limit.get(RATE_LIMIT_QPS):
+            self.rate_limiter = KubernetesApiRateLimiter(
+                self.host,
+                rate_limit[RATE_LIMIT_QPS],
+                rate_limit.get(RATE_LIMIT_BURST)
+            )
+            if not self.rate_limiter.available:
+                self.logger.warning(
+                    'Rate limiter directory is not private to the agent '
+                    'user, rate limiting is disabled')
+                self.rate_limiter = None
+
+        daemon = daemon or {}
+        self.daemon_connection = None
+        self._api_client = None
+        if daemon.get(DAEMON_ENABLED):
+            self.daemon_connection = KubernetesClientDaemonConnection(
+                self.logger,
+                directory=daemon.get(
+                    DAEMON_DIRECTORY, DEFAULT_DAEMON_DIRECTORY),
+                idle_timeout=daemon.get(
+                    DAEMON_IDLE_TIMEOUT, DEFAULT_IDLE_TIMEOUT)
+            )
+            # shared by all calls, so requests go through the daemon
+            self._api_client = self._new_api_client()
+
         self.logger.info('Kubernetes API initialized successfully')
 
+    @property
+    def host(self):
+        """URL of API server the client talks to."""
+        return self.api.Configuration().host
+
     @property
     def _name(self):
         return self.api.__class__.__name__
@@ -100,9 +182,20 @@ class CloudifyKubernetesClient(object):
             'Class not supported by client {1}'
             .format(class_name, self._name))
 
-    def _prepare_api_method(self, class_name, method_name):
+    def _new_api_client(self, **kwargs):
+        api_client = self.api.ApiClient(**kwargs)
+        if self.daemon_connection:
+            rest_client = api_client.rest_client
+            rest_client.pool_manager = KubernetesDaemonPoolManager(
+                rest_client.pool_manager, self.daemon_connection)
+
+        return api_client
+
+    def _prepare_api_method(self, class_name, method_name, api_client=None):
         if hasattr(self.api, class_name):
-            api = getattr(self.api, class_name)()
+            api_class = getattr(self.api, class_name)
+            api_client = api_client or self._api_client
+            api = api_class(api_client) if api_client else api_class()
 
             if hasattr(api, method_name):
                 method = getattr(api, method_name)
@@ -120,9 +213,10 @@ class CloudifyKubernetesClient(object):
             'supported by client {1}'
             .format(class_name, self._name))
 
-    def _prepare_operation(self, operation, api, method, **kwargs):
+    def _prepare_operation(self, operation, api, method, api_client=None,
+                           **kwargs):
         api_method, api_method_arguments_names = self._prepare_api_method(
-            api, method
+            api, method, api_client
         )
         self.logger.info('Preparing operation with api method: {0} '
                          '(mandatory arguments: {1})'
@@ -148,18 +242,51 @@ class CloudifyKubernetesClient(object):
 
         return None
 
-    def _execute(self, operation, arguments):
-        try:
-            self.logger.info('Executing operation {0}'.format(operation))
-            result = operation.execute(arguments)
-            self.logger.info('Operation executed successfully')
-            self.logger.debug('Result: {0}'.format(result))
+    def _retry_delay(self, error, retry):
+        if error.is_throttled and error.retry_after is not None:
+            return min(error.retry_after, RETRY_MAX_DELAY)
 
-            return result
-        except ApiException as e:
-            raise KuberentesApiOperationError(
-                'Exception during Kubernetes API call: {0}'.format(str(e))
-            )
+        return min(RETRY_INITIAL_DELAY * 2 ** retry, RETRY_MAX_DELAY)
+
+    def _execute(self, operation, arguments):
+        retry = 0
+
+        while True:
+            if self.rate_limiter:
+                delay = self.rate_limiter.acquire()
+                if delay:
+                    self.logger.debug(
+                        'Request delayed by rate limiter for {0:.2f} '
+                        'seconds'.format(delay))
+
+            try:
+                self.logger.info('Executing operation {0}'.format(operation))
+                result = operation.execute(arguments)
+                self.logger.info('Operation executed successfully')
+                self.logger.debug('Result: {0}'.format(result))
+
+                return result
+            except ApiException as e:
+                error = KuberentesApiOperationError.from_api_exception(
+                    'Exception during Kubernetes API call: ', e)
+            except KuberentesApiOperationError as e:
+                error = e
+
+            if not error.is_transient or retry >= self.max_retries:
+                raise error
+
+            delay = self._retry_delay(error, retry)
+            retry += 1
+            self.logger.warn(
+                'Kubernetes API request failed with status {0} ({1}), '
+                'retrying in {2} seconds ({3}/{4})'.format(
+                    error.status, error.reason, delay, retry,
+                    self.max_retries))
+
+            if self.rate_limiter and error.is_throttled:
+                self.rate_limiter.block(delay)
+            else:
+                time.sleep(delay)
 
     def create_resource(self, mapping, resource_definition, options):
         options['body'] = self._prepare_payload(
@@ -177,6 +304,227 @@ class CloudifyKubernetesClient(object):
             KubernetesReadOperation, **vars(mapping.read)
         ), options)
 
+    def _prepare_metadata_api_client(self):
+        if self._metadata_api_client is None:
+            # kept for client lifetime, its thread pool is costly to create
+            self._metadata_api_client = self._new_api_client(
+                header_name='Accept',
+                header_value=PARTIAL_OBJECT_METADATA_ACCEPT)
+
+        return self._metadata_api_client
+
+    def _read_raw_response(self, response):
+        try:
+            return json.loads(response.data)
+        finally:
+            response.release_conn()
+
+    def _deserialize_metadata(self, resource):
+        return self._metadata_api_client.deserialize(
+            _RawResponse(json.dumps(resource.get('metadata') or {})),
+            'V1ObjectMeta')
+
+    def _discover(self, api, method):
+        return self._read_raw_response(self._execute(
+            self._prepare_operation(
+                KubernetesDiscoveryOperation, api, method),
+            {'_preload_content': False}))
+
+    def discover(self):
+        """Server version and preferred versions of API groups. Responses
+        are read as raw JSON, so fields unknown to client models (or
+        missing in newer API servers) do not matter.
+        """
+
+        try:
+            version = self._discover('VersionApi', 'get_code')
+            api_versions = list(self._discover(
+                'CoreApi', 'get_api_versions').get('versions') or [])
+            groups = self._discover(
+                'ApisApi', 'get_api_versions').get('groups') or []
+        except (HTTPError, ValueError) as e:
+            raise KuberentesError('Cannot connect to Kubernetes API {0}: {1}'
+                                  .format(self.host, e))
+
+        for group in groups:
+            preferred_version = group.get('preferredVersion') or {}
+            if preferred_version.get('groupVersion'):
+                api_versions.append(preferred_version['groupVersion'])
+
+        return {
+            'server_version': version.get('gitVersion'),
+            'api_versions': sorted(api_versions)
+        }
+
+    def _collection_method(self, method, prefix):
+        """Name of collection method for read / delete method of single
+        resource, e.g. ``read_namespaced_pod`` -> ``list_namespaced_pod``.
+        """
+
+        return prefix + method.split('_', 1)[1]
+
+    def read_resource_raw(self, mapping, resource_id, options):
+        """Read resource as dictionary in API server JSON format (not
+        deserialized into model), comparable with blueprint definitions.
+        """
+
+        options['name'] = resource_id
+        options['_preload_content'] = False
+        return self._read_raw_response(self._execute(
+            self._prepare_operation(
+                KubernetesReadMetadataOperation, **vars(mapping.read)
+            ), options))
+
+    def read_resource_metadata(self, mapping, resource_id, options):
+        """Read only metadata of resource (``V1ObjectMeta``), which is much
+        cheaper than whole object for existence and version checks of big
+        resources. Whole object returned by older API servers is reduced
+        to its metadata.
+        """
+
+        options['name'] = resource_id
+        options['_preload_content'] = False
+        resource = self._read_raw_response(self._execute(
+            self._prepare_operation(
+                KubernetesReadMetadataOperation,
+                api_client=self._prepare_metadata_api_client(),
+                **vars(mapping.read)
+            ), options))
+
+        if resource.get('kind') != 'PartialObjectMetadata':
+            self.logger.debug(
+                'PartialObjectMetadata not supported by API server')
+
+        return self._deserialize_metadata(resource)
+
+    def _list_raw(self, mapping, options, api_client=None):
+        options['_preload_content'] = False
+        return self._read_raw_response(self._execute(
+            self._prepare_operation(
+                KubernetesListOperation,
+                mapping.read.api,
+                self._collection_method(mapping.read.method, 'list_'),
+                api_client=api_client
+            ), options)).get('items') or []
+
+    def list_resources(self, mapping, options):
+        """List resources matching ``label_selector`` / ``field_selector``
+        options as dictionaries in API server JSON format (not deserialized
+        into models).
+        """
+
+        return self._list_raw(mapping, options)
+
+    def list_resources_metadata(self, mapping, options):
+        """List metadata (``V1ObjectMeta``) of resources matching
+        ``label_selector`` / ``field_selector`` options.
+        """
+
+        return [
+            self._deserialize_metadata(resource)
+            for resource in self._list_raw(
+                mapping, options, self._prepare_metadata_api_client())
+        ]
+
+    def delete_resource_collection(self, mapping, options):
+        """Delete all resources matching ``label_selector`` option by single
+        request. ``KuberentesInvalidApiMethodError`` is raised for kinds
+        which do not support it (e.g. Service).
+        """
+
+        return self._execute(self._prepare_operation(
+            KubernetesDeleteCollectionOperation,
+            mapping.delete.api,
+            self._collection_method(mapping.delete.method,
+                                    'delete_collection_')
+        ), options)
+
+    def watch_resource(self, mapping, resource_id, options, timeout):
+        """Yield new states of resource (objects of ``ADDED`` and
+        ``MODIFIED`` events) streamed by single watch request, for at most
+        ``timeout`` seconds. Current state is reported first.
+        """
+
+        api_method, api_method_arguments_names = self._prepare_api_method(
+            mapping.read.api,
+            self._collection_method(mapping.read.method, 'list_')
+        )
+        arguments = {k: v for k, v in options.items()
+                     if k in api_method_arguments_names}
+
+        if self.rate_limiter:
+            self.rate_limiter.acquire()
+
+        self.logger.debug('Watching {0} for up to {1} seconds'.format(
+            resource_id, timeout))
+        try:
+            for event in Watch().stream(
+                    api_method,
+                    field_selector='metadata.name={0}'.format(resource_id),
+                    timeout_seconds=int(math.ceil(timeout)),
+                    **arguments):
+                if event['type'] == 'ERROR':
+                    status = event['raw_object']
+                    raise KuberentesApiOperationError(
+                        'Watch failed: {0}'.format(status.get('message')),
+                        status=status.get('code'),
+                        reason=status.get('reason'))
+
+                if event['type'] in ('ADDED', 'MODIFIED'):
+                    yield event['object']
+        except ApiException as e:
+            raise KuberentesApiOperationError.from_api_exception(
+                'Exception during Kubernetes API watch: ', e)
+        except (HTTPError, ValueError) as e:
+            raise KuberentesError(
+                'Watch of {0} interrupted: {1}'.format(resource_id, e))
+
+    def _prepare_apply_api_client(self, field_manager, force):
+        key = (field_manager, force)
+        if key not in self._apply_api_clients:
+            # default header overrides content type selected by patch method
+            api_client = self._new_api_client(
+                header_name='Content-Type',
+                header_value=APPLY_PATCH_CONTENT_TYPE)
+
+            # apply parameters are not known to patch methods of the client,
+            # REST client is wrapped as api client closing its thread pool
+            # on __del__ must not be part of reference cycle
+            apply_params = [('fieldManager', field_manager),
+                            ('force', 'true' if force else 'false')]
+            rest_client = api_client.rest_client
+            patch = rest_client.PATCH
+
+            def _patch(url, query_params=None, **kwargs):
+                return patch(url,
+                             query_params=list(query_params or []) +
+                             apply_params,
+                             **kwargs)
+
+            rest_client.PATCH = _patch
+            self._apply_api_clients[key] = api_client
+
+        return self._apply_api_clients[key]
+
+    def apply_resource(self, mapping, resource_definition, options,
+                       field_manager=DEFAULT_FIELD_MANAGER, force=True):
+        """Server-side apply of resource definition, resource is created
+        when it does not exist. Only declared fields are sent, the server
+        computes the change, fields owned by other managers (e.g.
+        controllers) are kept. With ``force`` conflicting fields are taken
+        over from their managers.
+        """
+
+        api_client = self._prepare_apply_api_client(field_manager, force)
+        options['body'] = json.dumps(api_client.sanitize_for_serialization(
+            self._prepare_payload(mapping.create.payload, resource_definition)
+        ))
+        options['name'] = resource_definition.metadata['name']
+        return self._execute(self._prepare_operation(
+            KubernetesUpdateOperation, api_client=api_client,
+            **vars(mapping.update)
+        ), options)
+
     def update_resource(self, mapping, resource_definition, options):
         options['body'] = self._prepare_payload(
             mapping.create.payload, resource_definition
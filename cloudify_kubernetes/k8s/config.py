@@ -14,14 +14,29 @@
 # limitations under the License.
 
 import kubernetes
+import hashlib
+import tempfile
+import yaml
 import os
 
 from kubernetes.config.kube_config import KUBE_CONFIG_DEFAULT_LOCATION
 from kubernetes.client import Configuration
+from .cache import (cache_key,
+                    materialize_file,
+                    private_directory,
+                    DEFAULT_CACHE_DIRECTORY,
+                    KubernetesLocalCache)
 from .exceptions import KuberentesApiInitializationFailedError
 
 
+DEFAULT_CERTIFICATES_DIRECTORY = os.path.join(
+    tempfile.gettempdir(), 'cloudify-kubernetes-certificates'
+)
+
+
 class KubernetesApiConfiguration(object):
+    # key of configuration data selecting the variant
+    CONFIGURATION_KEY = None
 
     def __init__(self, logger, configuration_data, **kwargs):
         self.logger = logger
@@ -42,9 +57,115 @@ class KubernetesApiConfiguration(object):
 
         return api
 
+    @classmethod
+    def normalize(cls, value):
+        """Settings of the variant stored in resolved configuration."""
+        return value
+
+
+class ConnectionConfiguration(KubernetesApiConfiguration):
+    """Connection descriptor resolved by Master node (see
+    ``connection_descriptor``), used without any download or parsing of
+    kubeconfig. Not usable when its certificate files are missing on this
+    agent, the next variant is used then.
+    """
+
+    CONNECTION_KEY = 'connection'
+    CONFIGURATION_KEY = CONNECTION_KEY
+    CONNECTION_FILES = ('ssl_ca_cert', 'cert_file', 'key_file')
+
+    def _do_prepare_api(self):
+        connection = self.configuration_data.get(self.CONNECTION_KEY)
+        if not connection or not connection.get('host'):
+            return None
+
+        for key in self.CONNECTION_FILES:
+            if connection.get(key) and not os.path.isfile(connection[key]):
+                self.logger.debug(
+                    'Certificate file {0} not found'.format(connection[key]))
+                return None
+
+        config = type.__call__(Configuration)
+        config.host = connection['host']
+        config.verify_ssl = connection.get('verify_ssl', True)
+        for key in self.CONNECTION_FILES:
+            setattr(config, key, connection.get(key))
+        if connection.get('api_key'):
+            config.api_key = dict(connection['api_key'])
+        Configuration.set_default(config)
+
+        return kubernetes.client
+
 
 class BlueprintFileConfiguration(KubernetesApiConfiguration):
+    """Configuration by kubeconfig file from blueprint. With
+    ``deployment_id`` given and ``kubeconfig_cache`` enabled, downloaded
+    file is cached in agent local cache (keyed also by ``tenant_name``, as
+    agent may be shared by tenants) and reused by next operations of the
+    deployment, download is removed. Blueprint re-uploaded with the same
+    id is not noticed, so the cache is opt-in.
+    """
+
     BLUEPRINT_FILE_NAME_KEY = 'blueprint_file_name'
+    CONFIGURATION_KEY = BLUEPRINT_FILE_NAME_KEY
+
+    def _cache_key(self, blueprint_file_name):
+        deployment_id = self.kwargs.get('deployment_id')
+        options = self.kwargs.get('kubeconfig_cache') or {}
+        if not deployment_id or not options.get('enabled'):
+            return None
+        return cache_key('kubeconfig', self.kwargs.get('tenant_name'),
+                         deployment_id, self.kwargs.get('blueprint_id'),
+                         blueprint_file_name)
+
+    def _cache(self):
+        options = self.kwargs.get('kubeconfig_cache') or {}
+        cache = KubernetesLocalCache(
+            directory=options.get('directory') or DEFAULT_CACHE_DIRECTORY)
+        if not cache.available:
+            self.logger.warning(
+                'Kubeconfig cache directory {0} is not private to the agent '
+                'user, config file is not cached'.format(cache.directory))
+            return None
+        return cache
+
+    def _load_cached(self, cache, key):
+        """Load cached kubeconfig, False when not cached or cached
+        content does not match its hash.
+        """
+
+        entry = cache.get(key)
+        if not entry:
+            return False
+
+        digest, _, content = entry.partition('\n')
+        if hashlib.sha256(content).hexdigest() != digest:
+            self.logger.debug('Cached config file is corrupted')
+            return False
+
+        loader = kubernetes.config.kube_config.KubeConfigLoader(
+            config_dict=yaml.safe_load(content),
+            config_base_path=cache.directory
+        )
+        config = type.__call__(Configuration)
+        loader.load_and_set(config)
+        Configuration.set_default(config)
+        return True
+
+    def _store_cached(self, cache, key, manager_file_path):
+        try:
+            with open(manager_file_path) as config_file:
+                content = config_file.read()
+            cache.put(key, '{0}\n{1}'.format(
+                hashlib.sha256(content).hexdigest(), content))
+        except (IOError, OSError) as e:
+            self.logger.debug(
+                'Cannot cache config file: {0}'.format(str(e)))
+
+        try:
+            os.remove(manager_file_path)
+        except OSError:
+            pass
 
     def _do_prepare_api(self):
         if self.BLUEPRINT_FILE_NAME_KEY in self.configuration_data:
@@ -53,6 +174,11 @@ class BlueprintFileConfiguration(KubernetesApiConfiguration):
             ]
 
             try:
+                key = self._cache_key(blueprint_file_name)
+                cache = self._cache() if key else None
+                if cache and self._load_cached(cache, key):
+                    return kubernetes.client
+
                 download_resource = self.kwargs.get('download_resource')
                 manager_file_path = download_resource(blueprint_file_name)
 
@@ -62,6 +188,8 @@ class BlueprintFileConfiguration(KubernetesApiConfiguration):
                     kubernetes.config.load_kube_config(
                         config_file=manager_file_path
                     )
+                    if cache:
+                        self._store_cached(cache, key, manager_file_path)
                     return kubernetes.client
             except Exception as e:
                 self.logger.error(
@@ -74,6 +202,11 @@ class BlueprintFileConfiguration(KubernetesApiConfiguration):
 
 class ManagerFilePathConfiguration(KubernetesApiConfiguration):
     MANAGER_FILE_PATH_KEY = 'manager_file_path'
+    CONFIGURATION_KEY = MANAGER_FILE_PATH_KEY
+
+    @classmethod
+    def normalize(cls, value):
+        return os.path.expanduser(value)
 
     def _do_prepare_api(self):
         if self.MANAGER_FILE_PATH_KEY in self.configuration_data:
@@ -94,6 +227,7 @@ class ManagerFilePathConfiguration(KubernetesApiConfiguration):
 
 class FileContentConfiguration(KubernetesApiConfiguration):
     FILE_CONTENT_KEY = 'file_content'
+    CONFIGURATION_KEY = FILE_CONTENT_KEY
 
     def _do_prepare_api(self):
 
@@ -121,10 +255,17 @@ class ApiOptionsConfiguration(KubernetesApiConfiguration):
     API_OPTIONS_HOST_KEY = 'host'
     API_OPTIONS_ALL_KEYS = ['host', 'ssl_ca_cert', 'cert_file', 'key_file',
                             'verify_ssl', 'api_key', 'debug']
+    CONFIGURATION_KEY = API_OPTIONS_KEY
+
+    @classmethod
+    def normalize(cls, value):
+        return {key: option for key, option in (value or {}).items()
+                if key in cls.API_OPTIONS_ALL_KEYS}
 
     def _do_prepare_api(self):
         if self.API_OPTIONS_KEY in self.configuration_data:
-            api_options = self.configuration_data[self.API_OPTIONS_KEY]
+            # configuration data is not modified
+            api_options = dict(self.configuration_data[self.API_OPTIONS_KEY])
 
             if self.API_OPTIONS_HOST_KEY not in api_options:
                 return None
@@ -150,18 +291,33 @@ class ApiOptionsConfiguration(KubernetesApiConfiguration):
 class KubernetesApiConfigurationVariants(KubernetesApiConfiguration):
 
     VARIANTS = (
+        ConnectionConfiguration,
         BlueprintFileConfiguration,
         ManagerFilePathConfiguration,
         FileContentConfiguration,
         ApiOptionsConfiguration
     )
+    VARIANTS_BY_KEY = {variant.CONFIGURATION_KEY: variant
+                       for variant in VARIANTS}
+
+    @classmethod
+    def select_variants(cls, configuration_data):
+        """Variants configured by keys of configuration data, in order of
+        priority.
+        """
+
+        return sorted(
+            (cls.VARIANTS_BY_KEY[key]
+             for key, value in (configuration_data or {}).items()
+             if value and key in cls.VARIANTS_BY_KEY),
+            key=cls.VARIANTS.index)
 
     def _do_prepare_api(self):
         self.logger.debug(
             'Checking how Kubernetes API should be configured'
         )
 
-        for variant in self.VARIANTS:
+        for variant in self.select_variants(self.configuration_data):
             try:
                 api_candidate = variant(
                     self.logger,
@@ -186,3 +342,49 @@ class KubernetesApiConfigurationVariants(KubernetesApiConfiguration):
             'variant found for {0} properties'
             .format(self.configuration_data)
         )
+
+
+def resolve_configuration(configuration_data):
+    """Select variant of configuration data (without any I/O) and return
+    dictionary with its only key and normalized settings, which is used
+    by ``KubernetesApiConfigurationVariants`` directly.
+    """
+
+    variants = KubernetesApiConfigurationVariants.select_variants(
+        configuration_data)
+    if not variants:
+        raise KuberentesApiInitializationFailedError(
+            'Cannot initialize Kubernetes API - no suitable configuration '
+            'variant found for {0} properties'
+            .format(configuration_data)
+        )
+
+    key = variants[0].CONFIGURATION_KEY
+    return {key: variants[0].normalize(configuration_data[key])}
+
+
+def connection_descriptor(with_api_key=False,
+                          directory=DEFAULT_CERTIFICATES_DIRECTORY):
+    """Connection settings of prepared (default) client configuration for
+    ``ConnectionConfiguration``, with certificate files materialized in
+    agent local directory. None when configuration uses API key (token)
+    and ``with_api_key`` is not set, as token from kubeconfig may expire,
+    or when certificates cannot be stored in directory private to current
+    user (e.g. created by other user in shared temporary directory).
+    """
+
+    config = Configuration()
+    if config.api_key and not with_api_key:
+        return None
+
+    connection = {'host': config.host, 'verify_ssl': config.verify_ssl}
+    files = [key for key in ConnectionConfiguration.CONNECTION_FILES
+             if getattr(config, key)]
+    if files and not private_directory(directory):
+        return None
+    for key in files:
+        connection[key] = materialize_file(getattr(config, key), directory)
+    if config.api_key:
+        connection['api_key'] = dict(config.api_key)
+
+    return connection
@@ -0,0 +1,455 @@
+# #######
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Optional long-lived helper process of the agent, which keeps warm
+connections (urllib3 pools) to Kubernetes API servers and discovery
+responses for short-lived operation processes.
+
+Operations send requests over Unix socket, one JSON document per line:
+
+    request:  {"method", "url", "headers", "body", "timeout", "tls"}
+    response: {"status", "reason", "headers", "data"} or {"error"}
+
+Bodies are latin-1 decoded bytes, so any content passes JSON unchanged.
+Daemon is spawned on first use and exits when idle for ``idle_timeout``
+seconds. Usage:
+
+    python -m cloudify_kubernetes.k8s.daemon <socket path> <idle timeout>
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import socket
+import tempfile
+import threading
+import subprocess
+
+from collections import OrderedDict
+
+from urllib import urlencode
+from urlparse import urlparse
+
+import urllib3
+
+from .cache import materialize_file, private_directory
+
+try:
+    import fcntl
+except ImportError:
+    # not available on Windows, daemon is not used there
+    fcntl = None
+
+
+DEFAULT_DAEMON_DIRECTORY = os.path.join(
+    tempfile.gettempdir(), 'cloudify-kubernetes-daemon'
+)
+DEFAULT_IDLE_TIMEOUT = 300
+SOCKET_NAME = 'daemon.sock'
+# how long operation waits for spawned daemon
+SPAWN_TIMEOUT = 5
+# how long operation waits for response of request without timeout, hung
+# daemon must not block operation forever
+RESPONSE_TIMEOUT = 120
+# added to timeout of request, daemon sends the request itself
+RESPONSE_TIMEOUT_MARGIN = 5
+
+# Responses of discovery are the same for all resources of cluster
+DISCOVERY_PATHS = ('/version', '/api', '/apis')
+DISCOVERY_TTL = 60
+
+# Pool manager options sent with each request, daemon keeps pool manager
+# for each distinct set, files are identified by content as kubeconfig
+# loader writes them to new temporary files in each operation
+TLS_OPTIONS = ('cert_reqs', 'ca_certs', 'cert_file', 'key_file',
+               'assert_hostname')
+TLS_FILE_OPTIONS = ('ca_certs', 'cert_file', 'key_file')
+# least recently used pool managers above the limit are closed
+MAX_POOL_MANAGERS = 16
+
+# Content is decoded by daemon already
+SKIPPED_RESPONSE_HEADERS = ('content-encoding', 'content-length',
+                            'transfer-encoding')
+
+
+def _send(connection, message):
+    connection.sendall(json.dumps(message, separators=(',', ':')) + '\n')
+
+
+def _receive(connection_file):
+    line = connection_file.readline()
+    if not line:
+        raise EOFError('Connection closed')
+    return json.loads(line)
+
+
+def _encode_body(body):
+    return body.decode('latin-1') if body is not None else None
+
+
+def _decode_body(body):
+    return body.encode('latin-1') if body is not None else None
+
+
+def _timeout(timeout):
+    if isinstance(timeout, urllib3.Timeout):
+        if timeout.total is not None:
+            return timeout.total
+        return [timeout.connect_timeout, timeout.read_timeout]
+    return timeout
+
+
+def _response_timeout(timeout):
+    if isinstance(timeout, list):
+        if None in timeout:
+            return RESPONSE_TIMEOUT
+        timeout = sum(timeout)
+    if not isinstance(timeout, (int, long, float)):
+        return RESPONSE_TIMEOUT
+    return timeout + RESPONSE_TIMEOUT_MARGIN
+
+
+class KubernetesClientDaemon(object):
+    """Server side of the daemon."""
+
+    def __init__(self, path, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        self.path = path
+        self.idle_timeout = float(idle_timeout)
+        self._pool_managers = OrderedDict()
+        self._discovery = {}
+        self._lock = threading.Lock()
+        self._active = 0
+        self._last_request = time.time()
+
+    def _tls_identity(self, tls):
+        """Options with files replaced by their copies in daemon directory,
+        named by content hash.
+        """
+
+        directory = os.path.dirname(self.path)
+        return tuple(sorted(
+            (name, materialize_file(value, directory)
+             if name in TLS_FILE_OPTIONS and value else value)
+            for name, value in tls.items()
+        ))
+
+    def _pool_manager(self, identity):
+        with self._lock:
+            pool_manager = self._pool_managers.pop(identity, None)
+            if pool_manager is None:
+                pool_manager = urllib3.PoolManager(
+                    num_pools=4, maxsize=8, **dict(identity))
+                while len(self._pool_managers) >= MAX_POOL_MANAGERS:
+                    self._pool_managers.popitem(last=False)[1].clear()
+            self._pool_managers[identity] = pool_manager
+            return pool_manager
+
+    def handle(self, request):
+        method = request['method']
+        url = request['url']
+        headers = request.get('headers') or {}
+
+        tls_identity = self._tls_identity(request.get('tls') or {})
+
+        discovery_key = None
+        if method == 'GET' and \
+                urlparse(url).path.rstrip('/') in DISCOVERY_PATHS:
+            discovery_key = (url, headers.get('authorization',
+                                              headers.get('Authorization')),
+                             tls_identity)
+            cached = self._discovery.get(discovery_key)
+            if cached and time.time() - cached[0] < DISCOVERY_TTL:
+                return cached[1]
+
+        timeout = request.get('timeout')
+        if isinstance(timeout, list):
+            timeout = urllib3.Timeout(connect=timeout[0], read=timeout[1])
+
+        response = self._pool_manager(tls_identity).request(
+            method, url,
+            body=_decode_body(request.get('body')),
+            headers=headers,
+            timeout=timeout
+        )
+        result = {
+            'status': response.status,
+            'reason': response.reason,
+            'headers': {
+                name: value for name, value in response.headers.items()
+                if name.lower() not in SKIPPED_RESPONSE_HEADERS
+            },
+            'data': _encode_body(response.data)
+        }
+
+        if discovery_key and response.status == 200:
+            self._discovery[discovery_key] = (time.time(), result)
+        return result
+
+    def _serve_connection(self, connection):
+        connection_file = connection.makefile('rb')
+        try:
+            while True:
+                try:
+                    request = _receive(connection_file)
+                except EOFError:
+                    return
+
+                with self._lock:
+                    self._active += 1
+                try:
+                    response = self.handle(request)
+                except Exception as e:
+                    response = {'error': '{0}: {1}'.format(
+                        type(e).__name__, e)}
+                finally:
+                    with self._lock:
+                        self._active -= 1
+                        self._last_request = time.time()
+                _send(connection, response)
+        except socket.error:
+            # operation process exited
+            pass
+        finally:
+            connection_file.close()
+            connection.close()
+
+    def _idle(self):
+        with self._lock:
+            return not self._active and \
+                time.time() - self._last_request >= self.idle_timeout
+
+    def serve(self):
+        """Serve until idle. Only one daemon serves the socket, others
+        exit immediately, as well as daemon which socket directory is not
+        private to current user.
+        """
+
+        if not private_directory(os.path.dirname(self.path)):
+            return
+
+        lock_file = open(self.path + '.lock', 'a')
+        try:
+            if fcntl:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except IOError:
+                    return
+
+            # left by daemon which did not exit cleanly
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+            server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            # socket is created accessible only by current user
+            umask = os.umask(0o177)
+            try:
+                server.bind(self.path)
+            finally:
+                os.umask(umask)
+            try:
+                server.listen(16)
+                server.settimeout(min(1.0, self.idle_timeout))
+                self._last_request = time.time()
+
+                while not self._idle():
+                    try:
+                        connection, _ = server.accept()
+                    except socket.timeout:
+                        continue
+                    connection.settimeout(None)
+                    thread = threading.Thread(
+                        target=self._serve_connection, args=(connection,))
+                    thread.daemon = True
+                    thread.start()
+            finally:
+                server.close()
+                os.remove(self.path)
+        finally:
+            lock_file.close()
+
+
+def spawn_daemon(path, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+    """Start detached daemon process with the same python and packages as
+    the operation.
+    """
+
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        entry for entry in sys.path if entry))
+    with open(os.devnull, 'r+') as devnull:
+        subprocess.Popen(
+            [sys.executable, '-m', 'cloudify_kubernetes.k8s.daemon',
+             path, str(idle_timeout)],
+            stdin=devnull, stdout=devnull, stderr=devnull,
+            close_fds=True, preexec_fn=os.setsid, env=environment)
+
+
+class KubernetesClientDaemonConnection(object):
+    """Client side of the daemon, shared by all API clients of operation.
+    Each thread has its own connection to the daemon. Once the daemon
+    cannot be reached, it is not tried again by the operation.
+    """
+
+    def __init__(self, logger, directory=DEFAULT_DAEMON_DIRECTORY,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        self.logger = logger
+        self.directory = directory
+        self.path = os.path.join(directory, SOCKET_NAME)
+        self.idle_timeout = idle_timeout
+        self.available = fcntl is not None
+        self._local = threading.local()
+
+    def _connect_socket(self):
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.settimeout(SPAWN_TIMEOUT)
+        try:
+            connection.connect(self.path)
+        except socket.error:
+            connection.close()
+            raise
+        return connection
+
+    def _spawn(self):
+        spawn_daemon(self.path, self.idle_timeout)
+
+        deadline = time.time() + SPAWN_TIMEOUT
+        while True:
+            try:
+                return self._connect_socket()
+            except socket.error:
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.05)
+
+    def _connection(self):
+        if getattr(self._local, 'connection', None) is None:
+            # other user may listen on the socket, credentials are sent
+            if not private_directory(self.directory):
+                raise OSError(
+                    'directory {0} is not private to the agent user'
+                    .format(self.directory))
+            try:
+                connection = self._connect_socket()
+            except socket.error:
+                connection = self._spawn()
+            self._local.connection = connection
+            self._local.connection_file = connection.makefile('rb')
+
+        return self._local.connection, self._local.connection_file
+
+    def close(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            self._local.connection_file.close()
+            connection.close()
+        self._local.connection = None
+
+    def request(self, message):
+        """Response of the daemon or None when it is not available. Daemon
+        which exited while idle is started again.
+        """
+
+        for attempt in range(2):
+            if not self.available:
+                return None
+
+            reused = getattr(self._local, 'connection', None) is not None
+            try:
+                connection, connection_file = self._connection()
+                connection.settimeout(
+                    _response_timeout(message.get('timeout')))
+                _send(connection, message)
+                return _receive(connection_file)
+            except (socket.error, OSError, EOFError, ValueError) as e:
+                self.close()
+                # daemon exited while idle, hung one is not tried again
+                if reused and not attempt and \
+                        not isinstance(e, socket.timeout):
+                    continue
+                self.available = False
+                self.logger.debug(
+                    'Kubernetes client daemon not available, requests are '
+                    'sent directly: {0}'.format(e))
+                return None
+
+
+class KubernetesDaemonPoolManager(object):
+    """Replacement of urllib3 pool manager of API client, which sends
+    requests through the daemon. Requests the daemon cannot serve (streamed
+    watches, form fields, proxies) and all requests when the daemon is not
+    available are sent directly by wrapped ``pool_manager``.
+    """
+
+    def __init__(self, pool_manager, daemon_connection):
+        self.pool_manager = pool_manager
+        self.daemon_connection = daemon_connection
+        self._tls = {
+            key: value
+            for key, value in pool_manager.connection_pool_kw.items()
+            if key in TLS_OPTIONS
+        }
+
+    def _proxied(self, fields, kwargs):
+        if kwargs or isinstance(self.pool_manager, urllib3.ProxyManager):
+            return False
+        # watch is streamed
+        return not any(name == 'watch' for name, _ in fields or [])
+
+    def _direct(self, method, url, fields=None, body=None, headers=None,
+                preload_content=True, timeout=None, **kwargs):
+        return self.pool_manager.request(
+            method, url, fields=fields, body=body, headers=headers,
+            preload_content=preload_content, timeout=timeout, **kwargs)
+
+    def request(self, method, url, fields=None, body=None, headers=None,
+                preload_content=True, timeout=None, **kwargs):
+        if isinstance(fields, dict):
+            fields = list(fields.items())
+        if not self._proxied(fields, kwargs):
+            return self._direct(method, url, fields, body, headers,
+                                preload_content, timeout, **kwargs)
+
+        if isinstance(body, unicode):
+            body = body.encode('utf-8')
+        response = self.daemon_connection.request({
+            'method': method,
+            'url': url + ('?' + urlencode(fields) if fields else ''),
+            'headers': dict(headers or {}),
+            'body': _encode_body(body),
+            'timeout': _timeout(timeout),
+            'tls': self._tls
+        })
+        if response is None:
+            return self._direct(method, url, fields, body, headers,
+                                preload_content, timeout)
+
+        if 'error' in response:
+            raise urllib3.exceptions.HTTPError(response['error'])
+
+        return urllib3.HTTPResponse(
+            body=io.BytesIO(_decode_body(response['data'])),
+            headers=response['headers'],
+            status=response['status'],
+            reason=response['reason'],
+            preload_content=preload_content
+        )
+
+    def clear(self):
+        self.pool_manager.clear()
+
+
+if __name__ == '__main__':
+    KubernetesClientDaemon(sys.argv[1], sys.argv[2]).serve()
@@ -0,0 +1,91 @@
+# #######
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+
+# Top level fields never compared, kind and apiVersion are not even
+# returned for items of list
+IGNORED_FIELDS = ('apiVersion', 'kind', 'status')
+
+# Metadata populated by API server
+IGNORED_METADATA_FIELDS = ('creationTimestamp', 'deletionTimestamp',
+                           'generation', 'managedFields', 'resourceVersion',
+                           'selfLink', 'uid')
+
+
+class KubernetesResourceDrift(object):
+
+    def __init__(self, path, expected, actual):
+        self.path = path
+        self.expected = expected
+        self.actual = actual
+
+    def __str__(self):
+        return '{0}: expected {1}, found {2}'.format(
+            self.path, json.dumps(self.expected, sort_keys=True),
+            json.dumps(self.actual, sort_keys=True))
+
+    def __repr__(self):
+        return '{0}({1})'.format(self.__class__.__name__, str(self))
+
+
+def _compare(expected, actual, path, drifts):
+    if expected is None:
+        return
+
+    if isinstance(expected, dict):
+        if not isinstance(actual, dict):
+            drifts.append(KubernetesResourceDrift(path, expected, actual))
+            return
+        for key, value in sorted(expected.items()):
+            _compare(value, actual.get(key),
+                     '{0}.{1}'.format(path, key), drifts)
+
+    elif isinstance(expected, list):
+        if not isinstance(actual, list) or len(actual) != len(expected):
+            drifts.append(KubernetesResourceDrift(path, expected, actual))
+            return
+        for index, (value, actual_value) in enumerate(zip(expected, actual)):
+            _compare(value, actual_value,
+                     '{0}[{1}]'.format(path, index), drifts)
+
+    # numbers given as strings (e.g. ports) are not a drift
+    elif expected != actual and (
+            isinstance(expected, bool) or isinstance(actual, bool) or
+            str(expected) != str(actual)):
+        drifts.append(KubernetesResourceDrift(path, expected, actual))
+
+
+def definition_drift(definition, resource):
+    """Compare resource definition with live resource (both dictionaries
+    in API server JSON format) and return list of
+    ``KubernetesResourceDrift``.
+
+    Only fields set by definition are compared, so defaults and fields
+    populated by API server or controllers do not count as drift.
+    Differences are ordered by path.
+    """
+
+    drifts = []
+
+    for key, value in sorted((definition or {}).items()):
+        if key in IGNORED_FIELDS:
+            continue
+        if key == 'metadata':
+            value = {k: v for k, v in (value or {}).items()
+                     if k not in IGNORED_METADATA_FIELDS}
+        _compare(value, (resource or {}).get(key), key, drifts)
+
+    return drifts
@@ -13,6 +13,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import json
+
 
 class KuberentesError(Exception):
     pass
@@ -23,7 +25,90 @@ class KuberentesApiInitializationFailedError(KuberentesError):
 
 
 class KuberentesApiOperationError(KuberentesError):
-    pass
+    """Failed Kubernetes API call.
+
+    HTTP status, reason and headers are kept as attributes, so errors can
+    be classified without formatting (potentially huge) response body,
+    which is parsed only when ``details`` or message is requested.
+    """
+
+    TRANSIENT_STATUSES = (429, 500, 502, 503, 504)
+    # Requests rejected by API server which cannot succeed when repeated
+    INVALID_REQUEST_STATUSES = (400, 405, 415, 422)
+
+    def __init__(self, message, status=None, reason=None, headers=None,
+                 body=None, cause=None):
+        super(KuberentesApiOperationError, self).__init__(message)
+        self.status = status
+        self.reason = reason
+        self.headers = headers or {}
+        self.body = body
+        self.cause = cause
+        self._details = None
+
+    @classmethod
+    def from_api_exception(cls, message, exception):
+        """Wrap ``ApiException``, its description is appended to
+        ``message`` only when error is formatted.
+        """
+
+        return cls(message,
+                   status=exception.status,
+                   reason=exception.reason,
+                   headers=exception.headers,
+                   body=exception.body,
+                   cause=exception)
+
+    def __str__(self):
+        message = super(KuberentesApiOperationError, self).__str__()
+        if self.cause is not None:
+            return '{0}{1}'.format(message, str(self.cause))
+        return message
+
+    @property
+    def details(self):
+        """``Status`` object returned by API server (as dictionary)."""
+
+        if self._details is None:
+            try:
+                details = json.loads(self.body) if self.body else {}
+            except (TypeError, ValueError):
+                details = {}
+            self._details = details if isinstance(details, dict) else {}
+
+        return self._details
+
+    @property
+    def retry_after(self):
+        for header, value in (self.headers or {}).items():
+            if header.lower() == 'retry-after':
+                try:
+                    return float(value)
+                except ValueError:
+                    # HTTP-date is not used by Kubernetes API server
+                    return None
+
+        return None
+
+    @property
+    def is_not_found(self):
+        return self.status == 404
+
+    @property
+    def is_conflict(self):
+        return self.status == 409
+
+    @property
+    def is_throttled(self):
+        return self.status == 429
+
+    @property
+    def is_transient(self):
+        return self.status in self.TRANSIENT_STATUSES
+
+    @property
+    def is_invalid_request(self):
+        return self.status in self.INVALID_REQUEST_STATUSES
 
 
 class KuberentesAuthenticationError(KuberentesError):
@@ -304,6 +304,66 @@ SUPPORTED_API_MAPPINGS = {
             method='delete_namespaced_role_binding',
             payload='V1DeleteOptions'
         ),
+    ),
+    'StatefulSet': KubernetesApiMapping(
+        create=KubernetesSingleOperationApiMapping(
+            api='AppsV1beta1Api',
+            method='create_namespaced_stateful_set',
+            payload='V1beta1StatefulSet'
+        ),
+        read=KubernetesSingleOperationApiMapping(
+            api='AppsV1beta1Api',
+            method='read_namespaced_stateful_set',
+        ),
+        update=KubernetesSingleOperationApiMapping(
+            api='AppsV1beta1Api',
+            method='patch_namespaced_stateful_set'
+        ),
+        delete=KubernetesSingleOperationApiMapping(
+            api='AppsV1beta1Api',
+            method='delete_namespaced_stateful_set',
+            payload='V1DeleteOptions'
+        ),
+    ),
+    'DaemonSet': KubernetesApiMapping(
+        create=KubernetesSingleOperationApiMapping(
+            api='ExtensionsV1beta1Api',
+            method='create_namespaced_daemon_set',
+            payload='V1beta1DaemonSet'
+        ),
+        read=KubernetesSingleOperationApiMapping(
+            api='ExtensionsV1beta1Api',
+            method='read_namespaced_daemon_set',
+        ),
+        update=KubernetesSingleOperationApiMapping(
+            api='ExtensionsV1beta1Api',
+            method='patch_namespaced_daemon_set'
+        ),
+        delete=KubernetesSingleOperationApiMapping(
+            api='ExtensionsV1beta1Api',
+            method='delete_namespaced_daemon_set',
+            payload='V1DeleteOptions'
+        ),
+    ),
+    'Job': KubernetesApiMapping(
+        create=KubernetesSingleOperationApiMapping(
+            api='BatchV1Api',
+            method='create_namespaced_job',
+            payload='V1Job'
+        ),
+        read=KubernetesSingleOperationApiMapping(
+            api='BatchV1Api',
+            method='read_namespaced_job',
+        ),
+        update=KubernetesSingleOperationApiMapping(
+            api='BatchV1Api',
+            method='patch_namespaced_job'
+        ),
+        delete=KubernetesSingleOperationApiMapping(
+            api='BatchV1Api',
+            method='delete_namespaced_job',
+            payload='V1DeleteOptions'
+        ),
     )
 }
 
@@ -52,10 +52,9 @@ class KubernetesOperartion(object):
         try:
             return self.api_method(**self._prepare_arguments(arguments))
         except ApiException as e:
-            raise KuberentesApiOperationError(
+            raise KuberentesApiOperationError.from_api_exception(
                 'Operation execution failed. Exception during Kubernetes '
-                'API call: {0}'
-                .format(str(e)))
+                'API call: ', e)
 
 
 class KubernetesCreateOperation(KubernetesOperartion):
@@ -74,3 +73,29 @@ class KubernetesUpdateOperation(KubernetesOperartion):
 class KubernetesDeleteOperation(KubernetesOperartion):
 
     API_ACCEPTED_ARGUMENTS = ['grace_period_seconds', 'propagation_policy']
+
+
+class KubernetesReadMetadataOperation(KubernetesReadOperation):
+    """Read which may return raw HTTP response (``_preload_content``),
+    so it is not deserialized into model of whole resource.
+    """
+
+    API_ACCEPTED_ARGUMENTS = KubernetesReadOperation.API_ACCEPTED_ARGUMENTS + \
+        ['_preload_content']
+
+
+class KubernetesListOperation(KubernetesOperartion):
+
+    API_ACCEPTED_ARGUMENTS = ['label_selector', 'field_selector',
+                              '_preload_content']
+
+
+class KubernetesDiscoveryOperation(KubernetesOperartion):
+    """Read of server version or API groups, returned as raw response."""
+
+    API_ACCEPTED_ARGUMENTS = ['_preload_content']
+
+
+class KubernetesDeleteCollectionOperation(KubernetesOperartion):
+
+    API_ACCEPTED_ARGUMENTS = ['label_selector', 'field_selector']
@@ -0,0 +1,129 @@
+# #######
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import json
+import time
+import hashlib
+import tempfile
+
+from contextlib import contextmanager
+
+from .cache import private_directory
+
+try:
+    import fcntl
+except ImportError:
+    # not available on Windows, limiter is then not shared reliably
+    fcntl = None
+
+
+DEFAULT_RATE_LIMIT_DIRECTORY = os.path.join(
+    tempfile.gettempdir(), 'cloudify-kubernetes-rate-limit'
+)
+# longest wait for single request, also bounds state written by others
+RETRY_MAX_DELAY = 60
+
+
+class KubernetesApiRateLimiter(object):
+    """Token bucket (``qps`` tokens per second, up to ``burst`` tokens)
+    shared by all operation processes talking to the same cluster.
+
+    Bucket state is kept in small file guarded by ``flock``, so concurrent
+    operations of large deployment are throttled together. Limiter is not
+    ``available`` when its directory is not private to current user.
+    """
+
+    def __init__(self, key, qps, burst=None,
+                 directory=DEFAULT_RATE_LIMIT_DIRECTORY):
+        self.qps = float(qps)
+        self.burst = max(1, int(burst or qps))
+
+        # state in directory which is not private is not trusted
+        self.available = private_directory(directory)
+        self.path = os.path.join(
+            directory,
+            '{0}.json'.format(hashlib.sha1(str(key)).hexdigest())
+        )
+
+    @contextmanager
+    def _locked_state(self):
+        state_file = os.fdopen(
+            os.open(self.path,
+                    os.O_RDWR | os.O_CREAT | getattr(os, 'O_NOFOLLOW', 0),
+                    0o600), 'r+')
+
+        try:
+            if fcntl:
+                fcntl.flock(state_file, fcntl.LOCK_EX)
+
+            try:
+                state = json.loads(state_file.read() or '{}')
+            except ValueError:
+                state = {}
+            if not isinstance(state, dict) or not all(
+                    isinstance(value, (int, long, float))
+                    for value in state.values()):
+                state = {}
+
+            yield state
+
+            state_file.seek(0)
+            state_file.truncate()
+            state_file.write(json.dumps(state))
+            state_file.flush()
+        finally:
+            state_file.close()
+
+    def reserve(self):
+        """Take one token and return number of seconds caller has to wait
+        before sending request. Token may be borrowed from the future, so
+        concurrent callers get consecutive slots instead of busy polling.
+        """
+
+        now = time.time()
+        with self._locked_state() as state:
+            tokens = min(
+                self.burst,
+                state.get('tokens', self.burst) +
+                max(0, now - state.get('timestamp', now)) * self.qps
+            ) - 1
+
+            delay = max(0, state.get('blocked_until', 0) - now)
+            if tokens < 0:
+                delay = max(delay, -tokens / self.qps)
+
+            state['tokens'] = max(tokens, -RETRY_MAX_DELAY * self.qps)
+            state['timestamp'] = now
+
+        return min(delay, RETRY_MAX_DELAY)
+
+    def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+        return delay
+
+    def block(self, seconds):
+        """Stop all callers for ``seconds``, e.g. after API server returned
+        429 Too Many Requests with Retry-After header.
+        """
+
+        with self._locked_state() as state:
+            now = time.time()
+            state['blocked_until'] = min(
+                max(state.get('blocked_until', 0), now + seconds),
+                now + RETRY_MAX_DELAY)
@@ -0,0 +1,357 @@
+# #######
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+READINESS_READY = 'ready'
+READINESS_RETRY = 'retry'
+READINESS_FAILED = 'failed'
+
+
+class KubernetesResourceReadiness(object):
+
+    def __init__(self, state, message):
+        self.state = state
+        self.message = message
+
+    @property
+    def is_ready(self):
+        return self.state == READINESS_READY
+
+    @property
+    def is_retry(self):
+        return self.state == READINESS_RETRY
+
+    @property
+    def is_failed(self):
+        return self.state == READINESS_FAILED
+
+    def __repr__(self):
+        return '{0}({1}: {2})'.format(
+            self.__class__.__name__, self.state, self.message)
+
+
+def ready(message):
+    return KubernetesResourceReadiness(READINESS_READY, message)
+
+
+def retry(message):
+    return KubernetesResourceReadiness(READINESS_RETRY, message)
+
+
+def failed(message):
+    return KubernetesResourceReadiness(READINESS_FAILED, message)
+
+
+# Evaluators by resource kind. Each is called with kind, whole resource and
+# its status (both dictionaries) and returns KubernetesResourceReadiness,
+# or None when readiness cannot be evaluated (resource is treated as ready)
+READINESS_EVALUATORS = {}
+
+
+def readiness_evaluator(*kinds):
+    def decorator(evaluator):
+        for kind in kinds:
+            READINESS_EVALUATORS[kind] = evaluator
+        return evaluator
+
+    return decorator
+
+
+_camel_case_names = {}
+
+
+def _field(data, name):
+    """Value of snake_case field (read by python client) or its camelCase
+    variant (raw JSON e.g. custom resources).
+    """
+
+    if not isinstance(data, dict):
+        return None
+    if name in data:
+        return data[name]
+
+    camel_case_name = _camel_case_names.get(name)
+    if camel_case_name is None:
+        head, _, tail = name.partition('_')
+        camel_case_name = _camel_case_names[name] = head + ''.join(
+            part.title() for part in tail.split('_'))
+
+    return data.get(camel_case_name)
+
+
+def _conditions(status):
+    return [condition for condition in _field(status, 'conditions') or []
+            if isinstance(condition, dict)]
+
+
+def evaluate_readiness(kind, resource, wait_for_load_balancer=False):
+    """Evaluate readiness of resource (dictionary) of given kind.
+
+    Status which has not observed latest generation of resource yet is
+    not trusted, otherwise evaluator registered for the kind is used,
+    falling back to generic ``status.conditions`` check. LoadBalancer
+    Service waits for its ingress only with ``wait_for_load_balancer``,
+    clusters without load balancer provider never populate it.
+    """
+
+    status = _field(resource, 'status')
+    if not isinstance(status, dict):
+        status = {}
+
+    generation = _field(_field(resource, 'metadata'), 'generation')
+    observed_generation = _field(status, 'observed_generation')
+    if generation and observed_generation is not None and \
+            observed_generation < generation:
+        return retry(
+            '{0} generation {1} not observed yet (observed generation {2})'
+            .format(kind, generation, observed_generation))
+
+    evaluator = READINESS_EVALUATORS.get(kind, conditions_readiness)
+    readiness = evaluator(kind, resource, status)
+
+    if wait_for_load_balancer and kind == 'Service' and \
+            (readiness is None or readiness.is_ready):
+        return load_balancer_readiness(kind, resource, status)
+    return readiness
+
+
+def conditions_readiness(kind, resource, status):
+    """Generic readiness of any kind reporting ``status.conditions``."""
+
+    result = None
+
+    for condition in _conditions(status):
+        condition_type = condition.get('type')
+        condition_status = condition.get('status')
+
+        if condition_type == 'Failed' and condition_status == 'True':
+            return failed(
+                '{0} condition is Failed, reason: {1}, message: {2}'
+                .format(kind, condition.get('reason'),
+                        condition.get('message')))
+
+        if condition_type in ('Ready', 'Available'):
+            if condition_status != 'True':
+                return retry('{0} condition {1} is {2}'.format(
+                    kind, condition_type, condition_status))
+            result = ready('{0} condition {1} is True'.format(
+                kind, condition_type))
+
+    return result
+
+
+@readiness_evaluator('Pod')
+def pod_readiness(kind, resource, status):
+    phase = _field(status, 'phase')
+
+    if phase in ['Failed']:
+        return failed('status {0} in phase {1}'.format(phase, ['Failed']))
+    elif phase in ['Pending', 'Unknown']:
+        return retry('status {0} in phase {1}'.format(
+            phase, ['Pending', 'Unknown']))
+    elif phase in ['Running', 'Succeeded']:
+        return ready('status {0} in phase {1}'.format(
+            phase, ['Running', 'Succeeded']))
+    elif phase is None:
+        return retry('{0} status not ready yet'.format(kind))
+
+    return ready('status {0}'.format(phase))
+
+
+@readiness_evaluator('Service')
+def service_readiness(kind, resource, status):
+    spec = _field(resource, 'spec')
+    # raw JSON field is clusterIP
+    if _field(spec, 'type') == 'LoadBalancer' and \
+            not (_field(spec, 'cluster_ip') or spec.get('clusterIP')):
+        return retry('Waiting for cluster IP of service {0}'
+                     .format(_field(_field(resource, 'metadata'), 'name')))
+
+    return ready('status {0}'.format(status))
+
+
+def load_balancer_readiness(kind, resource, status):
+    if _field(_field(resource, 'spec'), 'type') == 'LoadBalancer' and \
+            not _field(_field(status, 'load_balancer'), 'ingress'):
+        return retry('Waiting for load balancer ingress of service {0}'
+                     .format(_field(_field(resource, 'metadata'), 'name')))
+
+    return ready('status {0}'.format(status))
+
+
+@readiness_evaluator('Deployment')
+def deployment_readiness(kind, resource, status):
+    """Rollout status of Deployment, the same as reported by
+    ``kubectl rollout status``.
+    """
+
+    metadata = _field(resource, 'metadata')
+    name = _field(metadata, 'name')
+    if _field(metadata, 'generation') and \
+            _field(status, 'observed_generation') is None:
+        return retry('Waiting for deployment spec update to be observed')
+
+    conditions = _conditions(status)
+    for condition in conditions:
+        if condition.get('type') == 'ReplicaFailure' and \
+                condition.get('status') != 'False':
+            return failed(
+                'Deployment condition is ReplicaFailure ,'
+                'reason:{0}, message: {1}'
+                ''.format(condition.get('reason'), condition.get('message')))
+
+        if condition.get('type') == 'Progressing' and \
+                condition.get('reason') == 'ProgressDeadlineExceeded':
+            return failed('Deployment {0} exceeded its progress deadline'
+                          .format(name))
+
+    replicas = _field(_field(resource, 'spec'), 'replicas')
+    status_replicas = _field(status, 'replicas')
+    updated_replicas = _field(status, 'updated_replicas')
+    available_replicas = _field(status, 'available_replicas')
+
+    if not conditions and status_replicas is None and \
+            updated_replicas is None and available_replicas is None:
+        return retry('Deployment condition is not ready yet')
+
+    updated_replicas = updated_replicas or 0
+    if replicas is not None and updated_replicas < replicas:
+        return retry(
+            'Waiting for deployment {0} rollout to finish: {1} out of {2} '
+            'new replicas have been updated'.format(
+                name, updated_replicas, replicas))
+
+    if (status_replicas or 0) > updated_replicas:
+        return retry(
+            'Waiting for deployment {0} rollout to finish: {1} old replicas '
+            'are pending termination'.format(
+                name, status_replicas - updated_replicas))
+
+    if (available_replicas or 0) < updated_replicas:
+        return retry(
+            'Waiting for deployment {0} rollout to finish: {1} of {2} '
+            'updated replicas are available'.format(
+                name, available_replicas or 0, updated_replicas))
+
+    return ready('Deployment {0} successfully rolled out'.format(name))
+
+
+@readiness_evaluator('PersistentVolumeClaim')
+def persistent_volume_claim_readiness(kind, resource, status):
+    phase = _field(status, 'phase')
+    if phase in ['Pending', 'Available', 'Bound']:
+        return ready('PersistentVolumeClaim status is Bound')
+
+    return retry('Unknown PersistentVolume status {0}'.format(phase))
+
+
+@readiness_evaluator('PersistentVolume')
+def persistent_volume_readiness(kind, resource, status):
+    phase = _field(status, 'phase')
+    if phase in ['Bound', 'Available']:
+        return ready('PersistentVolume status is {0}'.format(phase))
+
+    return retry('Unknown PersistentVolume status {0}'.format(phase))
+
+
+@readiness_evaluator('ReplicaSet', 'ReplicationController')
+def replicas_readiness(kind, resource, status):
+    ready_replicas = _field(status, 'ready_replicas')
+    replicas = _field(status, 'replicas')
+
+    if ready_replicas is None:
+        return retry('{0} status not ready yet'.format(kind))
+
+    elif ready_replicas != replicas:
+        return retry('Only {0} of {1} replicas are ready'.format(
+            ready_replicas, replicas))
+
+    return ready('All {0} replicas are ready now'.format(replicas))
+
+
+# APIs in which StatefulSet and DaemonSet default to OnDelete update strategy
+ON_DELETE_DEFAULT_API_VERSIONS = ('apps/v1beta1', 'extensions/v1beta1')
+
+
+def _on_delete_update(resource, spec):
+    """Pods are updated only when deleted by user, so revisions of pods
+    do not converge by themselves.
+    """
+
+    strategy_type = _field(_field(spec, 'update_strategy'), 'type')
+    if strategy_type:
+        return strategy_type == 'OnDelete'
+    return _field(resource, 'api_version') in ON_DELETE_DEFAULT_API_VERSIONS
+
+
+@readiness_evaluator('StatefulSet')
+def stateful_set_readiness(kind, resource, status):
+    spec = _field(resource, 'spec') or {}
+    replicas = _field(spec, 'replicas')
+    if replicas is None:
+        replicas = 1
+    ready_replicas = _field(status, 'ready_replicas') or 0
+
+    if ready_replicas < replicas:
+        return retry('Only {0} of {1} replicas are ready'.format(
+            ready_replicas, replicas))
+
+    # Partitioned rolling update intentionally keeps old revision pods
+    rolling_update = _field(_field(spec, 'update_strategy'), 'rolling_update')
+    update_revision = _field(status, 'update_revision')
+    if not _on_delete_update(resource, spec) and \
+            not _field(rolling_update, 'partition') and update_revision and \
+            _field(status, 'current_revision') != update_revision:
+        return retry('Waiting for {0} of {1} pods to be updated'.format(
+            replicas - (_field(status, 'updated_replicas') or 0), replicas))
+
+    return ready('All {0} replicas are ready now'.format(replicas))
+
+
+@readiness_evaluator('DaemonSet')
+def daemon_set_readiness(kind, resource, status):
+    desired = _field(status, 'desired_number_scheduled')
+    if desired is None:
+        return retry('{0} status not ready yet'.format(kind))
+
+    updated = _field(status, 'updated_number_scheduled') or 0
+    if updated < desired and \
+            not _on_delete_update(resource, _field(resource, 'spec')):
+        return retry('Only {0} of {1} daemon pods are updated'.format(
+            updated, desired))
+
+    available = _field(status, 'number_available') or 0
+    if available < desired:
+        return retry('Only {0} of {1} daemon pods are available'.format(
+            available, desired))
+
+    return ready('All {0} daemon pods are available now'.format(desired))
+
+
+@readiness_evaluator('Job')
+def job_readiness(kind, resource, status):
+    for condition in _conditions(status):
+        if condition.get('status') != 'True':
+            continue
+        if condition.get('type') == 'Failed':
+            return failed('Job failed, reason: {0}, message: {1}'.format(
+                condition.get('reason'), condition.get('message')))
+        if condition.get('type') == 'Complete':
+            return ready('Job completed')
+
+    return retry(
+        'Job is not completed yet ({0} active, {1} succeeded, {2} failed)'
+        .format(_field(status, 'active') or 0,
+                _field(status, 'succeeded') or 0,
+                _field(status, 'failed') or 0))
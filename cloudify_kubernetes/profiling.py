@@ -0,0 +1,188 @@
+########
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import gc
+import os
+import re
+import tempfile
+import cProfile
+
+from collections import Counter
+from contextlib import contextmanager
+
+from cloudify import ctx
+
+from .k8s.cache import private_directory
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows, peak memory is then not reported
+    resource = None
+
+
+NODE_PROPERTY_PROFILING = 'profiling'
+PROFILING_CPROFILE = 'cprofile'
+PROFILING_MEMORY = 'memory'
+PROFILING_DIRECTORY = 'directory'
+PROFILING_TOP = 'top'
+
+# Comma separated list of profilers e.g. "cprofile,memory"
+ENV_PROFILING = 'CLOUDIFY_KUBERNETES_PROFILING'
+ENV_PROFILING_DIRECTORY = 'CLOUDIFY_KUBERNETES_PROFILING_DIRECTORY'
+
+DEFAULT_PROFILING_DIRECTORY = os.path.join(
+    tempfile.gettempdir(), 'cloudify-kubernetes-profiling'
+)
+DEFAULT_PROFILING_TOP = 25
+
+# Set while an operation is being profiled, so nested tasks (e.g. every
+# file_resource_create called by multiple_file_resource_create) are
+# captured by the outermost profile instead of overwriting each other.
+_active = False
+
+
+def _profiling_options():
+    options = {
+        PROFILING_DIRECTORY: os.environ.get(
+            ENV_PROFILING_DIRECTORY, DEFAULT_PROFILING_DIRECTORY),
+        PROFILING_TOP: DEFAULT_PROFILING_TOP
+    }
+
+    profilers = [
+        profiler.strip().lower()
+        for profiler in os.environ.get(ENV_PROFILING, '').split(',')
+        if profiler.strip()
+    ]
+    options[PROFILING_CPROFILE] = PROFILING_CPROFILE in profilers
+    options[PROFILING_MEMORY] = PROFILING_MEMORY in profilers
+
+    node_options = ctx.node.properties.get(NODE_PROPERTY_PROFILING) or {}
+    options.update({k: v for k, v in node_options.items() if v is not None})
+
+    return options
+
+
+def _report_path(directory, extension):
+    name = '.'.join(
+        re.sub(r'[^\w\-]', '_', str(part))
+        for part in (ctx.deployment.id,
+                     ctx.instance.id,
+                     ctx.operation.name,
+                     ctx.operation.retry_number)
+    )
+    return os.path.join(directory, '{0}.{1}'.format(name, extension))
+
+
+class MemoryUsage(object):
+    """Peak resident memory of the process and number of objects tracked
+    by garbage collector by type, taken at one point of time.
+    """
+
+    def __init__(self):
+        # kilobytes on Linux
+        self.max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss \
+            if resource else None
+        self.objects = Counter(
+            type(obj).__name__ for obj in gc.get_objects())
+
+
+def _write_memory_report(start, end, path, top):
+    growth = end.objects.copy()
+    growth.subtract(start.objects)
+
+    with open(path, 'w') as report:
+        report.write('Peak RSS (kB): {0} -> {1}\n'.format(
+            start.max_rss, end.max_rss))
+        report.write('Objects tracked by gc: {0} -> {1}\n'.format(
+            sum(start.objects.values()), sum(end.objects.values())))
+        report.write('Top object types by count growth:\n')
+        for name, count in growth.most_common(top):
+            if count <= 0:
+                break
+            report.write('{0:>10} {1}\n'.format('+{0}'.format(count), name))
+
+
+def _save_report(description, write, path):
+    # failed report must not fail operation which succeeded
+    try:
+        write(path)
+    except (IOError, OSError) as e:
+        ctx.logger.warn('Cannot save {0} to {1}: {2}'.format(
+            description, path, e))
+    else:
+        ctx.logger.info('{0} saved to {1}'.format(description, path))
+
+
+@contextmanager
+def profiled_operation():
+    """Profile the current operation if it was requested either by the
+    ``profiling`` node property or by environment variables.
+    """
+
+    global _active
+
+    if _active:
+        yield
+        return
+
+    options = _profiling_options()
+    use_cprofile = options[PROFILING_CPROFILE]
+    use_memory = options[PROFILING_MEMORY]
+
+    if not use_cprofile and not use_memory:
+        yield
+        return
+
+    directory = os.path.expanduser(options[PROFILING_DIRECTORY])
+    if not private_directory(directory):
+        ctx.logger.warn(
+            'Profiling directory {0} is not private to the agent user, '
+            'operation is not profiled'.format(directory))
+        yield
+        return
+
+    profiler = cProfile.Profile() if use_cprofile else None
+
+    _active = True
+    memory_start = MemoryUsage() if use_memory else None
+    if profiler:
+        profiler.enable()
+
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+            _save_report('cProfile statistics', profiler.dump_stats,
+                         _report_path(directory, 'pstats'))
+
+        if memory_start:
+            memory_end = MemoryUsage()
+            _save_report(
+                'Memory usage report',
+                lambda path: _write_memory_report(
+                    memory_start, memory_end, path, options[PROFILING_TOP]),
+                _report_path(directory, 'memory.txt'))
+
+        _active = False
+
+
+def with_profiling(function):
+    def wrapper(**kwargs):
+        with profiled_operation():
+            return function(**kwargs)
+
+    return wrapper
@@ -16,27 +16,113 @@
 # hack for import namespaced modules
 import cloudify_importer # noqa
 
+import re
+import json
+import time
+import hashlib
+from multiprocessing.pool import ThreadPool
+
 from cloudify import ctx
 from cloudify.exceptions import (
     NonRecoverableError,
     OperationRetry,
     RecoverableError)
 
-from k8s.exceptions import KuberentesApiOperationError
-from .decorators import (resource_task,
-                         with_kubernetes_client)
-from .utils import (mapping_by_data,
+from k8s.client import (DEFAULT_FIELD_MANAGER,
+                        KubernetesResourceDefinition)
+from k8s.config import (ApiOptionsConfiguration,
+                        ConnectionConfiguration,
+                        connection_descriptor)
+from k8s.drift import definition_drift
+from k8s.exceptions import (KuberentesApiOperationError,
+                            KuberentesError,
+                            KuberentesInvalidApiMethodError,
+                            KuberentesMappingNotFoundError)
+from k8s.mapping import (get_mapping,
+                         KubernetesApiMapping)
+from k8s.readiness import evaluate_readiness
+from .decorators import (resolved_configuration,
+                         resource_task,
+                         with_kubernetes_client,
+                         INSTANCE_RUNTIME_PROPERTY_RESOLVED_CONFIGURATION)
+from .profiling import with_profiling
+from .utils import (definition_from_file,
+                    mapping_by_data,
                     mapping_by_kind,
                     resource_definition_from_blueprint,
-                    resource_definition_from_file,)
+                    resource_definition_from_file,
+                    resource_definition_patch,
+                    NODE_PROPERTY_DEFINITION)
+from .workflows import (definition_merge_patch,
+                        DEFINITION_ADDITIONS)
 
 
 DEFAULT_NAMESPACE = 'default'
 INSTANCE_RUNTIME_PROPERTY_KUBERNETES = 'kubernetes'
+INSTANCE_RUNTIME_PROPERTY_CONNECTION = 'connection'
+INSTANCE_RUNTIME_PROPERTY_DRIFT_REPORT = 'drift_report'
+INSTANCE_RUNTIME_PROPERTY_APPLIED_FILES = 'applied_files'
+INSTANCE_RUNTIME_PROPERTY_LOAD_BALANCER_IP = 'load_balancer_ip'
+INSTANCE_RUNTIME_PROPERTY_LOAD_BALANCER_HOSTNAME = 'load_balancer_hostname'
 NODE_PROPERTY_FILE = 'file'
 NODE_PROPERTY_FILE_RESOURCE_PATH = 'resource_path'
 NODE_PROPERTY_FILES = 'files'
 NODE_PROPERTY_OPTIONS = 'options'
+NODE_PROPERTY_OWNERSHIP_LABELS = 'ownership_labels'
+OPERATION_INPUT_WAIT = 'wait'
+OPERATION_INPUT_APPLY = 'apply'
+OPERATION_INPUT_FIELD_MANAGER = 'field_manager'
+OPERATION_INPUT_WORKERS = 'workers'
+OPERATION_INPUT_DELETE_FIRST = 'delete_first'
+OPERATION_INPUT_METADATA_ONLY = 'metadata_only'
+OPERATION_INPUT_WAIT_FOR_LOAD_BALANCER = 'wait_for_load_balancer'
+OPERATION_INPUT_PROPAGATION_POLICY = 'propagation_policy'
+
+# Interval between status checks done by in-task wait loop
+WAIT_INTERVAL_INITIAL = 1
+WAIT_INTERVAL_MAX = 10
+WAIT_INTERVAL_BACKOFF = 1.5
+
+# Labels identifying owner of resources created by the plugin
+OWNERSHIP_LABEL_DEPLOYMENT_ID = 'cloudify.co/deployment-id'
+# deployment ids are unique only per tenant
+OWNERSHIP_LABEL_TENANT = 'cloudify.co/tenant'
+OWNERSHIP_LABEL_NODE_ID = 'cloudify.co/node-id'
+OWNERSHIP_LABEL_INSTANCE_ID = 'cloudify.co/instance-id'
+# tenant of managers without multi-tenancy
+DEFAULT_TENANT = 'default_tenant'
+
+# Kinds owning other resources (e.g. pods) are deleted one by one with
+# propagation policy, which collection delete does not support
+KINDS_WITH_DEPENDENTS = ('Deployment', 'ReplicaSet', 'ReplicationController',
+                         'StatefulSet', 'DaemonSet', 'Job')
+
+# Concurrent API requests of drift detection
+DEFAULT_DRIFT_WORKERS = 10
+# Differences of single resource listed in operation log
+DRIFT_LOG_LIMIT = 5
+
+# Concurrent API requests of file resources update
+DEFAULT_FILE_UPDATE_WORKERS = 10
+# Runtime properties of multiple file resources are stored after this
+# number of files
+FILES_CHECKPOINT_INTERVAL = 10
+
+# Updates sent with stored resourceVersion, merged again against live
+# resource after conflict
+UPDATE_CONFLICT_ATTEMPTS = 3
+
+# Kinds which status is updated by controllers, resourceVersion stored by
+# the last operation is almost always stale, so their merge patch is sent
+# without it
+CONTROLLER_MANAGED_KINDS = ('DaemonSet', 'Deployment', 'Job',
+                            'PersistentVolumeClaim', 'ReplicaSet',
+                            'ReplicationController', 'Service',
+                            'StatefulSet')
+
+# Kinds waited for by watching the resource instead of polling, their status
+# changes once after long time (e.g. load balancer allocation)
+WATCHED_KINDS = ('Service',)
 
 
 def _retrieve_id(resource_instance, file=None):
@@ -98,10 +184,47 @@ class JsonCleanuper(object):
         return self.value
 
 
+def _label_value(value):
+    """Kubernetes label value - up to 63 alphanumeric, '-', '_' or '.'
+    characters, beginning and ending with alphanumeric one.
+    """
+
+    return re.sub(r'[^A-Za-z0-9_.-]', '-', str(value))[:63].strip('-_.')
+
+
+def _tenant_label_value():
+    return _label_value(getattr(ctx, 'tenant_name', None) or DEFAULT_TENANT)
+
+
+def _deployment_label_selector():
+    """Selector of resources owned by deployment of current tenant."""
+    return '{0}={1},{2}={3}'.format(
+        OWNERSHIP_LABEL_DEPLOYMENT_ID, _label_value(ctx.deployment.id),
+        OWNERSHIP_LABEL_TENANT, _tenant_label_value())
+
+
+def _add_ownership_labels(resource_definition):
+    if not ctx.node.properties.get(NODE_PROPERTY_OWNERSHIP_LABELS, True):
+        return
+
+    # node properties are not modified
+    metadata = dict(resource_definition.metadata or {})
+    metadata['labels'] = dict(metadata.get('labels') or {})
+    metadata['labels'].update({
+        OWNERSHIP_LABEL_DEPLOYMENT_ID: _label_value(ctx.deployment.id),
+        OWNERSHIP_LABEL_TENANT: _tenant_label_value(),
+        OWNERSHIP_LABEL_NODE_ID: _label_value(ctx.node.id),
+        OWNERSHIP_LABEL_INSTANCE_ID: _label_value(ctx.instance.id)
+    })
+    resource_definition.metadata = metadata
+
+
 def _do_resource_create(client, api_mapping, resource_definition, **kwargs):
     if 'namespace' not in kwargs:
         kwargs['namespace'] = DEFAULT_NAMESPACE
 
+    _add_ownership_labels(resource_definition)
+
     options = ctx.node.properties.get(NODE_PROPERTY_OPTIONS, kwargs)
     ctx.logger.debug('Node options {0}'.format(options))
     return JsonCleanuper(client.create_resource(
@@ -124,104 +247,291 @@ def _do_resource_read(client, api_mapping, id, **kwargs):
     )).to_dict()
 
 
-def _do_resource_update(client, api_mapping, resource_definition, **kwargs):
+def _do_resource_read_metadata(client, api_mapping, id, **kwargs):
     if 'namespace' not in kwargs:
         kwargs['namespace'] = DEFAULT_NAMESPACE
 
-    return JsonCleanuper(client.update_resource(
+    options = ctx.node.properties.get(NODE_PROPERTY_OPTIONS, kwargs)
+    return JsonCleanuper(client.read_resource_metadata(
+        api_mapping,
+        id,
+        options
+    )).to_dict()
+
+
+def _store_metadata(metadata):
+    """Refresh metadata of resource stored in runtime properties."""
+
+    ctx.instance.runtime_properties[INSTANCE_RUNTIME_PROPERTY_KUBERNETES] = \
+        dict(ctx.instance.runtime_properties.get(
+            INSTANCE_RUNTIME_PROPERTY_KUBERNETES) or {}, metadata=metadata)
+
+
+def _do_resource_apply(client, api_mapping, resource_definition, **kwargs):
+    """Server-side apply of declared definition, creates or updates the
+    resource by single request.
+    """
+
+    field_manager = kwargs.pop(OPERATION_INPUT_FIELD_MANAGER, None) or \
+        DEFAULT_FIELD_MANAGER
+    if 'namespace' not in kwargs:
+        kwargs['namespace'] = DEFAULT_NAMESPACE
+
+    _add_ownership_labels(resource_definition)
+
+    options = ctx.node.properties.get(NODE_PROPERTY_OPTIONS, kwargs)
+    return JsonCleanuper(client.apply_resource(
         api_mapping,
         resource_definition,
-        ctx.node.properties.get(NODE_PROPERTY_OPTIONS, kwargs)
+        dict(options),
+        field_manager=field_manager
     )).to_dict()
 
 
-def _do_resource_status_check(resource_kind, response):
+def _stored_resource_version():
+    resource = ctx.instance.runtime_properties.get(
+        INSTANCE_RUNTIME_PROPERTY_KUBERNETES) or {}
+    return (resource.get('metadata') or {}).get('resource_version')
 
-    if resource_kind == "Pod":
-        status = response['status']['phase']
-        if status in ['Failed']:
-            raise NonRecoverableError(
-                'status {0} in phase {1}'.format(
-                    status, ['Failed']))
-        elif status in ['Pending', 'Unknown']:
-            raise OperationRetry(
-                'status {0} in phase {1}'.format(
-                    status, ['Pending', 'Unknown']))
-        elif status in ['Running', 'Succeeded']:
+
+def _conflict_patch(client, api_mapping, resource_definition, changes,
+                    options):
+    """Patch of ``changes`` merged against live resource (lists of named
+    objects changed by others since the last operation are kept), with its
+    current resourceVersion.
+    """
+
+    live = client.read_resource_raw(
+        api_mapping, resource_definition.metadata['name'], dict(options))
+    live_metadata = live.get('metadata') or {}
+
+    patch = definition_merge_patch(live, changes)
+    patch['kind'] = resource_definition.kind
+    patch['apiVersion'] = resource_definition.api_version
+    patch['metadata'] = dict(
+        patch.get('metadata') or {},
+        name=resource_definition.metadata['name'],
+        resourceVersion=live_metadata.get('resourceVersion'))
+    return KubernetesResourceDefinition(**patch)
+
+
+def _do_resource_update(client, api_mapping, resource_definition, **kwargs):
+    """Optimistic update, patch is sent with resourceVersion stored by
+    the last operation (without it for controller managed kinds). After
+    conflict the changes are merged again against live resource.
+    Only changes are sent when given by definition additions, unless
+    server-side apply is requested.
+    """
+
+    if kwargs.pop(OPERATION_INPUT_APPLY, False):
+        # whole declared definition, fields missing in it are removed
+        kwargs.pop(DEFINITION_ADDITIONS, None)
+        return _do_resource_apply(
+            client, api_mapping, resource_definition, **kwargs)
+    kwargs.pop(OPERATION_INPUT_FIELD_MANAGER, None)
+
+    changes = kwargs.get(DEFINITION_ADDITIONS) or kwargs.get(
+        NODE_PROPERTY_DEFINITION,
+        ctx.node.properties.get(NODE_PROPERTY_DEFINITION))
+    patch = resource_definition_patch(resource_definition, **kwargs)
+    kwargs.pop(DEFINITION_ADDITIONS, None)
+    if patch is not None:
+        resource_definition = patch
+
+    if 'namespace' not in kwargs:
+        kwargs['namespace'] = DEFAULT_NAMESPACE
+
+    options = ctx.node.properties.get(NODE_PROPERTY_OPTIONS, kwargs)
+    if getattr(resource_definition, 'kind', None) not in \
+            CONTROLLER_MANAGED_KINDS:
+        resource_version = _stored_resource_version()
+        if resource_version:
+            # node properties are not modified
+            resource_definition.metadata = dict(
+                resource_definition.metadata, resourceVersion=resource_version)
+
+    for attempt in range(1, UPDATE_CONFLICT_ATTEMPTS + 1):
+        try:
+            return JsonCleanuper(client.update_resource(
+                api_mapping,
+                resource_definition,
+                dict(options)
+            )).to_dict()
+        except KuberentesApiOperationError as e:
+            if not e.is_conflict or attempt == UPDATE_CONFLICT_ATTEMPTS:
+                raise
+
+        ctx.logger.info(
+            'Resource {0} modified since version {1}, merging changes with '
+            'current version'.format(
+                resource_definition.metadata['name'],
+                resource_definition.metadata.get('resourceVersion')))
+        resource_definition = _conflict_patch(
+            client, api_mapping, resource_definition, changes, options)
+
+
+def _do_resource_status_check(resource_kind, response,
+                              wait_for_load_balancer=False):
+    readiness = evaluate_readiness(resource_kind, response,
+                                   wait_for_load_balancer)
+
+    if readiness is None:
+        return
+    elif readiness.is_failed:
+        raise NonRecoverableError(readiness.message)
+    elif readiness.is_retry:
+        raise OperationRetry(readiness.message)
+
+    ctx.logger.debug(readiness.message)
+
+
+def _wait_for_status(check, wait):
+    """Call ``check`` until it stops raising ``OperationRetry`` or ``wait``
+    seconds pass. Checking again inside task is much cheaper than retry
+    of whole operation scheduled by Cloudify.
+    """
+
+    deadline = time.time() + (wait or 0)
+    interval = WAIT_INTERVAL_INITIAL
+    progress = None
+
+    while True:
+        try:
+            return check()
+        except OperationRetry as e:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise
+
+            # report progress only when it changes
+            if str(e) != progress:
+                progress = str(e)
+                ctx.logger.info(progress)
+
+            delay = min(interval, remaining)
             ctx.logger.debug(
-                'status {0} in phase {1}'.format(
-                    status, ['Running', 'Succeeded']))
-
-    elif resource_kind == "Service":
-        status = response.get('status')
-        load_balancer = status.get('load_balancer')
-        if response.get('spec', {}).get('type', '') == 'Ingress' and \
-                load_balancer and load_balancer.get('ingress') is None:
-            raise OperationRetry(
-                'status {0} in phase {1}'.format(
-                    status,
-                    [{'load_balancer': {'ingress': None}}]))
-        else:
-            ctx.logger.debug('status {0}'.format(status))
-
-    elif resource_kind == 'Deployment':
-        conditions = response['status']['conditions']
-        if isinstance(conditions, list):
-            for condition in conditions:
-                if condition['type'] == 'Available':
-                    ctx.logger.debug('Deployment condition is Available')
-
-                elif condition['type'] == 'ReplicaFailure':
-                    raise NonRecoverableError(
-                        'Deployment condition is ReplicaFailure ,'
-                        'reason:{0}, message: {1}'
-                        ''.format(condition['reason'], condition['message']))
-
-                elif condition['type'] == 'Progressing':
-                    raise OperationRetry(
-                        'Deployment condition is Progressing')
-        else:
-            raise OperationRetry('Deployment condition is not ready yet')
+                'Checking again in {0:.1f} seconds'.format(delay))
+            time.sleep(delay)
+            interval = min(interval * WAIT_INTERVAL_BACKOFF, WAIT_INTERVAL_MAX)
 
-    elif resource_kind == 'PersistentVolumeClaim':
-        status = response['status']['phase']
-        if status in ['Pending', 'Available', 'Bound']:
-            ctx.logger.debug('PersistentVolumeClaim status is Bound')
 
-        else:
-            raise OperationRetry(
-                'Unknown PersistentVolume status {0}'.format(status))
+def _watch_for_status(client, api_mapping, check, wait, **kwargs):
+    """Call ``check`` with each new state of resource streamed by watch
+    until it stops raising ``OperationRetry`` or ``wait`` seconds pass.
+    Change is noticed as soon as API server reports it, without repeated
+    reads of the resource.
+    """
 
-    elif resource_kind == 'PersistentVolume':
-        status = response['status']['phase']
-        if status in ['Bound', 'Available']:
-            ctx.logger.debug('PersistentVolume status is {0}'.format(status))
+    if 'namespace' not in kwargs:
+        kwargs['namespace'] = DEFAULT_NAMESPACE
 
-        else:
-            raise OperationRetry(
-                'Unknown PersistentVolume status {0}'.format(status))
+    options = ctx.node.properties.get(NODE_PROPERTY_OPTIONS, kwargs)
+    resource_id = _retrieve_id(ctx.instance)
+    deadline = time.time() + wait
+    last_retry = None
+
+    while True:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            raise last_retry
+
+        # watch may be closed by API server before timeout, then it is
+        # simply started again
+        found = False
+        for resource in client.watch_resource(
+                api_mapping, resource_id, options, remaining):
+            found = True
+            try:
+                return check(JsonCleanuper(resource).to_dict())
+            except OperationRetry as e:
+                if last_retry is None or str(e) != str(last_retry):
+                    ctx.logger.info(str(e))
+                last_retry = e
+
+        if not found:
+            raise KuberentesError(
+                'Resource {0} not found by watch'.format(resource_id))
+
+
+def _store_load_balancer_ingress(response):
+    ingress = ((response.get('status') or {}).get('load_balancer') or {})\
+        .get('ingress')
+    if not ingress:
+        return
+
+    if ingress[0].get('ip'):
+        ctx.instance.runtime_properties[
+            INSTANCE_RUNTIME_PROPERTY_LOAD_BALANCER_IP] = ingress[0]['ip']
+    if ingress[0].get('hostname'):
+        ctx.instance.runtime_properties[
+            INSTANCE_RUNTIME_PROPERTY_LOAD_BALANCER_HOSTNAME] = \
+            ingress[0]['hostname']
+
+
+def _do_resource_read_and_check(client, api_mapping, resource_definition,
+                                **kwargs):
+    wait = kwargs.pop(OPERATION_INPUT_WAIT, 0)
+    wait_for_load_balancer = kwargs.pop(
+        OPERATION_INPUT_WAIT_FOR_LOAD_BALANCER, False)
+    resource_type = getattr(resource_definition, 'kind')
+
+    if kwargs.pop(OPERATION_INPUT_METADATA_ONLY, False):
+        # existence and version only, readiness is not checked
+        _store_metadata(_do_resource_read_metadata(
+            client,
+            api_mapping,
+            _retrieve_id(ctx.instance),
+            **kwargs))
+        return
 
-    elif resource_kind in ['ReplicaSet', 'ReplicationController']:
-        ready_replicas = response['status'].get('ready_replicas')
-        replicas = response['status'].get('replicas')
+    def _store_and_check(read_response):
+        # Store read response.
+        ctx.instance.runtime_properties[
+            INSTANCE_RUNTIME_PROPERTY_KUBERNETES] = read_response
 
-        if ready_replicas is None:
-            raise OperationRetry(
-                '{0} status not ready yet'.format(resource_kind))
+        ctx.logger.info(
+            'Resource definition: {0}'.format(read_response))
 
-        elif ready_replicas != replicas:
-            raise OperationRetry(
-                'Only {0} of {1} replicas are ready'.format(
-                    ready_replicas, replicas))
+        if resource_type == 'Service':
+            _store_load_balancer_ingress(read_response)
+
+        if resource_type:
+            _do_resource_status_check(resource_type, read_response,
+                                      wait_for_load_balancer)
+            ctx.logger.info(
+                'Resource definition: {0}'.format(resource_type))
+
+    def _read_and_check():
+        # Read All resources.
+        _store_and_check(_do_resource_read(
+            client,
+            api_mapping,
+            _retrieve_id(ctx.instance),
+            **kwargs
+        ))
 
-        elif ready_replicas == replicas:
-            ctx.logger.debug('All {0} replicas are ready now'.format(replicas))
+    if wait and resource_type in WATCHED_KINDS:
+        deadline = time.time() + wait
+        try:
+            return _watch_for_status(
+                client, api_mapping, _store_and_check, wait, **kwargs)
+        except KuberentesError as e:
+            # e.g. watch not permitted, status is polled instead
+            ctx.logger.warn(
+                'Cannot watch resource, falling back to polling: {0}'
+                .format(str(e)))
+            wait = max(0, deadline - time.time())
+
+    _wait_for_status(_read_and_check, wait)
 
 
 def _do_resource_delete(client, api_mapping, resource_definition,
                         resource_id, **kwargs):
 
+    propagation_policy = kwargs.pop(OPERATION_INPUT_PROPAGATION_POLICY, None)
     options = ctx.node.properties.get(NODE_PROPERTY_OPTIONS, kwargs)
+    if propagation_policy:
+        options = dict(options, propagation_policy=propagation_policy)
     if 'namespace' not in options:
         options['namespace'] = DEFAULT_NAMESPACE
 
@@ -247,6 +557,136 @@ def _do_resource_delete(client, api_mapping, resource_definition,
     )).to_dict()
 
 
+def _do_resource_delete_first(client, api_mapping, resource_definition,
+                              resource_id, **kwargs):
+    """Delete resource without reading it first, missing resource is
+    treated as already deleted. With ``wait`` input removal of resource is
+    awaited inside the task, otherwise deletion is only requested.
+    """
+
+    wait = kwargs.pop(OPERATION_INPUT_WAIT, 0)
+
+    try:
+        _do_resource_delete(
+            client,
+            api_mapping,
+            resource_definition,
+            resource_id,
+            **kwargs
+        )
+    except KuberentesApiOperationError as e:
+        if not e.is_not_found:
+            raise
+        ctx.logger.debug(
+            'Resource {0} already deleted'.format(resource_id))
+        return
+
+    if not wait:
+        return
+
+    def _check_deleted():
+        try:
+            _do_resource_read_metadata(
+                client, api_mapping, resource_id, **kwargs)
+        except KuberentesApiOperationError as e:
+            if e.is_not_found:
+                return
+            raise
+
+        raise OperationRetry(
+            'Waiting for resource {0} to be deleted'.format(resource_id))
+
+    _wait_for_status(_check_deleted, wait)
+
+
+def _do_resource_delete_and_check(client, api_mapping, resource_definition,
+                                  **kwargs):
+    if kwargs.pop(OPERATION_INPUT_DELETE_FIRST, False):
+        return _do_resource_delete_first(
+            client,
+            api_mapping,
+            resource_definition,
+            _retrieve_id(ctx.instance),
+            **kwargs
+        )
+
+    kwargs.pop(OPERATION_INPUT_WAIT, None)
+    try:
+        # only existence and current metadata are needed
+        _store_metadata(_do_resource_read_metadata(
+            client,
+            api_mapping,
+            _retrieve_id(ctx.instance),
+            **kwargs))
+    except KuberentesApiOperationError as e:
+        if e.is_not_found:
+            ctx.logger.debug(
+                'Ignoring error: {0}'.format(str(e)))
+        else:
+            raise RecoverableError(
+                'Raising error: {0}'.format(str(e)))
+    else:
+        delete_response = _do_resource_delete(
+            client,
+            api_mapping,
+            resource_definition,
+            _retrieve_id(ctx.instance),
+            **kwargs
+        )
+
+        raise OperationRetry(
+            'Delete response: {0}'.format(delete_response))
+
+
+def master_create(**kwargs):
+    """Resolve configuration variant of Master once, resource operations
+    then use it without selecting the variant again.
+    """
+
+    try:
+        resolved = resolved_configuration(ctx.node, ctx.instance)
+    except KuberentesError as e:
+        raise NonRecoverableError(str(e))
+
+    ctx.logger.info('Kubernetes API configured by {0}'.format(
+        ', '.join(resolved['configuration'])))
+    ctx.instance.runtime_properties[
+        INSTANCE_RUNTIME_PROPERTY_RESOLVED_CONFIGURATION] = resolved
+
+
+@with_kubernetes_client
+def master_start(client, **kwargs):
+    """Validate connectivity of Master and store server version and API
+    versions in ``connection`` runtime property. Connection descriptor
+    (with certificates materialized on agent) is added to resolved
+    configuration, so resource operations set up client without any
+    download or kubeconfig parsing.
+    """
+
+    try:
+        discovery = client.discover()
+    except KuberentesError as e:
+        raise RecoverableError(str(e))
+
+    ctx.logger.info('Connected to Kubernetes API {0} version {1}'.format(
+        client.host, discovery['server_version']))
+    ctx.instance.runtime_properties[INSTANCE_RUNTIME_PROPERTY_CONNECTION] = \
+        dict(discovery, host=client.host)
+
+    # configuration may be changed (by runtime properties) since create
+    resolved = resolved_configuration(ctx.node, ctx.instance)
+    # token given by API options does not expire
+    descriptor = connection_descriptor(
+        with_api_key=ApiOptionsConfiguration.API_OPTIONS_KEY in
+        resolved['configuration'])
+    if descriptor:
+        resolved['configuration'][
+            ConnectionConfiguration.CONNECTION_KEY] = descriptor
+    ctx.instance.runtime_properties[
+        INSTANCE_RUNTIME_PROPERTY_RESOLVED_CONFIGURATION] = resolved
+
+
+@with_profiling
 @with_kubernetes_client
 @resource_task(
     retrieve_resource_definition=resource_definition_from_blueprint,
@@ -261,6 +701,7 @@ def resource_create(client, api_mapping, resource_definition, **kwargs):
             **kwargs)
 
 
+@with_profiling
 @with_kubernetes_client
 @resource_task(
     retrieve_resource_definition=resource_definition_from_blueprint,
@@ -270,28 +711,11 @@ def resource_read(client, api_mapping, resource_definition, **kwargs):
     """Attempt to resolve the lifecycle logic.
     """
 
-    # Read All resources.
-    read_response = _do_resource_read(
-        client,
-        api_mapping,
-        _retrieve_id(ctx.instance),
-        **kwargs
-    )
-
-    # Store read response.
-    ctx.instance.runtime_properties[INSTANCE_RUNTIME_PROPERTY_KUBERNETES] = \
-        read_response
-
-    ctx.logger.info(
-        'Resource definition: {0}'.format(read_response))
-
-    resource_type = getattr(resource_definition, 'kind')
-    if resource_type:
-        _do_resource_status_check(resource_type, read_response)
-        ctx.logger.info(
-            'Resource definition: {0}'.format(resource_type))
+    _do_resource_read_and_check(
+        client, api_mapping, resource_definition, **kwargs)
 
 
+@with_profiling
 @with_kubernetes_client
 @resource_task(
     retrieve_resource_definition=resource_definition_from_blueprint,
@@ -306,40 +730,18 @@ def resource_update(client, api_mapping, resource_definition, **kwargs):
             **kwargs)
 
 
+@with_profiling
 @with_kubernetes_client
 @resource_task(
     retrieve_resource_definition=resource_definition_from_blueprint,
     retrieve_mapping=mapping_by_kind,
 )
 def resource_delete(client, api_mapping, resource_definition, **kwargs):
-
-    try:
-        read_response = _do_resource_read(client,
-                                          api_mapping,
-                                          _retrieve_id(ctx.instance),
-                                          **kwargs)
-        ctx.instance.runtime_properties[INSTANCE_RUNTIME_PROPERTY_KUBERNETES] \
-            = read_response
-    except KuberentesApiOperationError as e:
-        if '"code":404' in str(e):
-            ctx.logger.debug(
-                'Ignoring error: {0}'.format(str(e)))
-        else:
-            raise RecoverableError(
-                'Raising error: {0}'.format(str(e)))
-    else:
-        delete_response = _do_resource_delete(
-            client,
-            api_mapping,
-            resource_definition,
-            _retrieve_id(ctx.instance),
-            **kwargs
-        )
-
-        raise OperationRetry(
-            'Delete response: {0}'.format(delete_response))
+    _do_resource_delete_and_check(
+        client, api_mapping, resource_definition, **kwargs)
 
 
+@with_profiling
 @with_kubernetes_client
 @resource_task(
     retrieve_resource_definition=resource_definition_from_blueprint,
@@ -354,6 +756,18 @@ def custom_resource_create(client, api_mapping, resource_definition, **kwargs):
             **kwargs)
 
 
+@with_profiling
+@with_kubernetes_client
+@resource_task(
+    retrieve_resource_definition=resource_definition_from_blueprint,
+    retrieve_mapping=mapping_by_data
+)
+def custom_resource_read(client, api_mapping, resource_definition, **kwargs):
+    _do_resource_read_and_check(
+        client, api_mapping, resource_definition, **kwargs)
+
+
+@with_profiling
 @with_kubernetes_client
 @resource_task(
     retrieve_resource_definition=resource_definition_from_blueprint,
@@ -368,109 +782,555 @@ def custom_resource_update(client, api_mapping, resource_definition, **kwargs):
             **kwargs)
 
 
+@with_profiling
 @with_kubernetes_client
 @resource_task(
     retrieve_resource_definition=resource_definition_from_blueprint,
     retrieve_mapping=mapping_by_data
 )
 def custom_resource_delete(client, api_mapping, resource_definition, **kwargs):
+    _do_resource_delete_and_check(
+        client, api_mapping, resource_definition, **kwargs)
+
+
+@resource_task(
+    retrieve_resource_definition=resource_definition_from_file,
+    retrieve_mapping=mapping_by_kind
+)
+def _do_file_resource_create(client, api_mapping, resource_definition,
+                             **kwargs):
+    """Create (or apply) resource of single file.
+
+    :return: Tuple of hash of rendered definition and result.
+    """
+
+    digest = _definition_hash(resource_definition)
+
+    if kwargs.pop(OPERATION_INPUT_APPLY, False):
+        return digest, _do_resource_apply(
+            client,
+            api_mapping,
+            resource_definition,
+            **kwargs
+        )
+
+    kwargs.pop(OPERATION_INPUT_FIELD_MANAGER, None)
     try:
-        read_response = _do_resource_read(client,
-                                          api_mapping,
-                                          _retrieve_id(ctx.instance),
-                                          **kwargs)
-        ctx.instance.runtime_properties[INSTANCE_RUNTIME_PROPERTY_KUBERNETES] \
-            = read_response
-    except KuberentesApiOperationError as e:
-        if '"code":404' in str(e):
-            ctx.logger.debug(
-                'Ignoring error: {0}'.format(str(e)))
-        else:
-            raise RecoverableError(
-                'Raising error: {0}'.format(str(e)))
-    else:
-        delete_response = _do_resource_delete(
+        return digest, _do_resource_create(
             client,
             api_mapping,
             resource_definition,
-            _retrieve_id(ctx.instance),
             **kwargs
         )
+    except KuberentesApiOperationError as e:
+        if not e.is_conflict:
+            raise
+        # created by interrupted run, before it was recorded
+        resource = _owned_resource(
+            client, api_mapping, resource_definition, **kwargs)
+        if resource is None:
+            raise
+        ctx.logger.info('Resource {0} already created by this instance'
+                        .format(resource['metadata'].get('name')))
+        return digest, resource
+
+
+def _do_file_resource_update(client, resource_definition, **kwargs):
+    """Send whole rendered definition of file applied before (ownership
+    labels of the resource are kept by the patch).
+    """
 
-        raise OperationRetry(
-            'Delete response: {0}'.format(delete_response))
+    try:
+        api_mapping = get_mapping(kind=resource_definition.kind)
+    except KuberentesMappingNotFoundError as e:
+        raise NonRecoverableError(str(e))
+
+    if 'namespace' not in kwargs:
+        kwargs['namespace'] = DEFAULT_NAMESPACE
+
+    options = ctx.node.properties.get(NODE_PROPERTY_OPTIONS, kwargs)
+    return JsonCleanuper(client.update_resource(
+        api_mapping,
+        resource_definition,
+        dict(options)
+    )).to_dict()
+
+
+def _owned_resource(client, api_mapping, resource_definition, **kwargs):
+    """Read resource of definition, return it only when ownership labels
+    mark it as created by this node instance.
+    """
+
+    if not ctx.node.properties.get(NODE_PROPERTY_OWNERSHIP_LABELS, True):
+        return None
+
+    resource = _do_resource_read(
+        client,
+        api_mapping,
+        resource_definition.metadata['name'],
+        **kwargs
+    )
+    labels = (resource.get('metadata') or {}).get('labels') or {}
+    if labels.get(OWNERSHIP_LABEL_DEPLOYMENT_ID) != \
+            _label_value(ctx.deployment.id) or \
+            labels.get(OWNERSHIP_LABEL_TENANT) != _tenant_label_value() or \
+            labels.get(OWNERSHIP_LABEL_INSTANCE_ID) != \
+            _label_value(ctx.instance.id):
+        return None
+    return resource
 
 
-@with_kubernetes_client
 @resource_task(
     retrieve_resource_definition=resource_definition_from_file,
     retrieve_mapping=mapping_by_kind
 )
-def file_resource_create(client, api_mapping, resource_definition, **kwargs):
-    result = _do_resource_create(
+def _do_file_resource_delete(client, api_mapping, resource_definition,
+                             resource_id=None, **kwargs):
+    # resource is never read before delete
+    kwargs.pop(OPERATION_INPUT_DELETE_FIRST, None)
+    _do_resource_delete_first(
         client,
         api_mapping,
         resource_definition,
+        resource_id or _retrieve_id(ctx.instance),
         **kwargs
     )
 
-    if INSTANCE_RUNTIME_PROPERTY_KUBERNETES in \
-            ctx.instance.runtime_properties:
 
-        if isinstance(
-            ctx.instance.runtime_properties[
-                INSTANCE_RUNTIME_PROPERTY_KUBERNETES
-            ],
-            dict
-        ):
-            path = _retrieve_path(kwargs)
+def _ledger_entry(digest, result):
+    """Entry of applied files ledger - hash of rendered definition and
+    uid of resource.
+    """
 
-            ctx.instance.runtime_properties[
-                INSTANCE_RUNTIME_PROPERTY_KUBERNETES
-            ][path] = result
+    return {'hash': digest,
+            'uid': ((result or {}).get('metadata') or {}).get('uid')}
 
-            return
 
-    else:
-        ctx.instance.runtime_properties[INSTANCE_RUNTIME_PROPERTY_KUBERNETES]\
-            = result
+def _store_files_results(results, ledger):
+    ctx.instance.runtime_properties[INSTANCE_RUNTIME_PROPERTY_KUBERNETES] = \
+        dict(results)
+    ctx.instance.runtime_properties[
+        INSTANCE_RUNTIME_PROPERTY_APPLIED_FILES] = dict(ledger)
+
+
+def _do_files_operation(operation, file_resources):
+    """Call ``operation(file_resource, results, ledger)`` for each file,
+    which updates results and ledger of applied files (dictionaries by
+    file path) in memory. Runtime properties are written once at the end
+    and checkpointed every ``FILES_CHECKPOINT_INTERVAL`` files and on
+    failure, so retry continues with remaining files.
+    """
+
+    results = dict(ctx.instance.runtime_properties.get(
+        INSTANCE_RUNTIME_PROPERTY_KUBERNETES) or {})
+    ledger = dict(ctx.instance.runtime_properties.get(
+        INSTANCE_RUNTIME_PROPERTY_APPLIED_FILES) or {})
+
+    done = 0
+    try:
+        for file_resource in file_resources:
+            if operation(file_resource, results, ledger):
+                done += 1
+                if done % FILES_CHECKPOINT_INTERVAL == 0:
+                    _store_files_results(results, ledger)
+                    ctx.instance.update()
+    except Exception:
+        _store_files_results(results, ledger)
+        ctx.instance.update()
+        raise
+
+    _store_files_results(results, ledger)
 
 
+@with_profiling
 @with_kubernetes_client
-@resource_task(
-    retrieve_resource_definition=resource_definition_from_file,
-    retrieve_mapping=mapping_by_kind
-)
-def file_resource_delete(client, api_mapping, resource_definition, **kwargs):
-    path = _retrieve_path(kwargs)
+def file_resource_create(client, **kwargs):
+    file_resource = kwargs.get(
+        NODE_PROPERTY_FILE, ctx.node.properties.get(NODE_PROPERTY_FILE))
+    digest, result = _do_file_resource_create(client=client, **kwargs)
+    _store_ledger_entry(file_resource, _ledger_entry(digest, result))
+    ctx.instance.runtime_properties[INSTANCE_RUNTIME_PROPERTY_KUBERNETES] = \
+        result
 
-    _do_resource_delete(
-        client,
-        api_mapping,
-        resource_definition,
-        _retrieve_id(ctx.instance, path),
-        **kwargs
-    )
 
+@with_profiling
+@with_kubernetes_client
+def file_resource_delete(client, **kwargs):
+    _do_file_resource_delete(client=client, **kwargs)
 
-def multiple_file_resource_create(**kwargs):
-    ctx.instance.runtime_properties[INSTANCE_RUNTIME_PROPERTY_KUBERNETES]\
-        = {}
 
-    file_resources = kwargs.get(
+@with_profiling
+@with_kubernetes_client
+def multiple_file_resource_create(client, **kwargs):
+    file_resources = kwargs.pop(
         NODE_PROPERTY_FILES,
         ctx.node.properties.get(NODE_PROPERTY_FILES, [])
     )
 
-    for file_resource in file_resources:
-        file_resource_create(file=file_resource, **kwargs)
-
-
-def multiple_file_resource_delete(**kwargs):
-    file_resources = kwargs.get(
+    def _create(file_resource, results, ledger):
+        path = file_resource[NODE_PROPERTY_FILE_RESOURCE_PATH]
+        if path in ledger:
+            resource_definition = KubernetesResourceDefinition(
+                **definition_from_file(file_resource))
+            digest = _definition_hash(resource_definition)
+            if ledger[path].get('hash') == digest:
+                # applied before retry
+                return False
+            if path in results and not kwargs.get(OPERATION_INPUT_APPLY):
+                # file changed since it was applied before retry
+                results[path] = _do_file_resource_update(
+                    client, resource_definition, **kwargs)
+                ledger[path] = _ledger_entry(digest, results[path])
+                return True
+
+        digest, results[path] = _do_file_resource_create(
+            client=client, file=file_resource, **kwargs)
+        ledger[path] = _ledger_entry(digest, results[path])
+        return True
+
+    _do_files_operation(_create, file_resources)
+
+
+@with_profiling
+@with_kubernetes_client
+def multiple_file_resource_delete(client, **kwargs):
+    file_resources = kwargs.pop(
         NODE_PROPERTY_FILES,
         ctx.node.properties.get(NODE_PROPERTY_FILES, [])
     )
 
+    def _delete(file_resource, results, ledger):
+        path = file_resource[NODE_PROPERTY_FILE_RESOURCE_PATH]
+        if path not in results:
+            # deleted before retry or never created
+            return False
+        _do_file_resource_delete(
+            client=client, file=file_resource,
+            resource_id=results[path]['metadata']['name'], **kwargs)
+        del results[path]
+        ledger.pop(path, None)
+        return True
+
+    _do_files_operation(_delete, file_resources)
+
+
+def _definition_hash(resource_definition):
+    """Hash of rendered file definition (before ownership labels)."""
+    return hashlib.sha256(json.dumps(
+        vars(resource_definition), sort_keys=True, default=str
+    )).hexdigest()
+
+
+def _store_ledger_entry(file_resource, entry):
+    ledger = dict(ctx.instance.runtime_properties.get(
+        INSTANCE_RUNTIME_PROPERTY_APPLIED_FILES) or {})
+    ledger[file_resource[NODE_PROPERTY_FILE_RESOURCE_PATH]] = entry
+    ctx.instance.runtime_properties[
+        INSTANCE_RUNTIME_PROPERTY_APPLIED_FILES] = ledger
+
+
+def _do_files_update(client, file_resources, multiple, **kwargs):
+    """Render file resources and send only those which changed since
+    last create or update (by hash of definition in applied files
+    ledger) by pool of ``workers`` threads. Files new in the list are
+    created. Results and ledger entries of succeeded files are stored
+    even when some of them failed.
+    """
+
+    workers = kwargs.pop(OPERATION_INPUT_WORKERS, None) or \
+        DEFAULT_FILE_UPDATE_WORKERS
+    apply = kwargs.pop(OPERATION_INPUT_APPLY, False)
+    field_manager = kwargs.pop(OPERATION_INPUT_FIELD_MANAGER, None) or \
+        DEFAULT_FIELD_MANAGER
+    kwargs.pop(DEFINITION_ADDITIONS, None)
+    if 'namespace' not in kwargs:
+        kwargs['namespace'] = DEFAULT_NAMESPACE
+
+    ledger = dict(ctx.instance.runtime_properties.get(
+        INSTANCE_RUNTIME_PROPERTY_APPLIED_FILES) or {})
+    results = ctx.instance.runtime_properties.get(
+        INSTANCE_RUNTIME_PROPERTY_KUBERNETES)
+    if multiple:
+        results = dict(results or {})
+
+    # (path, hash, resource definition, api mapping, client method)
+    changes = []
     for file_resource in file_resources:
-        file_resource_delete(file=file_resource, **kwargs)
+        path = file_resource[NODE_PROPERTY_FILE_RESOURCE_PATH]
+        resource_definition = KubernetesResourceDefinition(
+            **definition_from_file(file_resource))
+        digest = _definition_hash(resource_definition)
+        if (ledger.get(path) or {}).get('hash') == digest:
+            continue
+
+        exists = (path in results) if multiple else bool(results)
+        if apply or not exists:
+            _add_ownership_labels(resource_definition)
+        method = client.update_resource if exists else client.create_resource
+        if apply:
+            method = client.apply_resource
+        try:
+            api_mapping = get_mapping(kind=resource_definition.kind)
+        except KuberentesMappingNotFoundError as e:
+            raise NonRecoverableError(str(e))
+        changes.append(
+            (path, digest, resource_definition, api_mapping, method))
+
+    ctx.logger.info('{0} of {1} files changed'.format(
+        len(changes), len(file_resources)))
+    if not changes:
+        return
+
+    options = ctx.node.properties.get(NODE_PROPERTY_OPTIONS, kwargs)
+
+    # no ctx in worker threads, client logger is bound already
+    def _update(change):
+        path, digest, resource_definition, api_mapping, method = change
+        arguments = {'field_manager': field_manager} if apply else {}
+        try:
+            return path, digest, JsonCleanuper(method(
+                api_mapping, resource_definition, dict(options),
+                **arguments)).to_dict(), None
+        except KuberentesApiOperationError as e:
+            return path, digest, None, e
+
+    pool = ThreadPool(max(1, min(int(workers), len(changes))))
+    try:
+        updates = pool.map(_update, changes)
+    finally:
+        pool.close()
+        pool.join()
+
+    errors = []
+    for path, digest, result, error in updates:
+        if error is not None:
+            ctx.logger.error('{0}: {1}'.format(path, error))
+            errors.append(error)
+            continue
+
+        if multiple:
+            results[path] = result
+        else:
+            results = result
+        ledger[path] = _ledger_entry(digest, result)
+
+    ctx.instance.runtime_properties[INSTANCE_RUNTIME_PROPERTY_KUBERNETES] = \
+        results
+    ctx.instance.runtime_properties[
+        INSTANCE_RUNTIME_PROPERTY_APPLIED_FILES] = ledger
+
+    if errors:
+        # request rejected as invalid will not succeed on retry
+        error_class = NonRecoverableError \
+            if any(error.is_invalid_request for error in errors) \
+            else RecoverableError
+        raise error_class('{0} of {1} changed files failed: {2}'.format(
+            len(errors), len(changes), errors[0]))
+
+
+@with_profiling
+@with_kubernetes_client
+def file_resource_update(client, **kwargs):
+    _do_files_update(
+        client,
+        [kwargs.pop(NODE_PROPERTY_FILE, None) or
+         ctx.node.properties[NODE_PROPERTY_FILE]],
+        False,
+        **kwargs)
+
+
+@with_profiling
+@with_kubernetes_client
+def multiple_file_resource_update(client, **kwargs):
+    _do_files_update(
+        client,
+        kwargs.pop(NODE_PROPERTY_FILES, None) or
+        ctx.node.properties.get(NODE_PROPERTY_FILES, []),
+        True,
+        **kwargs)
+
+
+def _delete_owned_collection(client, kind, api_version, api_mapping,
+                             options):
+    if kind not in KINDS_WITH_DEPENDENTS:
+        try:
+            client.delete_resource_collection(api_mapping, dict(options))
+            return
+        except KuberentesInvalidApiMethodError:
+            ctx.logger.debug(
+                'Collection delete not supported for {0}'.format(kind))
+
+    # one by one, dependents are deleted by garbage collector
+    for metadata in client.list_resources_metadata(
+            api_mapping, dict(options)):
+        try:
+            client.delete_resource(
+                api_mapping,
+                KubernetesResourceDefinition(
+                    kind, api_version, {'name': metadata.name}),
+                metadata.name,
+                {'namespace': options['namespace'],
+                 'propagation_policy': 'Background'})
+        except KuberentesApiOperationError as e:
+            if not e.is_not_found:
+                raise
+
+
+@with_profiling
+@with_kubernetes_client
+def delete_owned_resources(client, resources, **kwargs):
+    """Delete resources of this deployment (marked by ownership labels) by
+    single collection delete per kind and namespace, then wait for their
+    removal with single list request per kind.
+
+    :param resources: list of dictionaries with ``kind``, ``apiVersion``,
+        ``namespace`` and optional ``api_mapping`` of custom resources.
+    """
+
+    wait = kwargs.get(OPERATION_INPUT_WAIT, 0)
+    label_selector = _deployment_label_selector()
+
+    collections = []
+    for resource in resources:
+        kind = resource['kind'].split('.')[-1]
+        if resource.get('api_mapping'):
+            api_mapping = KubernetesApiMapping(**resource['api_mapping'])
+        else:
+            api_mapping = get_mapping(kind=kind)
+
+        collections.append((kind, resource.get('apiVersion'), api_mapping, {
+            'namespace': resource.get('namespace') or DEFAULT_NAMESPACE,
+            'label_selector': label_selector
+        }))
+
+    def _check_deleted():
+        remaining = sum(
+            len(client.list_resources_metadata(api_mapping, dict(options)))
+            for _, _, api_mapping, options in collections)
+        if remaining:
+            raise OperationRetry(
+                'Waiting for {0} resources of deployment {1} to be deleted'
+                .format(remaining, ctx.deployment.id))
+
+    try:
+        for kind, api_version, api_mapping, options in collections:
+            _delete_owned_collection(
+                client, kind, api_version, api_mapping, options)
+
+        _wait_for_status(_check_deleted, wait)
+    except KuberentesApiOperationError as e:
+        raise RecoverableError(str(e))
+
+
+def _drift_definitions(resource):
+    if resource.get('definition'):
+        return [resource['definition']]
+
+    return [definition_from_file(file_resource)
+            for file_resource in resource.get('files') or []]
+
+
+@with_profiling
+@with_kubernetes_client
+def detect_drift(client, resources, workers=DEFAULT_DRIFT_WORKERS,
+                 **kwargs):
+    """Compare live resources with their definitions (rendered locally for
+    file resources). Live resources are fetched by single list request per
+    kind and namespace (selected by ownership label), only resources not
+    found this way are looked up one by one. Requests are sent by pool of
+    ``workers`` threads.
+
+    Report is logged and stored in ``drift_report`` runtime property as
+    dictionary of node instance id to list of differences, ``None`` means
+    missing resource.
+
+    :param resources: list of dictionaries with ``instances`` ids,
+        ``definition`` or ``files``, ``namespace`` and optional
+        ``api_mapping`` of custom resources.
+    """
+
+    label_selector = _deployment_label_selector()
+
+    # (instances, definition, name, collection key)
+    checks = []
+    collections = {}
+    for resource in resources:
+        for definition in _drift_definitions(resource):
+            kind = definition['kind'].split('.')[-1]
+            metadata = definition.get('metadata') or {}
+            namespace = resource.get('namespace') or \
+                metadata.get('namespace') or DEFAULT_NAMESPACE
+            key = (kind, namespace, repr(resource.get('api_mapping')))
+
+            if key not in collections:
+                if resource.get('api_mapping'):
+                    api_mapping = KubernetesApiMapping(
+                        **resource['api_mapping'])
+                else:
+                    api_mapping = get_mapping(kind=kind)
+                collections[key] = (api_mapping, namespace)
+
+            checks.append((resource['instances'], definition,
+                           metadata.get('name'), key))
+
+    # no ctx in worker threads, client logger is bound already
+    def _list(key):
+        api_mapping, namespace = collections[key]
+        return key, {
+            item['metadata']['name']: item
+            for item in client.list_resources(api_mapping, {
+                'namespace': namespace,
+                'label_selector': label_selector
+            })
+        }
+
+    def _find(index):
+        _, _, name, key = checks[index]
+        api_mapping, namespace = collections[key]
+        items = client.list_resources(api_mapping, {
+            'namespace': namespace,
+            'field_selector': 'metadata.name={0}'.format(name)
+        })
+        return index, items[0] if items else None
+
+    pool = ThreadPool(max(1, int(workers)))
+    try:
+        live = dict(pool.map(_list, list(collections)))
+        # e.g. created without ownership labels
+        found = dict(pool.map(
+            _find, [index for index, check in enumerate(checks)
+                    if check[2] not in live[check[3]]]))
+    except KuberentesApiOperationError as e:
+        raise RecoverableError(str(e))
+    finally:
+        pool.close()
+        pool.join()
+
+    report = {}
+    for index, check in enumerate(checks):
+        instances, definition, name, key = check
+        resource = live[key].get(name) or found.get(index)
+
+        drifts = None
+        if resource is not None:
+            drifts = [str(drift) for drift in
+                      definition_drift(definition, resource)]
+
+        for instance_id in instances:
+            if drifts is None or report.get(instance_id, []) is None:
+                report[instance_id] = None
+            else:
+                report[instance_id] = report.get(instance_id, []) + drifts
+
+    for instance_id, drifts in sorted(report.items()):
+        if drifts is None:
+            ctx.logger.warn('{0}: resource missing'.format(instance_id))
+        elif drifts:
+            ctx.logger.warn('{0}: {1} differences: {2}{3}'.format(
+                instance_id, len(drifts), '; '.join(drifts[:DRIFT_LOG_LIMIT]),
+                ' ...' if len(drifts) > DRIFT_LOG_LIMIT else ''))
+        else:
+            ctx.logger.info('{0}: in sync'.format(instance_id))
+
+    ctx.instance.runtime_properties[INSTANCE_RUNTIME_PROPERTY_DRIFT_REPORT] = \
+        report
@@ -0,0 +1,657 @@
+########
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Offline stand-in for the Kubernetes API server.
+
+Objects are kept in memory, so the plugin can be driven end-to-end through
+the real Kubernetes python client without a cluster. Supports CRUD,
+list / deletecollection with label and field selectors, watch streams,
+per-request latency and error injection. Every request is counted so API
+calls per operation can be measured.
+"""
+
+import os
+import re
+import copy
+import json
+import time
+import uuid
+import random
+import logging
+import tempfile
+import threading
+import collections
+
+from datetime import datetime
+from urlparse import urlparse, parse_qs
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+import yaml
+import jinja2
+
+from cloudify.mocks import (MockCloudifyContext,
+                            MockNodeContext,
+                            MockNodeInstanceContext,
+                            MockRelationshipContext,
+                            MockRelationshipSubjectContext)
+
+from cloudify_kubernetes.decorators import RELATIONSHIP_TYPE_MANAGED_BY_MASTER
+
+PATH_PATTERN = re.compile(
+    r'^/(?:api/(?P<core>v1)|apis/(?P<group>[^/]+)/(?P<version>[^/]+))'
+    r'(?:/namespaces/(?P<namespace>[^/]+))?'
+    r'/(?P<plural>[^/]+)(?:/(?P<name>[^/]+))?(?:/(?P<subresource>[^/]+))?$'
+)
+
+# Fields which are owned by the server and never taken from request body
+SERVER_METADATA_FIELDS = ('uid', 'resourceVersion', 'creationTimestamp',
+                          'generation', 'selfLink')
+
+DEFAULT_WATCH_TIMEOUT = 5
+
+# Discovery responses, without fields removed from newer API servers
+DISCOVERY = {
+    '/version': {'major': '1', 'minor': '10', 'gitVersion': 'v1.10.0'},
+    '/api': {'kind': 'APIVersions', 'versions': ['v1']},
+    '/apis': {'kind': 'APIGroupList', 'apiVersion': 'v1', 'groups': [{
+        'name': 'apps',
+        'versions': [{'groupVersion': 'apps/v1', 'version': 'v1'},
+                     {'groupVersion': 'apps/v1beta1', 'version': 'v1beta1'}],
+        'preferredVersion': {'groupVersion': 'apps/v1', 'version': 'v1'}
+    }]}
+}
+
+
+def default_status(obj):
+    """Report every object as ready, so lifecycle operations finish on the
+    first status check.
+    """
+    kind = obj.get('kind')
+    spec = obj.get('spec') or {}
+    generation = obj['metadata'].get('generation')
+
+    if kind == 'Pod':
+        return {'phase': 'Running'}
+    elif kind in ('PersistentVolume', 'PersistentVolumeClaim'):
+        return {'phase': 'Bound'}
+    elif kind == 'Service':
+        if spec.get('type') == 'LoadBalancer':
+            return {'loadBalancer': {'ingress': [{'ip': '10.0.0.1'}]}}
+        return {'loadBalancer': {}}
+    elif kind in ('Deployment', 'ReplicaSet', 'ReplicationController',
+                  'StatefulSet'):
+        replicas = spec.get('replicas', 1)
+        return {
+            'observedGeneration': generation,
+            'replicas': replicas,
+            'readyReplicas': replicas,
+            'updatedReplicas': replicas,
+            'availableReplicas': replicas,
+            'conditions': [{
+                'type': 'Available',
+                'status': 'True',
+                'reason': 'MinimumReplicasAvailable'
+            }]
+        }
+    return None
+
+
+def merge_patch(target, patch):
+    """Apply JSON merge patch (lists of named objects are merged by name,
+    like strategic merge patch does).
+    """
+    if not isinstance(patch, dict) or not isinstance(target, dict):
+        return copy.deepcopy(patch)
+
+    result = dict(target)
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        elif isinstance(value, list) and isinstance(result.get(key), list) \
+                and all(isinstance(item, dict) and 'name' in item
+                        for item in value + result[key]):
+            items = collections.OrderedDict(
+                (item['name'], item) for item in result[key])
+            for item in value:
+                items[item['name']] = merge_patch(
+                    items.get(item['name'], {}), item)
+            result[key] = items.values()
+        else:
+            result[key] = merge_patch(result.get(key), value)
+    return result
+
+
+def _match_labels(obj, label_selector):
+    if not label_selector:
+        return True
+
+    labels = obj['metadata'].get('labels') or {}
+    for requirement in label_selector.split(','):
+        if '!=' in requirement:
+            key, value = requirement.split('!=', 1)
+            if labels.get(key.strip()) == value.strip():
+                return False
+        elif '=' in requirement:
+            key, value = requirement.replace('==', '=').split('=', 1)
+            if labels.get(key.strip()) != value.strip():
+                return False
+        elif requirement.strip() not in labels:
+            return False
+    return True
+
+
+def _match_fields(obj, field_selector):
+    if not field_selector:
+        return True
+
+    for requirement in field_selector.split(','):
+        path, value = requirement.split('=', 1)
+        current = obj
+        for part in path.strip().split('.'):
+            current = (current or {}).get(part)
+        if current != value.strip():
+            return False
+    return True
+
+
+def _is_true(value):
+    return (value or '').lower() in ('true', '1')
+
+
+class FakeApiCall(object):
+
+    def __init__(self, method, path, status):
+        self.method = method
+        self.path = path
+        self.status = status
+
+
+class _FakeApiRequestHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    # Buffer whole response, so headers and body are not sent as separate
+    # small packets (delayed ACK would dominate measured latency)
+    wbufsize = -1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body, separators=(',', ':'))
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, str(value))
+        self.end_headers()
+        self.wfile.write(data)
+        self.server.fake.record_call(self.command, self.path, status)
+
+    def _send_status(self, status, reason, message, headers=None):
+        self._send_json(status, {
+            'kind': 'Status',
+            'apiVersion': 'v1',
+            'metadata': {},
+            'status': 'Failure',
+            'message': message,
+            'reason': reason,
+            'code': status
+        }, headers)
+
+    def _read_body(self):
+        length = int(self.headers.getheader('Content-Length') or 0)
+        data = self.rfile.read(length) if length else ''
+        if not data:
+            return None
+        content_type = self.headers.getheader('Content-Type') or ''
+        if 'yaml' in content_type:
+            return yaml.safe_load(data)
+        return json.loads(data)
+
+    def _handle(self):
+        fake = self.server.fake
+        url = urlparse(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+        if fake.latency:
+            time.sleep(fake.latency)
+
+        injected = fake.next_injected_error()
+        if injected:
+            # drain request body, so keep-alive connection can be reused
+            self.rfile.read(int(self.headers.getheader('Content-Length') or 0))
+            status, retry_after = injected
+            headers = {'Retry-After': retry_after} \
+                if retry_after is not None else None
+            return self._send_status(
+                status, 'Injected', 'Injected error', headers)
+
+        if self.command == 'GET' and url.path.rstrip('/') in DISCOVERY:
+            return self._send_json(200, DISCOVERY[url.path.rstrip('/')])
+
+        match = PATH_PATTERN.match(url.path)
+        if not match:
+            return self._send_status(404, 'NotFound', 'Unknown path')
+
+        route = match.groupdict()
+        if route['core']:
+            api_version = route['core']
+        else:
+            api_version = '{0}/{1}'.format(route['group'], route['version'])
+        collection = (api_version, route['plural'])
+        namespace = route['namespace']
+        name = route['name']
+        metadata_only = fake.partial_metadata_supported and \
+            'as=PartialObjectMetadata' in (
+                self.headers.getheader('Accept') or '')
+
+        if self.command == 'GET' and not name:
+            if _is_true(query.get('watch')):
+                return self._watch(collection, namespace, query)
+            return self._send_json(200, fake.list_objects(
+                collection, namespace,
+                query.get('labelSelector'), query.get('fieldSelector'),
+                metadata_only))
+        elif self.command == 'GET':
+            obj = fake.get_object(collection, namespace, name)
+            if obj is None:
+                return self._not_found(route)
+            if metadata_only:
+                obj = fake.partial_metadata(obj)
+            return self._send_json(200, obj)
+        elif self.command == 'POST':
+            obj = fake.create_object(
+                collection, namespace, self._read_body())
+            if obj is None:
+                return self._send_status(
+                    409, 'AlreadyExists', 'Object already exists')
+            return self._send_json(201, obj)
+        elif self.command in ('PUT', 'PATCH'):
+            content_type = self.headers.getheader('Content-Type') or ''
+            body = self._read_body()
+            apply = 'apply-patch' in content_type
+            if apply and not query.get('fieldManager'):
+                return self._send_status(
+                    422, 'Invalid',
+                    'fieldManager is required for apply requests')
+            status, obj = fake.update_object(
+                collection, namespace, name, body,
+                replace=self.command == 'PUT',
+                apply=apply,
+                force=_is_true(query.get('force')))
+            if status == 404:
+                return self._not_found(route)
+            elif status == 409:
+                return self._send_status(
+                    409, 'Conflict', 'Object has been modified')
+            return self._send_json(status, obj)
+        elif self.command == 'DELETE' and not name:
+            return self._send_json(200, fake.delete_collection(
+                collection, namespace, query.get('labelSelector')))
+        elif self.command == 'DELETE':
+            obj = fake.delete_object(collection, namespace, name)
+            if obj is None:
+                return self._not_found(route)
+            return self._send_json(200, {
+                'kind': 'Status',
+                'apiVersion': 'v1',
+                'metadata': {},
+                'status': 'Success',
+                'details': {'name': name, 'kind': route['plural']}
+            })
+
+        return self._send_status(405, 'MethodNotAllowed', 'Not allowed')
+
+    def _not_found(self, route):
+        return self._send_status(
+            404, 'NotFound', '{0} "{1}" not found'.format(
+                route['plural'], route['name']))
+
+    def _watch(self, collection, namespace, query):
+        fake = self.server.fake
+        timeout = float(query.get('timeoutSeconds') or DEFAULT_WATCH_TIMEOUT)
+        deadline = time.time() + timeout
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        fake.record_call(self.command, self.path, 200)
+
+        def write_event(event_type, obj):
+            data = json.dumps({'type': event_type, 'object': obj},
+                              separators=(',', ':')) + '\n'
+            self.wfile.write('{0:x}\r\n{1}\r\n'.format(len(data), data))
+            self.wfile.flush()
+
+        def matches(obj):
+            return (namespace is None or
+                    obj['metadata'].get('namespace') == namespace) and \
+                _match_labels(obj, query.get('labelSelector')) and \
+                _match_fields(obj, query.get('fieldSelector'))
+
+        position = fake.event_position(collection)
+        if not query.get('resourceVersion'):
+            for obj in fake.list_objects(
+                    collection, namespace, query.get('labelSelector'),
+                    query.get('fieldSelector'))['items']:
+                write_event('ADDED', obj)
+
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            events, position = fake.wait_events(
+                collection, position, remaining)
+            for event_type, obj in events:
+                if matches(obj):
+                    write_event(event_type, obj)
+
+        self.wfile.write('0\r\n\r\n')
+        self.wfile.flush()
+
+    do_GET = _handle
+    do_POST = _handle
+    do_PUT = _handle
+    do_PATCH = _handle
+    do_DELETE = _handle
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeKubernetesApiServer(object):
+    """In-memory Kubernetes API server listening on localhost.
+
+    :param latency: seconds to sleep before handling every request.
+    :param error_rate: probability (0..1) of answering any request with
+        ``error_status``.
+    :param error_status: HTTP status used by ``error_rate``.
+    :param status_factory: callable returning ``status`` of stored object,
+        by default every object is reported as ready.
+    :param partial_metadata_supported: whether ``PartialObjectMetadata``
+        responses are supported (older API servers return whole objects).
+    """
+
+    def __init__(self, latency=0, error_rate=0, error_status=500,
+                 status_factory=default_status, seed=None,
+                 partial_metadata_supported=True):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.status_factory = status_factory
+        self.partial_metadata_supported = partial_metadata_supported
+
+        self.calls = []
+        self._objects = collections.defaultdict(collections.OrderedDict)
+        self._events = collections.defaultdict(list)
+        self._injected = collections.deque()
+        self._resource_version = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Condition()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return 'http://{0}:{1}'.format(*self._server.server_address)
+
+    def start(self):
+        self._server = _ThreadingHTTPServer(
+            ('127.0.0.1', 0), _FakeApiRequestHandler)
+        self._server.fake = self
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    # Statistics
+
+    def record_call(self, method, path, status):
+        with self._lock:
+            self.calls.append(FakeApiCall(method, path, status))
+
+    def reset_calls(self):
+        with self._lock:
+            self.calls = []
+
+    # Error injection
+
+    def inject_errors(self, status, count=1, retry_after=None):
+        """Answer next ``count`` requests with ``status`` error."""
+        with self._lock:
+            for _ in range(count):
+                self._injected.append((status, retry_after))
+
+    def next_injected_error(self):
+        with self._lock:
+            if self._injected:
+                return self._injected.popleft()
+            if self.error_rate and self._random.random() < self.error_rate:
+                return self.error_status, None
+        return None
+
+    # Storage
+
+    def _next_resource_version(self):
+        self._resource_version += 1
+        return str(self._resource_version)
+
+    def _key(self, obj):
+        return obj['metadata'].get('namespace'), obj['metadata']['name']
+
+    def _store(self, collection, obj, event_type):
+        obj['metadata']['resourceVersion'] = self._next_resource_version()
+        status = self.status_factory(obj) if self.status_factory else None
+        if status is not None:
+            obj['status'] = status
+        if event_type == 'DELETED':
+            self._objects[collection].pop(self._key(obj), None)
+        else:
+            self._objects[collection][self._key(obj)] = obj
+        self._events[collection].append((event_type, copy.deepcopy(obj)))
+        self._lock.notify_all()
+        return copy.deepcopy(obj)
+
+    def get_object(self, collection, namespace, name):
+        with self._lock:
+            obj = self._objects[collection].get((namespace, name))
+            return copy.deepcopy(obj) if obj else None
+
+    def partial_metadata(self, obj):
+        return {
+            'kind': 'PartialObjectMetadata',
+            'apiVersion': 'meta.k8s.io/v1beta1',
+            'metadata': obj['metadata']
+        }
+
+    def list_objects(self, collection, namespace=None, label_selector=None,
+                     field_selector=None, metadata_only=False):
+        with self._lock:
+            items = [
+                copy.deepcopy(obj)
+                for (obj_namespace, _), obj in
+                self._objects[collection].items()
+                if (namespace is None or obj_namespace == namespace) and
+                _match_labels(obj, label_selector) and
+                _match_fields(obj, field_selector)
+            ]
+            if metadata_only:
+                items = [self.partial_metadata(obj) for obj in items]
+            return {
+                'kind': 'List',
+                'apiVersion': collection[0],
+                'metadata': {'resourceVersion': str(self._resource_version)},
+                'items': items
+            }
+
+    def create_object(self, collection, namespace, body):
+        with self._lock:
+            obj = copy.deepcopy(body)
+            metadata = obj.setdefault('metadata', {})
+            for field in SERVER_METADATA_FIELDS:
+                metadata.pop(field, None)
+            if namespace:
+                metadata['namespace'] = namespace
+            if not metadata.get('name') and metadata.get('generateName'):
+                metadata['name'] = metadata['generateName'] + \
+                    uuid.uuid4().hex[:5]
+            if self._key(obj) in self._objects[collection]:
+                return None
+            metadata['uid'] = str(uuid.uuid4())
+            metadata['generation'] = 1
+            if collection == ('v1', 'services'):
+                obj.setdefault('spec', {}).setdefault(
+                    'clusterIP', '10.96.0.{0}'.format(
+                        len(self._objects[collection]) + 1))
+            metadata['creationTimestamp'] = \
+                datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+            return self._store(collection, obj, 'ADDED')
+
+    def update_object(self, collection, namespace, name, body,
+                      replace=False, apply=False, force=False):
+        with self._lock:
+            current = self._objects[collection].get((namespace, name))
+            if current is None:
+                if not apply:
+                    return 404, None
+                return 201, self.create_object(collection, namespace, body)
+
+            expected_version = (body.get('metadata') or {}).get(
+                'resourceVersion')
+            if expected_version and not force and \
+                    expected_version != current['metadata'][
+                        'resourceVersion']:
+                return 409, None
+
+            if replace:
+                obj = copy.deepcopy(body)
+            else:
+                obj = merge_patch(current, body)
+
+            metadata = obj.setdefault('metadata', {})
+            for field in SERVER_METADATA_FIELDS:
+                if field in current['metadata']:
+                    metadata[field] = current['metadata'][field]
+            if obj.get('spec') != current.get('spec'):
+                metadata['generation'] = current['metadata'][
+                    'generation'] + 1
+            return 200, self._store(collection, obj, 'MODIFIED')
+
+    def delete_object(self, collection, namespace, name):
+        with self._lock:
+            obj = self._objects[collection].get((namespace, name))
+            if obj is None:
+                return None
+            return self._store(collection, copy.deepcopy(obj), 'DELETED')
+
+    def delete_collection(self, collection, namespace, label_selector=None):
+        with self._lock:
+            deleted = [
+                self._store(collection, copy.deepcopy(obj), 'DELETED')
+                for (obj_namespace, _), obj in
+                list(self._objects[collection].items())
+                if (namespace is None or obj_namespace == namespace) and
+                _match_labels(obj, label_selector)
+            ]
+            return {
+                'kind': 'List',
+                'apiVersion': collection[0],
+                'metadata': {},
+                'items': deleted
+            }
+
+    # Watch
+
+    def event_position(self, collection):
+        with self._lock:
+            return len(self._events[collection])
+
+    def wait_events(self, collection, position, timeout):
+        with self._lock:
+            if len(self._events[collection]) <= position:
+                self._lock.wait(timeout)
+            events = self._events[collection][position:]
+            return events, position + len(events)
+
+
+class FakeOperationContext(MockCloudifyContext):
+    """Operation context of resource node managed by master configured to
+    use given fake API server. Blueprint files are rendered from in-memory
+    ``templates`` dictionary.
+    """
+
+    def __init__(self, server, templates=None, master_properties=None,
+                 master_runtime_properties=None, **kwargs):
+        self._templates = templates or {}
+        self._rendered_paths = []
+
+        master_properties = master_properties or {}
+        master_properties.setdefault('configuration', {
+            'api_options': {'host': server.url}
+        })
+        master = MockRelationshipContext(
+            target=MockRelationshipSubjectContext(
+                node=MockNodeContext('master', master_properties),
+                instance=MockNodeInstanceContext(
+                    'master', master_runtime_properties or {})
+            ),
+            type=RELATIONSHIP_TYPE_MANAGED_BY_MASTER
+        )
+
+        kwargs.setdefault('node_id', 'resource')
+        kwargs.setdefault('node_name', 'resource')
+        kwargs.setdefault('blueprint_id', 'blueprint')
+        kwargs.setdefault('deployment_id', 'deployment')
+        kwargs.setdefault('operation', {'retry_number': 0})
+        kwargs['relationships'] = [master] + kwargs.get('relationships', [])
+        super(FakeOperationContext, self).__init__(**kwargs)
+        self.logger.setLevel(logging.ERROR)
+
+    def download_resource(self, resource_path, target_path=None):
+        _, path = tempfile.mkstemp()
+        with open(path, 'w') as downloaded:
+            downloaded.write(self._templates[resource_path])
+        self._rendered_paths.append(path)
+        return path
+
+    def download_resource_and_render(self, resource_path, target_path=None,
+                                     template_variables=None):
+        template = jinja2.Template(self._templates[resource_path])
+        _, path = tempfile.mkstemp()
+        with open(path, 'w') as rendered:
+            rendered.write(template.render(template_variables or {}))
+        self._rendered_paths.append(path)
+        return path
+
+    def cleanup(self):
+        for path in self._rendered_paths:
+            os.remove(path)
+        self._rendered_paths = []
@@ -119,6 +119,31 @@ class TestDecorators(unittest.TestCase):
             {'blueprint_file_name': 'kubernetes.conf'}
         )
 
+    def test_retrieve_configuration(self):
+        managed_master_node, _ctx = self._prepare_master_node()
+        master_instance = managed_master_node.target.instance
+        master_instance.runtime_properties = {}
+        self.assertEqual(
+            decorators._retrieve_configuration(_ctx.instance),
+            {'blueprint_file_name': 'kubernetes.conf'})
+
+        master_instance.runtime_properties[
+            'resolved_configuration'] = decorators.resolved_configuration(
+                managed_master_node.target.node, master_instance)
+        master_instance.runtime_properties['resolved_configuration'][
+            'configuration'] = {'manager_file_path': '/resolved'}
+        self.assertEqual(
+            decorators._retrieve_configuration(_ctx.instance),
+            {'manager_file_path': '/resolved'})
+
+        # configuration changed since Master was created
+        master_instance.runtime_properties['configuration'] = {
+            'api_options': {'host': 'https://cluster'}}
+        self.assertEqual(
+            decorators._retrieve_configuration(_ctx.instance),
+            {'blueprint_file_name': 'kubernetes.conf',
+             'api_options': {'host': 'https://cluster'}})
+
     def test_with_kubernetes_client_RecoverableError(self):
         _, _ctx = self._prepare_master_node()
 
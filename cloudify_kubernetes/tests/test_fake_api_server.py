@@ -0,0 +1,805 @@
+########
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import shutil
+import tempfile
+import threading
+import unittest
+from mock import MagicMock, patch
+
+import kubernetes
+
+from cloudify.exceptions import (NonRecoverableError,
+                                 OperationRetry,
+                                 RecoverableError)
+from cloudify.mocks import MockCloudifyContext
+from cloudify.state import current_ctx
+
+import cloudify_kubernetes.tasks as tasks
+import cloudify_kubernetes.utils as utils
+from cloudify_kubernetes.k8s.config import ApiOptionsConfiguration
+from cloudify_kubernetes.tests.fake_api_server import (
+    default_status,
+    FakeKubernetesApiServer,
+    FakeOperationContext
+)
+
+POD_DEFINITION = {
+    'apiVersion': 'v1',
+    'kind': 'Pod',
+    'metadata': {'name': 'nginx'},
+    'spec': {'containers': [{'name': 'nginx', 'image': 'nginx'}]}
+}
+
+SERVICE_DEFINITION = {
+    'apiVersion': 'v1',
+    'kind': 'Service',
+    'metadata': {'name': 'nginx'},
+    'spec': {'type': 'LoadBalancer', 'ports': [{'port': 80}]}
+}
+
+POD_TEMPLATE = """
+apiVersion: v1
+kind: Pod
+metadata:
+  name: {{ name }}
+spec:
+  containers:
+  - name: nginx
+    image: nginx
+"""
+
+
+class TestFakeApiServer(unittest.TestCase):
+
+    def setUp(self):
+        super(TestFakeApiServer, self).setUp()
+        self.server = FakeKubernetesApiServer().start()
+
+    def tearDown(self):
+        current_ctx.clear()
+        self.server.stop()
+        super(TestFakeApiServer, self).tearDown()
+
+    def _prepare_context(self, properties, **kwargs):
+        _ctx = FakeOperationContext(self.server, properties=properties,
+                                    **kwargs)
+        current_ctx.set(_ctx)
+        return _ctx
+
+    def test_master_lifecycle(self):
+        configuration = {'api_options': {'host': self.server.url,
+                                         'api_key': 'token'}}
+        _ctx = MockCloudifyContext(
+            node_id='master', properties={'configuration': configuration},
+            operation={'retry_number': 0})
+        current_ctx.set(_ctx)
+
+        tasks.master_create()
+        tasks.master_start()
+        self.assertEqual(_ctx.instance.runtime_properties['connection'], {
+            'host': self.server.url,
+            'server_version': 'v1.10.0',
+            'api_versions': ['apps/v1', 'v1']
+        })
+        self.assertEqual(
+            _ctx.instance.runtime_properties['resolved_configuration'][
+                'configuration']['connection']['api_key'],
+            {'authorization': 'Bearer token'})
+
+        # resource operation uses connection descriptor
+        self._prepare_context(
+            {'definition': POD_DEFINITION,
+             'options': {'namespace': 'default'}},
+            master_properties={'configuration': configuration},
+            master_runtime_properties=_ctx.instance.runtime_properties)
+        with patch.object(ApiOptionsConfiguration,
+                          '_do_prepare_api') as api_options_prepare_api:
+            tasks.resource_create()
+
+        self.assertFalse(api_options_prepare_api.called)
+        self.assertIsNotNone(
+            self.server.get_object(('v1', 'pods'), 'default', 'nginx'))
+
+    def test_master_start_failed(self):
+        _ctx = MockCloudifyContext(
+            node_id='master',
+            properties={'configuration': {
+                'api_options': {'host': self.server.url}}},
+            operation={'retry_number': 0})
+        current_ctx.set(_ctx)
+        tasks.master_create()
+
+        self.server.inject_errors(403)
+        with self.assertRaises(RecoverableError):
+            tasks.master_start()
+        self.assertNotIn('connection', _ctx.instance.runtime_properties)
+
+    def test_resource_lifecycle(self):
+        _ctx = self._prepare_context({
+            'definition': POD_DEFINITION,
+            'options': {'namespace': 'default'}
+        })
+
+        tasks.resource_create()
+        self.assertEqual(
+            _ctx.instance.runtime_properties['kubernetes']['metadata'][
+                'name'], 'nginx')
+
+        tasks.resource_read()
+        self.assertEqual(
+            _ctx.instance.runtime_properties['kubernetes']['status'][
+                'phase'], 'Running')
+
+        with self.assertRaises(OperationRetry):
+            tasks.resource_delete()
+        tasks.resource_delete()
+
+        self.assertEqual(
+            [(call.method, call.status) for call in self.server.calls],
+            [('POST', 201), ('GET', 200), ('GET', 200), ('DELETE', 200),
+             ('GET', 404)]
+        )
+
+    def _assert_read_metadata_only(self):
+        _ctx = self._prepare_context({
+            'definition': POD_DEFINITION,
+            'options': {'namespace': 'default'}
+        })
+        tasks.resource_create()
+        self.server.update_object(('v1', 'pods'), 'default', 'nginx',
+                                  {'metadata': {'labels': {'app': 'web'}}})
+
+        tasks.resource_read(metadata_only=True)
+
+        resource = _ctx.instance.runtime_properties['kubernetes']
+        self.assertEqual(resource['metadata']['labels']['app'], 'web')
+        self.assertEqual(
+            resource['metadata']['resource_version'],
+            self.server.get_object(('v1', 'pods'), 'default', 'nginx')[
+                'metadata']['resourceVersion'])
+        # the rest is kept from create response
+        self.assertEqual(resource['spec']['containers'][0]['name'], 'nginx')
+
+    def test_resource_read_metadata_only(self):
+        self._assert_read_metadata_only()
+
+    def test_resource_read_metadata_only_unsupported(self):
+        self.server.partial_metadata_supported = False
+        self._assert_read_metadata_only()
+
+    def test_resource_update(self):
+        _ctx = self._prepare_context({
+            'definition': POD_DEFINITION,
+            'options': {'namespace': 'default'}
+        })
+        tasks.resource_create()
+        self.server.reset_calls()
+
+        tasks.resource_update(definitions_additions={
+            'metadata': {'labels': {'app': 'web'}}})
+
+        self.assertEqual(
+            [(call.method, call.status) for call in self.server.calls],
+            [('PATCH', 200)])
+        self.assertEqual(
+            _ctx.instance.runtime_properties['kubernetes']['metadata'][
+                'labels']['app'], 'web')
+
+    def test_resource_update_conflict(self):
+        _ctx = self._prepare_context({
+            'definition': POD_DEFINITION,
+            'options': {'namespace': 'default'}
+        })
+        tasks.resource_create()
+        # modified by someone else since create
+        self.server.update_object(('v1', 'pods'), 'default', 'nginx',
+                                  {'metadata': {'labels': {'tier': 'web'}}})
+        self.server.reset_calls()
+
+        tasks.resource_update(definitions_additions={
+            'metadata': {'labels': {'app': 'web'}}})
+
+        self.assertEqual(
+            [(call.method, call.status) for call in self.server.calls],
+            [('PATCH', 409), ('GET', 200), ('PATCH', 200)])
+        labels = _ctx.instance.runtime_properties['kubernetes'][
+            'metadata']['labels']
+        self.assertEqual((labels['app'], labels['tier']), ('web', 'web'))
+
+    def test_resource_update_controller_managed(self):
+        _ctx = self._prepare_context({
+            'definition': SERVICE_DEFINITION,
+            'options': {'namespace': 'default'}
+        })
+        tasks.resource_create()
+        tasks.resource_read()
+        # status updated by controller since the last read
+        self.server.update_object(('v1', 'services'), 'default', 'nginx',
+                                  {'metadata': {'annotations': {'lb': 'x'}}})
+        self.server.reset_calls()
+
+        tasks.resource_update(definitions_additions={
+            'metadata': {'labels': {'app': 'web'}}})
+
+        # merge patch sent without stale resourceVersion
+        self.assertEqual(
+            [(call.method, call.status) for call in self.server.calls],
+            [('PATCH', 200)])
+        self.assertEqual(
+            _ctx.instance.runtime_properties['kubernetes']['metadata'][
+                'labels']['app'], 'web')
+
+    def test_resource_update_conflict_merged(self):
+        self._prepare_context({
+            'definition': POD_DEFINITION,
+            'options': {'namespace': 'default'}
+        })
+        tasks.resource_create()
+        # container added by someone else since create
+        self.server.update_object(('v1', 'pods'), 'default', 'nginx', {
+            'spec': {'containers': POD_DEFINITION['spec']['containers'] + [
+                {'name': 'sidecar', 'image': 'busybox'}]}})
+        self.server.reset_calls()
+
+        tasks.resource_update(definitions_additions={
+            'spec': {'containers': [{'name': 'nginx',
+                                     'image': 'nginx:1.15'}]}})
+
+        self.assertEqual(
+            [(call.method, call.status) for call in self.server.calls],
+            [('PATCH', 409), ('GET', 200), ('PATCH', 200)])
+        pod = self.server.get_object(('v1', 'pods'), 'default', 'nginx')
+        self.assertEqual(
+            [(container['name'], container['image'])
+             for container in pod['spec']['containers']],
+            [('nginx', 'nginx:1.15'), ('sidecar', 'busybox')])
+
+    def test_resource_update_apply(self):
+        self._prepare_context({
+            'definition': POD_DEFINITION,
+            'options': {'namespace': 'default'}
+        })
+        tasks.resource_create()
+        self.server.reset_calls()
+
+        tasks.resource_update(apply=True, definitions_additions={
+            'metadata': {'labels': {'app': 'web'}}})
+
+        self.assertEqual(
+            [(call.method, call.status) for call in self.server.calls],
+            [('PATCH', 200)])
+        self.assertIn('fieldManager=cloudify', self.server.calls[0].path)
+        self.assertIn('force=true', self.server.calls[0].path)
+        pod = self.server.get_object(('v1', 'pods'), 'default', 'nginx')
+        self.assertEqual(pod['metadata']['labels']['app'], 'web')
+        self.assertEqual(pod['spec'], POD_DEFINITION['spec'])
+
+    def test_file_resource_create_apply(self):
+        self._prepare_context(
+            {'file': {'resource_path': 'pod.yaml',
+                      'template_variables': {'name': 'nginx'}}},
+            templates={'pod.yaml': POD_TEMPLATE})
+
+        tasks.file_resource_create(apply=True, field_manager='deployer')
+        # repeated create updates the resource
+        tasks.file_resource_create(apply=True, field_manager='deployer')
+
+        self.assertEqual(
+            [(call.method, call.status) for call in self.server.calls],
+            [('PATCH', 201), ('PATCH', 200)])
+        self.assertIn('fieldManager=deployer', self.server.calls[0].path)
+        self.assertEqual(
+            self.server.get_object(('v1', 'pods'), 'default', 'nginx')[
+                'metadata']['labels'][tasks.OWNERSHIP_LABEL_DEPLOYMENT_ID],
+            'deployment')
+
+    def test_resource_delete_first(self):
+        self._prepare_context({
+            'definition': POD_DEFINITION,
+            'options': {'namespace': 'default'}
+        })
+        tasks.resource_create()
+        self.server.reset_calls()
+
+        tasks.resource_delete(delete_first=True,
+                              propagation_policy='Background')
+        # already deleted
+        tasks.resource_delete(delete_first=True)
+
+        self.assertEqual(
+            [(call.method, call.status) for call in self.server.calls],
+            [('DELETE', 200), ('DELETE', 404)])
+
+    def test_resource_delete_first_wait(self):
+        self._prepare_context({
+            'definition': POD_DEFINITION,
+            'options': {'namespace': 'default'}
+        })
+        tasks.resource_create()
+        self.server.reset_calls()
+
+        tasks.resource_delete(delete_first=True, wait=5)
+
+        self.assertEqual(
+            [(call.method, call.status) for call in self.server.calls],
+            [('DELETE', 200), ('GET', 404)])
+
+    def test_delete_owned_resources(self):
+        for node_id, definition in (('pod', POD_DEFINITION),
+                                    ('service', SERVICE_DEFINITION)):
+            self._prepare_context({
+                'definition': definition,
+                'options': {'namespace': 'default'}
+            }, node_id=node_id)
+            tasks.resource_create()
+        # not created by this deployment
+        self.server.create_object(('v1', 'pods'), 'default', {
+            'kind': 'Pod', 'apiVersion': 'v1',
+            'metadata': {'name': 'other'}})
+        # deployment with the same id of other tenant
+        self.server.create_object(('v1', 'pods'), 'default', {
+            'kind': 'Pod', 'apiVersion': 'v1',
+            'metadata': {'name': 'other-tenant', 'labels': {
+                tasks.OWNERSHIP_LABEL_DEPLOYMENT_ID: 'deployment',
+                tasks.OWNERSHIP_LABEL_TENANT: 'other'}}})
+        self.server.reset_calls()
+
+        self._prepare_context({
+            'definition': POD_DEFINITION,
+            'options': {'namespace': 'default'}
+        })
+        tasks.delete_owned_resources(resources=[
+            {'kind': 'Pod', 'apiVersion': 'v1', 'namespace': 'default'},
+            {'kind': 'Service', 'apiVersion': 'v1', 'namespace': 'default'}
+        ], wait=5)
+
+        self.assertEqual(
+            [item['metadata']['name'] for item in
+             self.server.list_objects(('v1', 'pods'))['items']],
+            ['other', 'other-tenant'])
+        self.assertEqual(
+            self.server.list_objects(('v1', 'services'))['items'], [])
+        self.assertEqual(
+            [(call.method, call.path.split('?')[0])
+             for call in self.server.calls],
+            [
+                # single collection delete of pods
+                ('DELETE', '/api/v1/namespaces/default/pods'),
+                # services can be deleted only one by one
+                ('GET', '/api/v1/namespaces/default/services'),
+                ('DELETE', '/api/v1/namespaces/default/services/nginx'),
+                # single check of each kind
+                ('GET', '/api/v1/namespaces/default/pods'),
+                ('GET', '/api/v1/namespaces/default/services')
+            ])
+
+    def test_detect_drift(self):
+        pods = {}
+        for index in range(3):
+            pods[index] = dict(POD_DEFINITION,
+                               metadata={'name': 'pod-{0}'.format(index)})
+            self._prepare_context({'definition': pods[index]},
+                                  node_id='pod-{0}'.format(index))
+            tasks.resource_create()
+        # drifted
+        self.server.update_object(('v1', 'pods'), 'default', 'pod-1', {
+            'spec': {'containers': [{'name': 'nginx',
+                                     'image': 'nginx:latest'}]}})
+        # created without ownership labels
+        self.server.create_object(
+            ('v1', 'pods'), 'default',
+            dict(POD_DEFINITION, metadata={'name': 'unlabeled'}))
+        self.server.reset_calls()
+
+        _ctx = self._prepare_context({'definition': POD_DEFINITION})
+        tasks.detect_drift(resources=[
+            {'instances': ['pod-0-instance'], 'definition': pods[0]},
+            {'instances': ['pod-1-instance'], 'definition': pods[1]},
+            {'instances': ['pod-2-instance'], 'definition': pods[2]},
+            {'instances': ['unlabeled-instance'],
+             'definition': dict(POD_DEFINITION,
+                                metadata={'name': 'unlabeled'})},
+            {'instances': ['missing-instance'],
+             'definition': dict(POD_DEFINITION,
+                                metadata={'name': 'missing'})}
+        ], workers=4)
+
+        self.assertEqual(_ctx.instance.runtime_properties['drift_report'], {
+            'pod-0-instance': [],
+            'pod-1-instance': [
+                'spec.containers[0].image: expected "nginx", '
+                'found "nginx:latest"'],
+            'pod-2-instance': [],
+            'unlabeled-instance': [],
+            'missing-instance': None
+        })
+        # single list of labeled pods, lookups of the rest
+        self.assertEqual(
+            sorted(call.path.split('?')[1].split('=')[0]
+                   for call in self.server.calls),
+            ['fieldSelector', 'fieldSelector', 'labelSelector'])
+
+    def test_resource_create_injected_error(self):
+        self._prepare_context({
+            'definition': POD_DEFINITION,
+            'options': {'namespace': 'default'}
+        })
+        self.server.inject_errors(403)
+        self.server.inject_errors(422)
+        self.server.inject_errors(503)
+
+        with self.assertRaises(RecoverableError):
+            tasks.resource_create()
+        with self.assertRaises(NonRecoverableError):
+            tasks.resource_create()
+        with patch('cloudify_kubernetes.k8s.client.time.sleep'):
+            tasks.resource_create()
+        with self.assertRaises(RecoverableError):
+            tasks.resource_create()
+
+        self.assertEqual(
+            [call.status for call in self.server.calls],
+            [403, 422, 503, 201, 409])
+
+    def test_resource_create_throttled(self):
+        self._prepare_context({
+            'definition': POD_DEFINITION,
+            'options': {'namespace': 'default'}
+        })
+        self.server.inject_errors(429, count=2, retry_after=0)
+
+        tasks.resource_create()
+
+        self.assertEqual(
+            [call.status for call in self.server.calls], [429, 429, 201])
+
+    def _pending_load_balancer(self, obj):
+        if obj.get('kind') == 'Service':
+            return {'loadBalancer': {}}
+        return default_status(obj)
+
+    def _allocate_load_balancer(self):
+        self.server.status_factory = default_status
+        self.server.update_object(('v1', 'services'), 'default', 'nginx',
+                                  {'metadata': {'labels': {'lb': 'ready'}}})
+
+    def test_resource_read_load_balancer_watch(self):
+        _ctx = self._prepare_context({
+            'definition': SERVICE_DEFINITION,
+            'options': {'namespace': 'default'}
+        })
+        self.server.status_factory = self._pending_load_balancer
+        tasks.resource_create()
+        self.server.reset_calls()
+
+        allocation = threading.Timer(0.2, self._allocate_load_balancer)
+        allocation.start()
+        try:
+            tasks.resource_read(wait=5, wait_for_load_balancer=True)
+        finally:
+            allocation.join()
+
+        self.assertEqual(
+            _ctx.instance.runtime_properties['load_balancer_ip'], '10.0.0.1')
+        self.assertEqual(
+            [call.path.split('?')[0] for call in self.server.calls],
+            ['/api/v1/namespaces/default/services'])
+
+    def test_resource_read_load_balancer_timeout(self):
+        _ctx = self._prepare_context({
+            'definition': SERVICE_DEFINITION,
+            'options': {'namespace': 'default'}
+        })
+        self.server.status_factory = self._pending_load_balancer
+        tasks.resource_create()
+
+        with self.assertRaises(OperationRetry) as error:
+            tasks.resource_read(wait=0.2, wait_for_load_balancer=True)
+
+        self.assertIn('Waiting for load balancer ingress of service nginx',
+                      str(error.exception))
+        self.assertNotIn('load_balancer_ip', _ctx.instance.runtime_properties)
+
+    def test_resource_read_load_balancer_not_provided(self):
+        # clusters without load balancer provider never populate ingress
+        _ctx = self._prepare_context({
+            'definition': SERVICE_DEFINITION,
+            'options': {'namespace': 'default'}
+        })
+        self.server.status_factory = self._pending_load_balancer
+        tasks.resource_create()
+
+        tasks.resource_read()
+
+        self.assertEqual(
+            _ctx.instance.runtime_properties['kubernetes']['spec'][
+                'cluster_ip'], '10.96.0.1')
+        self.assertNotIn('load_balancer_ip', _ctx.instance.runtime_properties)
+
+    def test_resource_read_load_balancer_watch_forbidden(self):
+        _ctx = self._prepare_context({
+            'definition': SERVICE_DEFINITION,
+            'options': {'namespace': 'default'}
+        })
+        tasks.resource_create()
+        self.server.reset_calls()
+        self.server.inject_errors(403)
+
+        tasks.resource_read(wait=5, wait_for_load_balancer=True)
+
+        self.assertEqual(
+            _ctx.instance.runtime_properties['load_balancer_ip'], '10.0.0.1')
+        self.assertEqual(
+            [(call.method, call.status) for call in self.server.calls],
+            [('GET', 403), ('GET', 200)])
+
+    def test_multiple_file_resource_lifecycle(self):
+        _ctx = self._prepare_context(
+            {'files': [
+                {'resource_path': 'pod-{0}.yaml'.format(i),
+                 'template_variables': {'name': 'pod-{0}'.format(i)}}
+                for i in range(3)
+            ]},
+            templates={'pod-{0}.yaml'.format(i): POD_TEMPLATE
+                       for i in range(3)}
+        )
+
+        tasks.multiple_file_resource_create()
+        self.assertEqual(
+            sorted(item['metadata']['name'] for item in
+                   self.server.list_objects(('v1', 'pods'))['items']),
+            ['pod-0', 'pod-1', 'pod-2']
+        )
+
+        tasks.multiple_file_resource_delete()
+        self.assertEqual(
+            self.server.list_objects(('v1', 'pods'))['items'], [])
+
+        # repeated delete of missing resources succeeds
+        tasks.multiple_file_resource_delete()
+        _ctx.cleanup()
+
+    def test_multiple_file_resource_create_checkpoint(self):
+        templates = {'pod-{0}.yaml'.format(i): POD_TEMPLATE
+                     for i in range(11)}
+        _ctx = self._prepare_context(
+            {'files': [
+                {'resource_path': 'pod-{0}.yaml'.format(i),
+                 'template_variables': {'name': 'pod-{0}'.format(i)}}
+                for i in range(12)
+            ]},
+            templates=templates
+        )
+        _ctx.instance.update = MagicMock()
+
+        # template of the last file is missing
+        with self.assertRaises(RecoverableError):
+            tasks.multiple_file_resource_create()
+
+        # after 10 files and on failure
+        self.assertEqual(_ctx.instance.update.call_count, 2)
+        self.assertEqual(
+            len(_ctx.instance.runtime_properties['kubernetes']), 11)
+
+        self.server.reset_calls()
+        templates['pod-11.yaml'] = POD_TEMPLATE
+        tasks.multiple_file_resource_create()
+
+        self.assertEqual(
+            [(call.method, call.status) for call in self.server.calls],
+            [('POST', 201)])
+        self.assertEqual(
+            len(_ctx.instance.runtime_properties['applied_files']), 12)
+        _ctx.cleanup()
+
+    def test_multiple_file_resource_create_resume(self):
+        _ctx = self._prepare_context(
+            {'files': [
+                {'resource_path': 'pod-{0}.yaml'.format(i),
+                 'template_variables': {'name': 'pod-{0}'.format(i)}}
+                for i in range(3)
+            ]},
+            templates={'pod-{0}.yaml'.format(i): POD_TEMPLATE
+                       for i in range(3)}
+        )
+        tasks.multiple_file_resource_create()
+        ledger = _ctx.instance.runtime_properties['applied_files']
+        self.assertEqual(
+            ledger['pod-0.yaml']['uid'],
+            self.server.get_object(('v1', 'pods'), 'default', 'pod-0')[
+                'metadata']['uid'])
+
+        # interrupted before last two files were recorded
+        for path in ('pod-1.yaml', 'pod-2.yaml'):
+            del ledger[path]
+            del _ctx.instance.runtime_properties['kubernetes'][path]
+        self.server.reset_calls()
+        tasks.multiple_file_resource_create()
+
+        self.assertEqual(
+            [(call.method, call.status) for call in self.server.calls],
+            [('POST', 409), ('GET', 200)] * 2)
+        self.assertEqual(
+            sorted(_ctx.instance.runtime_properties['applied_files']),
+            ['pod-0.yaml', 'pod-1.yaml', 'pod-2.yaml'])
+        _ctx.cleanup()
+
+    def test_multiple_file_resource_create_resume_changed(self):
+        _ctx = self._prepare_context(
+            {'files': [
+                {'resource_path': 'pod-{0}.yaml'.format(i),
+                 'template_variables': {'name': 'pod-{0}'.format(i)}}
+                for i in range(2)
+            ]},
+            templates={'pod-{0}.yaml'.format(i): POD_TEMPLATE
+                       for i in range(2)}
+        )
+        tasks.multiple_file_resource_create()
+        digest = _ctx.instance.runtime_properties['applied_files'][
+            'pod-0.yaml']['hash']
+
+        # file edited before retry
+        _ctx._templates['pod-0.yaml'] = POD_TEMPLATE.replace(
+            'image: nginx', 'image: nginx:1.15')
+        self.server.reset_calls()
+        tasks.multiple_file_resource_create()
+
+        self.assertEqual(
+            [(call.method, call.status) for call in self.server.calls],
+            [('PATCH', 200)])
+        self.assertEqual(
+            self.server.get_object(('v1', 'pods'), 'default', 'pod-0')[
+                'spec']['containers'][0]['image'], 'nginx:1.15')
+        self.assertNotEqual(
+            _ctx.instance.runtime_properties['applied_files'][
+                'pod-0.yaml']['hash'], digest)
+        _ctx.cleanup()
+
+    def test_file_resource_create_conflict_not_owned(self):
+        self.server.create_object(('v1', 'pods'), 'default', POD_DEFINITION)
+        _ctx = self._prepare_context(
+            {'file': {'resource_path': 'pod.yaml',
+                      'template_variables': {'name': 'nginx'}}},
+            templates={'pod.yaml': POD_TEMPLATE})
+
+        with self.assertRaises(RecoverableError):
+            tasks.file_resource_create()
+        self.assertNotIn('applied_files', _ctx.instance.runtime_properties)
+        _ctx.cleanup()
+
+    def test_multiple_file_resource_create_template_cache(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        templates = {
+            'pod.yaml': POD_TEMPLATE,
+            'labeled.yaml': POD_TEMPLATE.replace(
+                'name: {{ name }}',
+                'name: {{ name }}\n  labels:\n'
+                '    instance: "{{ ctx.instance.id }}"')
+        }
+        properties = {
+            'files': [
+                {'resource_path': 'pod.yaml',
+                 'template_variables': {'name': 'pod-0'}},
+                {'resource_path': 'labeled.yaml',
+                 'template_variables': {'name': 'labeled'}}
+            ],
+            'template_cache': {'enabled': True, 'directory': directory}
+        }
+
+        render = MagicMock(wraps=utils._render_template)
+        with patch('cloudify_kubernetes.utils._render_template', render):
+            _ctx = self._prepare_context(properties, templates=templates)
+            tasks.multiple_file_resource_create()
+            self.assertEqual(render.call_count, 2)
+            _ctx.cleanup()
+
+            # another node instance renders only template referring to ctx
+            self.server.delete_object(('v1', 'pods'), 'default', 'pod-0')
+            self.server.delete_object(('v1', 'pods'), 'default', 'labeled')
+            _ctx = self._prepare_context(properties, templates=templates,
+                                         node_id='resource_2')
+            tasks.multiple_file_resource_create()
+            self.assertEqual(render.call_count, 3)
+            self.assertEqual(
+                self.server.get_object(('v1', 'pods'), 'default', 'labeled')[
+                    'metadata']['labels']['instance'], 'resource_2')
+            _ctx.cleanup()
+
+            # source changed by deployment update is rendered again
+            self.server.delete_object(('v1', 'pods'), 'default', 'pod-0')
+            templates['pod.yaml'] = POD_TEMPLATE.replace(
+                'image: nginx', 'image: nginx:1.15')
+            properties['files'] = properties['files'][:1]
+            _ctx = self._prepare_context(properties, templates=templates,
+                                         node_id='resource_3')
+            tasks.multiple_file_resource_create()
+            self.assertEqual(render.call_count, 4)
+            self.assertEqual(
+                self.server.get_object(('v1', 'pods'), 'default', 'pod-0')[
+                    'spec']['containers'][0]['image'], 'nginx:1.15')
+            _ctx.cleanup()
+
+    def test_multiple_file_resource_update(self):
+        files = [{'resource_path': 'pod-{0}.yaml'.format(i),
+                  'template_variables': {'name': 'pod-{0}'.format(i)}}
+                 for i in range(4)]
+        _ctx = self._prepare_context(
+            {'files': files[:3]},
+            templates={'pod-{0}.yaml'.format(i): POD_TEMPLATE
+                       for i in range(4)}
+        )
+        tasks.multiple_file_resource_create()
+        self.server.reset_calls()
+
+        # unchanged files cost no API call
+        tasks.multiple_file_resource_update()
+        self.assertEqual(self.server.calls, [])
+
+        _ctx._templates['pod-1.yaml'] = POD_TEMPLATE.replace(
+            'image: nginx', 'image: nginx:1.15')
+        tasks.multiple_file_resource_update(files=files)
+
+        self.assertEqual(
+            sorted((call.method, call.status) for call in self.server.calls),
+            [('PATCH', 200), ('POST', 201)])
+        self.assertEqual(
+            self.server.get_object(('v1', 'pods'), 'default', 'pod-1')[
+                'spec']['containers'][0]['image'], 'nginx:1.15')
+        self.assertEqual(
+            sorted(_ctx.instance.runtime_properties['kubernetes']),
+            ['pod-0.yaml', 'pod-1.yaml', 'pod-2.yaml', 'pod-3.yaml'])
+
+        self.server.reset_calls()
+        tasks.multiple_file_resource_update(files=files)
+        self.assertEqual(self.server.calls, [])
+        _ctx.cleanup()
+
+    def test_file_resource_update_failed(self):
+        _ctx = self._prepare_context(
+            {'file': {'resource_path': 'pod.yaml',
+                      'template_variables': {'name': 'nginx'}}},
+            templates={'pod.yaml': POD_TEMPLATE})
+        tasks.file_resource_create()
+        ledger = dict(_ctx.instance.runtime_properties['applied_files'])
+        self.server.delete_object(('v1', 'pods'), 'default', 'nginx')
+
+        _ctx._templates['pod.yaml'] = POD_TEMPLATE.replace(
+            'image: nginx', 'image: nginx:1.15')
+        with self.assertRaises(RecoverableError):
+            tasks.file_resource_update()
+
+        # retried on next update
+        self.assertEqual(_ctx.instance.runtime_properties['applied_files'],
+                         ledger)
+        _ctx.cleanup()
+
+    def test_watch(self):
+        self.server.create_object(('v1', 'pods'), 'default', POD_DEFINITION)
+
+        configuration = kubernetes.client.Configuration()
+        configuration.host = self.server.url
+        api = kubernetes.client.CoreV1Api(
+            kubernetes.client.ApiClient(configuration))
+        events = list(kubernetes.watch.Watch().stream(
+            api.list_namespaced_pod, 'default', timeout_seconds=0.1))
+
+        self.assertEqual([event['type'] for event in events], ['ADDED'])
+        self.assertEqual(events[0]['object'].metadata.name, 'nginx')
+
+
+if __name__ == '__main__':
+    unittest.main()
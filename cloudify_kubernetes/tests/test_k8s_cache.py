@@ -0,0 +1,99 @@
+########
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+import unittest
+from mock import patch
+
+from cloudify_kubernetes.k8s.cache import (cache_key,
+                                           private_directory,
+                                           KubernetesLocalCache)
+
+
+class TestKubernetesLocalCache(unittest.TestCase):
+
+    def setUp(self):
+        super(TestKubernetesLocalCache, self).setUp()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        super(TestKubernetesLocalCache, self).tearDown()
+
+    def _cache(self, size=10):
+        return KubernetesLocalCache(size, directory=self.directory)
+
+    def _touch(self, cache, key, mtime):
+        os.utime(os.path.join(cache.directory, key), (mtime, mtime))
+
+    def test_cache_key(self):
+        self.assertEqual(cache_key('a', {'x': 1, 'y': 2}),
+                         cache_key('a', {'y': 2, 'x': 1}))
+        self.assertNotEqual(cache_key('a', {'x': 1}),
+                            cache_key('a', {'x': 2}))
+
+    def test_get_put(self):
+        cache = self._cache()
+        self.assertIsNone(cache.get('a'))
+
+        cache.put('a', 'abc')
+        self.assertEqual(cache.get('a'), 'abc')
+        self.assertEqual(self._cache().get('a'), 'abc')
+
+    def test_evict_least_recently_used(self):
+        cache = self._cache()
+        cache.put('a', 'aaaa')
+        cache.put('b', 'bbbb')
+        self._touch(cache, 'a', 1000)
+        self._touch(cache, 'b', 1001)
+        cache.get('a')
+
+        cache.put('c', 'cccc')
+        self.assertEqual(sorted(os.listdir(self.directory)), ['a', 'c'])
+
+    def test_private_directory(self):
+        directory = os.path.join(self.directory, 'private')
+        self.assertTrue(private_directory(directory))
+        self.assertTrue(private_directory(directory))
+
+        os.chmod(directory, 0o755)
+        self.assertFalse(private_directory(directory))
+
+        link = os.path.join(self.directory, 'link')
+        os.symlink(self.directory, link)
+        self.assertFalse(private_directory(link))
+
+    def test_directory_of_other_user(self):
+        os.chmod(self.directory, 0o700)
+        with patch('os.geteuid', return_value=os.geteuid() + 1):
+            cache = self._cache()
+        self.assertFalse(cache.available)
+
+        cache.put('a', 'abc')
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_too_large(self):
+        cache = self._cache()
+        cache.put('a', 'a' * 11)
+
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
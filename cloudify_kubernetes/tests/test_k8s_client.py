@@ -14,7 +14,7 @@
 # limitations under the License.
 
 import unittest
-from mock import MagicMock
+from mock import MagicMock, patch
 
 from kubernetes.client.rest import ApiException
 from cloudify_kubernetes.k8s import (CloudifyKubernetesClient,
@@ -131,6 +131,78 @@ class TestClient(unittest.TestCase):
             "Exception during Kubernetes API call: (None)\nReason: None\n"
         )
 
+    def _throttled_instance(self, errors, rate_limit=None):
+        api_configuration = MagicMock()
+        api_configuration.prepare_api = MagicMock(return_value=MagicMock())
+        operation_mock = MagicMock()
+        operation_mock.execute = MagicMock(side_effect=errors + ['result'])
+
+        instance = CloudifyKubernetesClient(MagicMock(), api_configuration,
+                                            rate_limit=rate_limit)
+        return instance, operation_mock
+
+    def _throttled_error(self, retry_after=None):
+        error = KuberentesApiOperationError('Too Many Requests', status=429)
+        if retry_after is not None:
+            error.headers = {'Retry-After': retry_after}
+        return error
+
+    def test_execute_throttled(self):
+        instance, operation_mock = self._throttled_instance(
+            [self._throttled_error('3'), self._throttled_error()])
+
+        # time module of client only, pool threads of other tests sleep too
+        with patch('cloudify_kubernetes.k8s.client.time') as mock_time:
+            self.assertEqual(instance._execute(operation_mock, {'a': 'b'}),
+                             'result')
+
+        self.assertEqual(
+            [call[0][0] for call in mock_time.sleep.call_args_list], [3, 1])
+        self.assertEqual(operation_mock.execute.call_count, 3)
+
+    def test_execute_throttled_max_retries(self):
+        instance, operation_mock = self._throttled_instance(
+            [self._throttled_error('1')] * 2, rate_limit={'max_retries': 1})
+
+        with patch('cloudify_kubernetes.k8s.client.time.sleep'):
+            with self.assertRaises(KuberentesApiOperationError) as error:
+                instance._execute(operation_mock, {'a': 'b'})
+
+        self.assertEqual(error.exception.status, 429)
+        self.assertEqual(operation_mock.execute.call_count, 2)
+
+    def test_execute_rate_limited(self):
+        with patch('cloudify_kubernetes.k8s.client.KubernetesApiRateLimiter'
+                   ) as limiter_class:
+            limiter_class.return_value.acquire.return_value = 0.1
+            instance, operation_mock = self._throttled_instance(
+                [self._throttled_error('5')],
+                rate_limit={'qps': 10, 'burst': 20})
+
+            self.assertEqual(instance._execute(operation_mock, {}), 'result')
+
+        limiter_class.assert_called_once_with(instance.host, 10, 20)
+        self.assertEqual(instance.rate_limiter.acquire.call_count, 2)
+        instance.rate_limiter.block.assert_called_once_with(5)
+
+    def test_rate_limiter_not_available(self):
+        with patch('cloudify_kubernetes.k8s.client.KubernetesApiRateLimiter'
+                   ) as limiter_class:
+            limiter_class.return_value.available = False
+            instance, _ = self._throttled_instance(
+                [], rate_limit={'qps': 10})
+
+        self.assertIsNone(instance.rate_limiter)
+
+    def test_execute_ApiException_status(self):
+        instance, operation_mock = self._throttled_instance(
+            [ApiException(status=404, reason='Not Found')])
+
+        with self.assertRaises(KuberentesApiOperationError) as error:
+            instance._execute(operation_mock, {})
+
+        self.assertEqual(error.exception.status, 404)
+
     def _prepere_mocks(self):
         logger = MagicMock()
         api_configuration = MagicMock()
@@ -261,6 +333,26 @@ class TestClient(unittest.TestCase):
             }
         )
 
+    def test_prepare_apply_api_client(self):
+
+        instance, _ = self._prepere_mocks()
+        patch = instance.api.ApiClient.return_value.rest_client.PATCH
+
+        api_client = instance._prepare_apply_api_client('cloudify', True)
+        api_client.rest_client.PATCH(
+            'url', query_params=[('pretty', 'true')], body='{}')
+
+        instance.api.ApiClient.assert_called_once_with(
+            header_name='Content-Type',
+            header_value='application/apply-patch+yaml')
+        patch.assert_called_once_with(
+            'url', body='{}',
+            query_params=[('pretty', 'true'), ('fieldManager', 'cloudify'),
+                          ('force', 'true')])
+        # kept for client lifetime
+        self.assertIs(
+            instance._prepare_apply_api_client('cloudify', True), api_client)
+
     def test_execute_delete_resource(self):
 
         instance, mappingMock = self._prepere_mocks()
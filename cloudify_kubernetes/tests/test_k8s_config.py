@@ -14,18 +14,45 @@
 # limitations under the License.
 import unittest
 import os
+import stat
+import shutil
+import tempfile
 from mock import MagicMock, patch
 
+from kubernetes.client import Configuration
+
 from cloudify_kubernetes.k8s.config import (KubernetesApiConfigurationVariants,
                                             ManagerFilePathConfiguration,
                                             BlueprintFileConfiguration,
                                             KubernetesApiConfiguration,
                                             FileContentConfiguration,
-                                            ApiOptionsConfiguration)
+                                            ApiOptionsConfiguration,
+                                            ConnectionConfiguration,
+                                            connection_descriptor,
+                                            resolve_configuration)
 from cloudify_kubernetes.k8s.exceptions import (
     KuberentesApiInitializationFailedError
 )
 
+KUBECONFIG = """
+apiVersion: v1
+kind: Config
+current-context: cluster
+clusters:
+- name: cluster
+  cluster:
+    server: https://cluster:6443
+contexts:
+- name: cluster
+  context:
+    cluster: cluster
+    user: admin
+users:
+- name: admin
+  user:
+    token: secret
+"""
+
 
 class TestKubernetesApiConfiguration(unittest.TestCase):
 
@@ -93,6 +120,82 @@ class TestBlueprintFileConfiguration(unittest.TestCase):
             config_file='downloaded_resource'
         )
 
+    def test_BlueprintFileConfiguration_cache(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        downloaded = []
+
+        def _download_resource(name):
+            _, path = tempfile.mkstemp()
+            with open(path, 'w') as config_file:
+                config_file.write(KUBECONFIG)
+            downloaded.append(path)
+            return path
+
+        mock_download_resource = MagicMock(side_effect=_download_resource)
+        instance = BlueprintFileConfiguration(
+            MagicMock(),
+            {'blueprint_file_name': 'kubernetes.conf'},
+            download_resource=mock_download_resource,
+            blueprint_id='blueprint',
+            deployment_id='deployment',
+            tenant_name='tenant',
+            kubeconfig_cache={'enabled': True, 'directory': directory}
+        )
+
+        instance.prepare_api()
+        # temporary copy is removed
+        self.assertFalse(os.path.exists(downloaded[0]))
+        instance.prepare_api()
+        self.assertEqual(mock_download_resource.call_count, 1)
+        self.assertEqual(Configuration().host, 'https://cluster:6443')
+
+        # corrupted entry is downloaded again
+        for name in os.listdir(directory):
+            with open(os.path.join(directory, name), 'a') as entry:
+                entry.write('#')
+        instance.prepare_api()
+        self.assertEqual(mock_download_resource.call_count, 2)
+
+        # other tenant with the same blueprint and deployment ids
+        BlueprintFileConfiguration(
+            MagicMock(),
+            {'blueprint_file_name': 'kubernetes.conf'},
+            download_resource=mock_download_resource,
+            blueprint_id='blueprint',
+            deployment_id='deployment',
+            tenant_name='other',
+            kubeconfig_cache={'enabled': True, 'directory': directory}
+        ).prepare_api()
+        self.assertEqual(mock_download_resource.call_count, 3)
+
+    def test_BlueprintFileConfiguration_cache_disabled(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        def _download_resource(name):
+            _, path = tempfile.mkstemp()
+            self.addCleanup(os.remove, path)
+            with open(path, 'w') as config_file:
+                config_file.write(KUBECONFIG)
+            return path
+
+        mock_download_resource = MagicMock(side_effect=_download_resource)
+        instance = BlueprintFileConfiguration(
+            MagicMock(),
+            {'blueprint_file_name': 'kubernetes.conf'},
+            download_resource=mock_download_resource,
+            blueprint_id='blueprint',
+            deployment_id='deployment',
+            kubeconfig_cache={'directory': directory}
+        )
+
+        instance.prepare_api()
+        instance.prepare_api()
+        self.assertEqual(mock_download_resource.call_count, 2)
+        self.assertEqual(os.listdir(directory), [])
+
 
 class TestManagerFilePathConfiguration(unittest.TestCase):
 
@@ -213,8 +316,114 @@ class TestApiOptionsConfiguration(unittest.TestCase):
             )
 
 
+class TestConnectionConfiguration(unittest.TestCase):
+
+    def setUp(self):
+        super(TestConnectionConfiguration, self).setUp()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        super(TestConnectionConfiguration, self).tearDown()
+
+    def _set_default(self, **options):
+        config = type.__call__(Configuration)
+        for key, value in options.items():
+            setattr(config, key, value)
+        Configuration.set_default(config)
+
+    def test_connection_descriptor(self):
+        _, ca_path = tempfile.mkstemp(dir=self.directory)
+        with open(ca_path, 'w') as ca_file:
+            ca_file.write('certificate')
+        self._set_default(host='https://cluster', ssl_ca_cert=ca_path)
+
+        connection = connection_descriptor(directory=self.directory)
+        os.remove(ca_path)
+        self.assertEqual(connection['host'], 'https://cluster')
+        self.assertEqual(
+            stat.S_IMODE(os.stat(connection['ssl_ca_cert']).st_mode), 0o600)
+        with open(connection['ssl_ca_cert']) as ca_file:
+            self.assertEqual(ca_file.read(), 'certificate')
+
+        self._set_default(host='https://cluster',
+                          api_key={'authorization': 'Bearer token'})
+        self.assertIsNone(connection_descriptor(directory=self.directory))
+        self.assertEqual(
+            connection_descriptor(with_api_key=True,
+                                  directory=self.directory)['api_key'],
+            {'authorization': 'Bearer token'})
+
+        with patch('kubernetes.client', MagicMock()):
+            self.assertTrue(ConnectionConfiguration(MagicMock(), {
+                'connection': connection}).prepare_api())
+        self.assertEqual(Configuration().ssl_ca_cert,
+                         connection['ssl_ca_cert'])
+
+    def test_connection_descriptor_shared_directory(self):
+        _, ca_path = tempfile.mkstemp(dir=self.directory)
+        self._set_default(host='https://cluster', ssl_ca_cert=ca_path)
+        directory = os.path.join(self.directory, 'certificates')
+        os.mkdir(directory, 0o777)
+        os.chmod(directory, 0o777)
+
+        self.assertIsNone(connection_descriptor(directory=directory))
+        self.assertEqual(os.listdir(directory), [])
+
+    def test_missing_certificate(self):
+        instance = KubernetesApiConfigurationVariants(MagicMock(), {
+            'connection': {'host': 'https://cluster',
+                           'ssl_ca_cert': '/missing/certificate'},
+            'api_options': {'host': 'https://other'}
+        })
+
+        instance.prepare_api()
+        self.assertEqual(Configuration().host, 'https://other')
+
+
 class TestKubernetesApiConfigurationVariants(unittest.TestCase):
 
+    def test_select_variants(self):
+        self.assertEqual(
+            KubernetesApiConfigurationVariants.select_variants({
+                'api_options': {'host': 'some_host'},
+                'blueprint_file_name': '',
+                'manager_file_path': '~/.kube/config',
+                'unknown': 'value'
+            }),
+            [ManagerFilePathConfiguration, ApiOptionsConfiguration])
+
+    def test_resolve_configuration(self):
+        self.assertEqual(
+            resolve_configuration({
+                'api_options': {'host': 'some_host', 'unknown': 'value'},
+                'blueprint_file_name': None
+            }),
+            {'api_options': {'host': 'some_host'}})
+
+        with self.assertRaises(KuberentesApiInitializationFailedError):
+            resolve_configuration({'blueprint_file_name': ''})
+
+    def test_KubernetesApiConfigurationVariants_direct(self):
+        mock_download_resource = MagicMock()
+        api_options = {'host': 'some_host', 'api_key': 'token'}
+
+        instance = KubernetesApiConfigurationVariants(
+            MagicMock(),
+            {'api_options': api_options},
+            download_resource=mock_download_resource
+        )
+
+        with patch.object(BlueprintFileConfiguration,
+                          'prepare_api') as blueprint_prepare_api:
+            instance.prepare_api()
+
+        self.assertFalse(blueprint_prepare_api.called)
+        self.assertEqual(Configuration().api_key,
+                         {'authorization': 'Bearer token'})
+        # configuration data is not modified
+        self.assertEqual(api_options['api_key'], 'token')
+
     def test_KubernetesApiConfigurationVariants_Error(self):
         mock_download_resource = MagicMock(side_effect=Exception())
         mock_logger = MagicMock()
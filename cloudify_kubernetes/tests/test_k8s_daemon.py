@@ -0,0 +1,216 @@
+########
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+from mock import MagicMock, patch
+
+from cloudify.state import current_ctx
+
+import cloudify_kubernetes.tasks as tasks
+from cloudify_kubernetes.k8s import CloudifyKubernetesClient
+from cloudify_kubernetes.k8s.config import KubernetesApiConfigurationVariants
+from cloudify_kubernetes.k8s.daemon import (KubernetesClientDaemon,
+                                            SOCKET_NAME)
+from cloudify_kubernetes.tests.fake_api_server import (
+    FakeKubernetesApiServer,
+    FakeOperationContext
+)
+
+POD_DEFINITION = {
+    'apiVersion': 'v1',
+    'kind': 'Pod',
+    'metadata': {'name': 'nginx'},
+    'spec': {'containers': [{'name': 'nginx', 'image': 'nginx'}]}
+}
+
+
+class TestKubernetesClientDaemon(unittest.TestCase):
+
+    def setUp(self):
+        super(TestKubernetesClientDaemon, self).setUp()
+        self.server = FakeKubernetesApiServer().start()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, SOCKET_NAME)
+        self.daemon = None
+
+    def tearDown(self):
+        current_ctx.clear()
+        if self.daemon:
+            self.daemon.idle_timeout = 0
+            self.thread.join()
+        self.server.stop()
+        shutil.rmtree(self.directory)
+        super(TestKubernetesClientDaemon, self).tearDown()
+
+    def _start_daemon(self, idle_timeout=5):
+        self.daemon = KubernetesClientDaemon(self.path, idle_timeout)
+        self.thread = threading.Thread(target=self.daemon.serve)
+        self.thread.daemon = True
+        self.thread.start()
+        while not os.path.exists(self.path):
+            self.thread.join(0.01)
+
+    def _client(self):
+        logger = MagicMock()
+        return CloudifyKubernetesClient(
+            logger,
+            KubernetesApiConfigurationVariants(
+                logger, {'api_options': {'host': self.server.url}}),
+            daemon={'enabled': True, 'directory': self.directory}
+        )
+
+    def test_discovery_cached(self):
+        self._start_daemon()
+
+        discovery = self._client().discover()
+        self.assertEqual(discovery['server_version'], 'v1.10.0')
+        self.assertEqual(len(self.server.calls), 3)
+
+        # other operation gets discovery from the daemon
+        self.assertEqual(self._client().discover(), discovery)
+        self.assertEqual(len(self.server.calls), 3)
+
+    def test_resource_lifecycle(self):
+        self._start_daemon()
+        _ctx = FakeOperationContext(
+            self.server,
+            properties={'definition': POD_DEFINITION,
+                        'options': {'namespace': 'default'}},
+            master_properties={'daemon': {'enabled': True,
+                                          'directory': self.directory}})
+        current_ctx.set(_ctx)
+
+        tasks.resource_create()
+        tasks.resource_read()
+        self.assertIsNotNone(
+            self.server.get_object(('v1', 'pods'), 'default', 'nginx'))
+        self.assertEqual(len(self.daemon._pool_managers), 1)
+        self.assertEqual(
+            _ctx.instance.runtime_properties['kubernetes']['metadata'][
+                'name'], 'nginx')
+
+    def test_fallback(self):
+        with patch('cloudify_kubernetes.k8s.daemon.spawn_daemon') as spawn, \
+                patch('cloudify_kubernetes.k8s.daemon.SPAWN_TIMEOUT', 0.1):
+            client = self._client()
+            discovery = client.discover()
+
+        spawn.assert_called_once_with(self.path, 300)
+        self.assertFalse(client.daemon_connection.available)
+        self.assertEqual(discovery['server_version'], 'v1.10.0')
+        self.assertEqual(len(self.server.calls), 3)
+
+    def test_directory_not_private(self):
+        os.chmod(self.directory, 0o755)
+        with patch('cloudify_kubernetes.k8s.daemon.spawn_daemon') as spawn:
+            client = self._client()
+            discovery = client.discover()
+
+        spawn.assert_not_called()
+        self.assertFalse(client.daemon_connection.available)
+        self.assertEqual(discovery['server_version'], 'v1.10.0')
+
+    def test_daemon_not_private(self):
+        os.chmod(self.directory, 0o755)
+        KubernetesClientDaemon(self.path, 5).serve()
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_socket_mode(self):
+        self._start_daemon()
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+
+    def test_hung_daemon(self):
+        # daemon accepts connection and never responds
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.path)
+        server.listen(1)
+        try:
+            with patch('cloudify_kubernetes.k8s.daemon.RESPONSE_TIMEOUT',
+                       0.1):
+                client = self._client()
+                discovery = client.discover()
+        finally:
+            server.close()
+
+        self.assertFalse(client.daemon_connection.available)
+        self.assertEqual(discovery['server_version'], 'v1.10.0')
+
+    def _certificate(self, content):
+        descriptor, path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(descriptor, 'w') as certificate_file:
+            certificate_file.write(content)
+        return path
+
+    def test_pool_manager_by_certificate_content(self):
+        daemon = KubernetesClientDaemon(self.path)
+        identities = [
+            daemon._tls_identity({'cert_reqs': 'CERT_REQUIRED',
+                                  'cert_file': self._certificate(content)})
+            for content in ('cert', 'cert', 'other')
+        ]
+
+        # files written again by other operation
+        self.assertEqual(identities[0], identities[1])
+        self.assertNotEqual(identities[0], identities[2])
+        self.assertEqual(dict(identities[0])['cert_reqs'], 'CERT_REQUIRED')
+        with open(dict(identities[0])['cert_file']) as certificate_file:
+            self.assertEqual(certificate_file.read(), 'cert')
+
+        self.assertIs(daemon._pool_manager(identities[0]),
+                      daemon._pool_manager(identities[1]))
+        self.assertEqual(len(daemon._pool_managers), 1)
+
+    def test_pool_manager_evicted(self):
+        daemon = KubernetesClientDaemon(self.path)
+        with patch('cloudify_kubernetes.k8s.daemon.MAX_POOL_MANAGERS', 2):
+            first = daemon._pool_manager((('assert_hostname', 'a'),))
+            daemon._pool_manager((('assert_hostname', 'b'),))
+            daemon._pool_manager((('assert_hostname', 'a'),))
+            daemon._pool_manager((('assert_hostname', 'c'),))
+
+        self.assertEqual(list(daemon._pool_managers), [
+            (('assert_hostname', 'a'),), (('assert_hostname', 'c'),)])
+        self.assertIs(daemon._pool_managers[(('assert_hostname', 'a'),)],
+                      first)
+
+    def test_discovery_by_certificate(self):
+        daemon = KubernetesClientDaemon(self.path)
+        request = {'method': 'GET', 'url': self.server.url + '/version'}
+        for content in ('cert', 'other', 'other'):
+            request['tls'] = {'ca_certs': self._certificate(content)}
+            with patch('urllib3.PoolManager') as pool_manager:
+                pool_manager.return_value.request.return_value = MagicMock(
+                    status=200, reason='OK', headers={}, data='{}')
+                daemon.handle(request)
+
+        self.assertEqual(len(daemon._discovery), 2)
+
+    def test_idle_shutdown(self):
+        self._start_daemon(idle_timeout=0.2)
+        self._client().discover()
+
+        self.thread.join(5)
+        self.assertFalse(self.thread.is_alive())
+        self.assertFalse(os.path.exists(self.path))
+        self.daemon = None
+
+
+if __name__ == '__main__':
+    unittest.main()
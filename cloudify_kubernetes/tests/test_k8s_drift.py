@@ -0,0 +1,84 @@
+########
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from cloudify_kubernetes.k8s import definition_drift
+
+DEFINITION = {
+    'apiVersion': 'apps/v1beta1',
+    'kind': 'Deployment',
+    'metadata': {'name': 'nginx', 'resourceVersion': '0'},
+    'spec': {
+        'replicas': 2,
+        'template': {'spec': {'containers': [
+            {'name': 'nginx', 'image': 'nginx:1.13',
+             'ports': [{'containerPort': '80'}]}
+        ]}}
+    }
+}
+
+
+def _live(replicas=2, image='nginx:1.13'):
+    return {
+        'metadata': {'name': 'nginx', 'resourceVersion': '42',
+                     'uid': 'abc', 'labels': {'app': 'nginx'}},
+        'spec': {
+            'replicas': replicas,
+            'strategy': {'type': 'RollingUpdate'},
+            'template': {'spec': {'containers': [
+                {'name': 'nginx', 'image': image,
+                 'imagePullPolicy': 'IfNotPresent',
+                 'ports': [{'containerPort': 80, 'protocol': 'TCP'}]}
+            ]}}
+        },
+        'status': {'replicas': replicas}
+    }
+
+
+class TestDefinitionDrift(unittest.TestCase):
+
+    def test_in_sync(self):
+        self.assertEqual(definition_drift(DEFINITION, _live()), [])
+
+    def test_drift(self):
+        self.assertEqual(
+            [str(drift) for drift in
+             definition_drift(DEFINITION, _live(3, 'nginx:1.14'))],
+            [
+                "spec.replicas: expected 2, found 3",
+                'spec.template.spec.containers[0].image: '
+                'expected "nginx:1.13", found "nginx:1.14"'
+            ]
+        )
+
+    def test_list_length(self):
+        live = _live()
+        live['spec']['template']['spec']['containers'].append(
+            {'name': 'sidecar'})
+
+        self.assertEqual(
+            [drift.path for drift in definition_drift(DEFINITION, live)],
+            ['spec.template.spec.containers'])
+
+    def test_missing_field(self):
+        self.assertEqual(
+            [(drift.path, drift.actual) for drift in definition_drift(
+                {'data': {'key': 'value'}}, {'data': {}})],
+            [('data.key', None)])
+
+
+if __name__ == '__main__':
+    unittest.main()
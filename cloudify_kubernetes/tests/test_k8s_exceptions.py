@@ -13,6 +13,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import unittest
+
+from kubernetes.client.rest import ApiException
 from cloudify_kubernetes.k8s import (KuberentesApiInitializationFailedError,
                                      KuberentesAuthenticationError,
                                      KuberentesInvalidPayloadClassError,
@@ -32,6 +34,44 @@ class TestException(unittest.TestCase):
         instance = KuberentesApiOperationError('message')
         self.assertTrue(isinstance(instance, KuberentesError))
 
+    def test_KuberentesApiOperationError_from_api_exception(self):
+        api_exception = ApiException(status=404, reason='Not Found')
+        api_exception.body = (
+            '{"kind":"Status","reason":"NotFound","code":404}')
+        api_exception.headers = {'retry-after': '2'}
+
+        instance = KuberentesApiOperationError.from_api_exception(
+            'Failed: ', api_exception)
+
+        self.assertEqual(instance.status, 404)
+        self.assertEqual(instance.reason, 'Not Found')
+        self.assertEqual(instance.retry_after, 2)
+        self.assertEqual(instance.details['reason'], 'NotFound')
+        self.assertTrue(instance.is_not_found)
+        self.assertFalse(instance.is_transient)
+        self.assertEqual(str(instance),
+                         'Failed: {0}'.format(str(api_exception)))
+
+    def test_KuberentesApiOperationError_classification(self):
+        self.assertTrue(
+            KuberentesApiOperationError('', status=409).is_conflict)
+        self.assertTrue(
+            KuberentesApiOperationError('', status=429).is_throttled)
+        self.assertTrue(
+            KuberentesApiOperationError('', status=503).is_transient)
+        self.assertTrue(
+            KuberentesApiOperationError('', status=422).is_invalid_request)
+        self.assertFalse(
+            KuberentesApiOperationError('', status=403).is_invalid_request)
+
+    def test_KuberentesApiOperationError_invalid_body(self):
+        instance = KuberentesApiOperationError(
+            'message', status=500, body='<html>', headers={'Retry-After': 'x'})
+
+        self.assertEqual(instance.details, {})
+        self.assertIsNone(instance.retry_after)
+        self.assertEqual(str(instance), 'message')
+
     def test_KuberentesAuthenticationError(self):
         instance = KuberentesAuthenticationError('message')
         self.assertTrue(isinstance(instance, KuberentesError))
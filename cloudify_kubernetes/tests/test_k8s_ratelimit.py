@@ -0,0 +1,122 @@
+########
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from mock import MagicMock, patch
+
+from cloudify_kubernetes.k8s.ratelimit import KubernetesApiRateLimiter
+
+
+class TestKubernetesApiRateLimiter(unittest.TestCase):
+
+    def setUp(self):
+        super(TestKubernetesApiRateLimiter, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.patch_time = patch('cloudify_kubernetes.k8s.ratelimit.time')
+        self.mock_time = self.patch_time.start()
+        self.mock_time.time = MagicMock(return_value=1000.0)
+
+    def tearDown(self):
+        self.patch_time.stop()
+        shutil.rmtree(self.directory)
+        super(TestKubernetesApiRateLimiter, self).tearDown()
+
+    def _limiter(self, key='https://cluster', qps=2, burst=3):
+        return KubernetesApiRateLimiter(key, qps, burst,
+                                        directory=self.directory)
+
+    def test_reserve_burst(self):
+        limiter = self._limiter()
+
+        self.assertEqual([limiter.reserve() for _ in range(5)],
+                         [0, 0, 0, 0.5, 1.0])
+
+    def test_reserve_refill(self):
+        limiter = self._limiter()
+        for _ in range(3):
+            limiter.reserve()
+
+        self.mock_time.time.return_value = 1001.0
+        self.assertEqual([limiter.reserve() for _ in range(3)],
+                         [0, 0, 0.5])
+
+    def test_shared_between_instances(self):
+        self.assertEqual(
+            [self._limiter().reserve() for _ in range(4)], [0, 0, 0, 0.5])
+        self.assertEqual(self._limiter('https://other').reserve(), 0)
+
+    def test_block(self):
+        limiter = self._limiter()
+        self._limiter().block(7)
+
+        self.assertEqual(limiter.reserve(), 7)
+
+    def test_acquire(self):
+        limiter = self._limiter(qps=1, burst=1)
+
+        self.assertEqual(limiter.acquire(), 0)
+        self.assertEqual(limiter.acquire(), 1)
+        self.mock_time.sleep.assert_called_once_with(1)
+
+    def test_corrupted_state(self):
+        limiter = self._limiter()
+        with open(limiter.path, 'w') as state_file:
+            state_file.write('{')
+
+        self.assertEqual(limiter.reserve(), 0)
+
+    def test_planted_state(self):
+        limiter = self._limiter()
+        with open(limiter.path, 'w') as state_file:
+            state_file.write(json.dumps(
+                {'blocked_until': 1e12, 'tokens': -1e12}))
+
+        self.assertEqual(limiter.reserve(), 60)
+
+        with open(limiter.path, 'w') as state_file:
+            state_file.write(json.dumps({'tokens': 'x'}))
+
+        self.assertEqual(limiter.reserve(), 0)
+
+    def test_block_capped(self):
+        limiter = self._limiter()
+        limiter.block(1e9)
+
+        self.assertEqual(limiter.reserve(), 60)
+
+    def test_symlink_not_followed(self):
+        limiter = self._limiter()
+        target = os.path.join(self.directory, 'target')
+        with open(target, 'w') as target_file:
+            target_file.write('content')
+        os.symlink(target, limiter.path)
+
+        with self.assertRaises(OSError):
+            limiter.reserve()
+        with open(target) as target_file:
+            self.assertEqual(target_file.read(), 'content')
+
+    def test_directory_not_private(self):
+        os.chmod(self.directory, 0o755)
+
+        self.assertFalse(self._limiter().available)
+
+
+if __name__ == '__main__':
+    unittest.main()
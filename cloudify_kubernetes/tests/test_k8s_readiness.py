@@ -0,0 +1,191 @@
+########
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from mock import patch
+
+from cloudify_kubernetes.k8s import (evaluate_readiness,
+                                     readiness_evaluator)
+from cloudify_kubernetes.k8s.readiness import ready
+
+
+class TestReadiness(unittest.TestCase):
+
+    def _assert_readiness(self, readiness, state, message):
+        self.assertEqual((readiness.state, readiness.message),
+                         (state, message))
+
+    def test_unknown_kind_without_status(self):
+        self.assertIsNone(evaluate_readiness('Unknown', {}))
+
+    def test_observed_generation(self):
+        self._assert_readiness(
+            evaluate_readiness('Whatever', {
+                'metadata': {'generation': 3},
+                'status': {'observedGeneration': 2}
+            }),
+            'retry',
+            'Whatever generation 3 not observed yet (observed generation 2)'
+        )
+
+    def test_conditions(self):
+        self._assert_readiness(
+            evaluate_readiness('Certificate', {
+                'status': {'conditions': [{'type': 'Ready',
+                                           'status': 'False'}]}
+            }),
+            'retry', 'Certificate condition Ready is False')
+
+        self._assert_readiness(
+            evaluate_readiness('Certificate', {
+                'status': {'conditions': [{'type': 'Ready',
+                                           'status': 'True'}]}
+            }),
+            'ready', 'Certificate condition Ready is True')
+
+        self._assert_readiness(
+            evaluate_readiness('Certificate', {
+                'status': {'conditions': [{'type': 'Failed',
+                                           'status': 'True',
+                                           'reason': 'Invalid',
+                                           'message': 'bad'}]}
+            }),
+            'failed',
+            'Certificate condition is Failed, reason: Invalid, message: bad')
+
+    def test_stateful_set(self):
+        resource = {
+            'spec': {'replicas': 3},
+            'status': {'ready_replicas': 2, 'current_revision': 'a',
+                       'update_revision': 'b', 'updated_replicas': 1}
+        }
+        self._assert_readiness(evaluate_readiness('StatefulSet', resource),
+                               'retry', 'Only 2 of 3 replicas are ready')
+
+        resource['status']['ready_replicas'] = 3
+        self._assert_readiness(
+            evaluate_readiness('StatefulSet', resource),
+            'retry', 'Waiting for 2 of 3 pods to be updated')
+
+        resource['status']['current_revision'] = 'b'
+        self._assert_readiness(evaluate_readiness('StatefulSet', resource),
+                               'ready', 'All 3 replicas are ready now')
+
+    def test_stateful_set_partition(self):
+        self._assert_readiness(
+            evaluate_readiness('StatefulSet', {
+                'spec': {'replicas': 1, 'updateStrategy': {
+                    'rollingUpdate': {'partition': 1}}},
+                'status': {'readyReplicas': 1, 'currentRevision': 'a',
+                           'updateRevision': 'b'}
+            }),
+            'ready', 'All 1 replicas are ready now')
+
+    def test_stateful_set_on_delete(self):
+        status = {'readyReplicas': 2, 'currentRevision': 'a',
+                  'updateRevision': 'b', 'updatedReplicas': 0}
+        for resource in (
+                {'apiVersion': 'apps/v1', 'spec': {
+                    'replicas': 2, 'updateStrategy': {'type': 'OnDelete'}}},
+                # default strategy of older API
+                {'apiVersion': 'apps/v1beta1', 'spec': {'replicas': 2}}):
+            resource['status'] = status
+            self._assert_readiness(
+                evaluate_readiness('StatefulSet', resource),
+                'ready', 'All 2 replicas are ready now')
+
+        self._assert_readiness(
+            evaluate_readiness('StatefulSet', {
+                'apiVersion': 'apps/v1beta1',
+                'spec': {'replicas': 2, 'updateStrategy': {
+                    'type': 'RollingUpdate'}},
+                'status': status}),
+            'retry', 'Waiting for 2 of 2 pods to be updated')
+
+    def test_daemon_set_on_delete(self):
+        status = {'desired_number_scheduled': 3,
+                  'updated_number_scheduled': 0,
+                  'number_available': 2}
+        resource = {'api_version': 'extensions/v1beta1', 'spec': {},
+                    'status': status}
+        self._assert_readiness(
+            evaluate_readiness('DaemonSet', resource),
+            'retry', 'Only 2 of 3 daemon pods are available')
+
+        status['number_available'] = 3
+        self._assert_readiness(
+            evaluate_readiness('DaemonSet', resource),
+            'ready', 'All 3 daemon pods are available now')
+
+        resource['spec'] = {'update_strategy': {'type': 'RollingUpdate'}}
+        self._assert_readiness(
+            evaluate_readiness('DaemonSet', resource),
+            'retry', 'Only 0 of 3 daemon pods are updated')
+
+    def test_daemon_set(self):
+        status = {'desired_number_scheduled': 3,
+                  'updated_number_scheduled': 2,
+                  'number_available': 2}
+        self._assert_readiness(
+            evaluate_readiness('DaemonSet', {'status': status}),
+            'retry', 'Only 2 of 3 daemon pods are updated')
+
+        status['updated_number_scheduled'] = 3
+        self._assert_readiness(
+            evaluate_readiness('DaemonSet', {'status': status}),
+            'retry', 'Only 2 of 3 daemon pods are available')
+
+        status['number_available'] = 3
+        self._assert_readiness(
+            evaluate_readiness('DaemonSet', {'status': status}),
+            'ready', 'All 3 daemon pods are available now')
+
+        self._assert_readiness(
+            evaluate_readiness('DaemonSet', {'status': None}),
+            'retry', 'DaemonSet status not ready yet')
+
+    def test_job(self):
+        self._assert_readiness(
+            evaluate_readiness('Job', {'status': {'active': 1}}),
+            'retry',
+            'Job is not completed yet (1 active, 0 succeeded, 0 failed)')
+
+        self._assert_readiness(
+            evaluate_readiness('Job', {'status': {'conditions': [
+                {'type': 'Complete', 'status': 'True'}]}}),
+            'ready', 'Job completed')
+
+        self._assert_readiness(
+            evaluate_readiness('Job', {'status': {'conditions': [
+                {'type': 'Failed', 'status': 'True',
+                 'reason': 'BackoffLimitExceeded', 'message': 'failed'}]}}),
+            'failed',
+            'Job failed, reason: BackoffLimitExceeded, message: failed')
+
+    def test_register_evaluator(self):
+        with patch.dict(
+                'cloudify_kubernetes.k8s.readiness.READINESS_EVALUATORS'):
+
+            @readiness_evaluator('Custom')
+            def custom_readiness(kind, resource, status):
+                return ready('{0} {1}'.format(kind, status['state']))
+
+            self._assert_readiness(
+                evaluate_readiness('Custom', {'status': {'state': 'up'}}),
+                'ready', 'Custom up')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+########
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import pstats
+import shutil
+import tempfile
+import unittest
+from mock import patch
+
+from cloudify.mocks import MockCloudifyContext
+from cloudify.state import current_ctx
+
+import cloudify_kubernetes.profiling as profiling
+
+
+class TestProfiling(unittest.TestCase):
+
+    def setUp(self):
+        super(TestProfiling, self).setUp()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        current_ctx.clear()
+        shutil.rmtree(self.directory)
+        super(TestProfiling, self).tearDown()
+
+    def _prepare_context(self, profiling_options=None):
+        properties = {}
+        if profiling_options is not None:
+            properties['profiling'] = profiling_options
+
+        _ctx = MockCloudifyContext(
+            node_id="test_id",
+            node_name="test_name",
+            deployment_id="test_deployment",
+            properties=properties,
+            operation={'name': 'cloudify.interfaces.lifecycle.create',
+                       'retry_number': 0}
+        )
+        current_ctx.set(_ctx)
+        return _ctx
+
+    def test_profiling_disabled(self):
+        self._prepare_context()
+
+        with patch.dict(os.environ, {}, clear=True):
+            result = profiling.with_profiling(lambda **kwargs: kwargs)(a=1)
+
+        self.assertEqual(result, {'a': 1})
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_profiling_cprofile_node_property(self):
+        self._prepare_context({
+            'cprofile': True,
+            'directory': self.directory
+        })
+
+        with patch.dict(os.environ, {}, clear=True):
+            profiling.with_profiling(lambda **kwargs: sum(range(100)))()
+
+        report = os.path.join(
+            self.directory,
+            'test_deployment.test_id.'
+            'cloudify_interfaces_lifecycle_create.0.pstats'
+        )
+        self.assertEqual(os.listdir(self.directory),
+                         [os.path.basename(report)])
+        self.assertTrue(pstats.Stats(report).total_calls > 0)
+        self.assertFalse(profiling._active)
+
+    def test_profiling_cprofile_environment(self):
+        self._prepare_context()
+
+        with patch.dict(os.environ, {
+            profiling.ENV_PROFILING: ' cProfile ',
+            profiling.ENV_PROFILING_DIRECTORY: self.directory
+        }):
+            profiling.with_profiling(lambda **kwargs: None)()
+
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+
+    def test_profiling_nested(self):
+        self._prepare_context({
+            'cprofile': True,
+            'directory': self.directory
+        })
+
+        def outer(**kwargs):
+            self.assertTrue(profiling._active)
+            profiling.with_profiling(lambda **kwargs: None)()
+            profiling.with_profiling(lambda **kwargs: None)()
+
+        with patch.dict(os.environ, {}, clear=True):
+            profiling.with_profiling(outer)()
+
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+        self.assertFalse(profiling._active)
+
+    def test_profiling_memory(self):
+        self._prepare_context({
+            'memory': True,
+            'top': 3,
+            'directory': self.directory
+        })
+        kept = []
+
+        with patch.dict(os.environ, {}, clear=True):
+            profiling.with_profiling(
+                lambda **kwargs: kept.extend(set() for _ in range(1000)))()
+
+        report = os.path.join(
+            self.directory,
+            'test_deployment.test_id.'
+            'cloudify_interfaces_lifecycle_create.0.memory.txt'
+        )
+        with open(report) as report_file:
+            lines = report_file.read().splitlines()
+        self.assertTrue(lines[0].startswith('Peak RSS (kB): '))
+        self.assertIn('set', [line.split()[-1] for line in lines[3:]])
+        self.assertLessEqual(len(lines), 6)
+
+    def test_profiling_directory_not_private(self):
+        os.chmod(self.directory, 0o755)
+        self._prepare_context({
+            'cprofile': True,
+            'directory': self.directory
+        })
+
+        result = profiling.with_profiling(lambda **kwargs: 'result')()
+
+        self.assertEqual(result, 'result')
+        self.assertEqual(os.listdir(self.directory), [])
+        self.assertFalse(profiling._active)
+
+    def test_profiling_report_failed(self):
+        self._prepare_context({
+            'cprofile': True,
+            'memory': True,
+            'directory': self.directory
+        })
+
+        with patch('cloudify_kubernetes.profiling.open', create=True,
+                   side_effect=IOError('disk full')), \
+                patch('cProfile.Profile.dump_stats',
+                      side_effect=IOError('disk full')):
+            result = profiling.with_profiling(lambda **kwargs: 'result')()
+
+        self.assertEqual(result, 'result')
+        self.assertFalse(profiling._active)
+
+
+if __name__ == '__main__':
+    unittest.main()
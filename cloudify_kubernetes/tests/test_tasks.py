@@ -24,6 +24,7 @@ from cloudify.mocks import MockCloudifyContext
 from cloudify.state import current_ctx
 
 from cloudify_kubernetes.decorators import RELATIONSHIP_TYPE_MANAGED_BY_MASTER
+from cloudify_kubernetes.k8s.client import KubernetesResourceDefinition
 from cloudify_kubernetes.k8s.mapping import (
     KubernetesApiMapping,
     KubernetesSingleOperationApiMapping
@@ -278,34 +279,97 @@ class TestTasks(unittest.TestCase):
         # raise exception on empty balancer
         _, _ctx = self._prepare_master_node()
         current_ctx.set(_ctx)
+        service = {
+            'metadata': {'name': 'nginx'},
+            'spec': {'type': 'LoadBalancer', 'cluster_ip': '10.0.0.1'},
+            'status': {'load_balancer': {'ingress': None}}
+        }
+        # ready without load balancer provider unless requested
+        tasks._do_resource_status_check("Service", service)
+
         with self.assertRaises(OperationRetry) as error:
-            tasks._do_resource_status_check("Service", {
-                'spec': {'type': 'Ingress'},
-                'status': {'load_balancer': {'ingress': None}}
-            })
+            tasks._do_resource_status_check(
+                "Service", service, wait_for_load_balancer=True)
         self.assertEqual(
             str(error.exception),
-            "status {'load_balancer': {'ingress': None}} in phase "
-            "[{'load_balancer': {'ingress': None}}]"
+            "Waiting for load balancer ingress of service nginx"
         )
 
+        # no ingress is expected for other types
+        tasks._do_resource_status_check("Service", {
+            'metadata': {'name': 'nginx'},
+            'spec': {'type': 'ClusterIP'},
+            'status': {'load_balancer': {'ingress': None}}
+        })
+
     def test_do_resource_status_check_deployment(self):
         self._prepare_master_node()
         tasks._do_resource_status_check("Deployment", {
             'status': {'conditions': [{'type': 'Available'}]}
         })
 
-    def test_do_resource_status_check_deployment_retry(self):
+    def _deployment(self, replicas=3, generation=2, observed_generation=2,
+                    updated_replicas=3, status_replicas=3,
+                    available_replicas=3, progressing_reason=None):
+        return {
+            'metadata': {'name': 'nginx', 'generation': generation},
+            'spec': {'replicas': replicas},
+            'status': {
+                'observed_generation': observed_generation,
+                'replicas': status_replicas,
+                'updated_replicas': updated_replicas,
+                'available_replicas': available_replicas,
+                'conditions': [
+                    {'type': 'Available', 'status': 'True'},
+                    {'type': 'Progressing', 'status': 'True',
+                     'reason': progressing_reason or 'NewReplicaSetAvailable'}
+                ]
+            }
+        }
+
+    def test_do_resource_status_check_deployment_rolled_out(self):
         self._prepare_master_node()
-        with self.assertRaises(OperationRetry) as error:
-            tasks._do_resource_status_check("Deployment", {
-                'status': {'conditions': [{'type': 'Progressing'}]}
-            })
+        # healthy deployment keeps Progressing condition
+        tasks._do_resource_status_check("Deployment", self._deployment())
+
+    def test_do_resource_status_check_deployment_rollout(self):
+        self._prepare_master_node()
+
+        for deployment, message in [
+            (self._deployment(observed_generation=1),
+             'Deployment generation 2 not observed yet '
+             '(observed generation 1)'),
+            (self._deployment(observed_generation=None),
+             'Waiting for deployment spec update to be observed'),
+            (self._deployment(updated_replicas=1),
+             'Waiting for deployment nginx rollout to finish: 1 out of 3 '
+             'new replicas have been updated'),
+            (self._deployment(status_replicas=5),
+             'Waiting for deployment nginx rollout to finish: 2 old '
+             'replicas are pending termination'),
+            (self._deployment(available_replicas=2),
+             'Waiting for deployment nginx rollout to finish: 2 of 3 '
+             'updated replicas are available'),
+        ]:
+            with self.assertRaises(OperationRetry) as error:
+                tasks._do_resource_status_check("Deployment", deployment)
+            self.assertEqual(str(error.exception), message)
+
+    def test_do_resource_status_check_deployment_deadline_exceeded(self):
+        self._prepare_master_node()
+
+        with self.assertRaises(NonRecoverableError) as error:
+            tasks._do_resource_status_check(
+                "Deployment", self._deployment(
+                    updated_replicas=1,
+                    progressing_reason='ProgressDeadlineExceeded'))
         self.assertEqual(
             str(error.exception),
-            "Deployment condition is Progressing"
+            'Deployment nginx exceeded its progress deadline'
         )
 
+    def test_do_resource_status_check_deployment_retry(self):
+        self._prepare_master_node()
         with self.assertRaises(OperationRetry) as error:
             tasks._do_resource_status_check("Deployment", {
                 'status': {'conditions': None}
@@ -459,7 +523,8 @@ class TestTasks(unittest.TestCase):
         )
 
     def test_do_resource_create(self):
-        self._prepare_master_node()
+        _, _ctx = self._prepare_master_node()
+        _ctx.node.properties['ownership_labels'] = False
 
         expected_value = {
             'kubernetes': {
@@ -556,6 +621,28 @@ class TestTasks(unittest.TestCase):
 
         self.assertEqual(result, expected_value)
 
+    def test_do_resource_delete_propagation_policy(self):
+        _, _ctx = self._prepare_master_node()
+        _ctx.node.properties['options'] = {'namespace': 'default'}
+        client = MagicMock()
+        client.delete_resource = MagicMock(return_value=MagicMock(
+            to_dict=MagicMock(return_value={})))
+
+        tasks._do_resource_delete(
+            client=client,
+            api_mapping='fake_api_mapping',
+            resource_definition='fake_resource_definition',
+            resource_id='fake_id',
+            propagation_policy='Background'
+        )
+
+        client.delete_resource.assert_called_once_with(
+            'fake_api_mapping', 'fake_resource_definition', 'fake_id',
+            {'namespace': 'default', 'propagation_policy': 'Background'})
+        # node options are kept untouched
+        self.assertEqual(_ctx.node.properties['options'],
+                         {'namespace': 'default'})
+
     def test_resource_create_RecoverableError(self):
         _, _ctx = self._prepare_master_node()
 
@@ -573,8 +660,37 @@ class TestTasks(unittest.TestCase):
             "properties"
         )
 
+    def test_do_resource_create_ownership_labels(self):
+        _, _ctx = self._prepare_master_node()
+        client = MagicMock()
+        client.create_resource = MagicMock(return_value=MagicMock(
+            to_dict=MagicMock(return_value={})))
+        definition = {'name': 'nginx', 'labels': {'app': 'nginx'}}
+        resource_definition = KubernetesResourceDefinition(
+            kind='Pod', apiVersion='v1', metadata=definition)
+
+        tasks._do_resource_create(client=client,
+                                  api_mapping='fake_api_mapping',
+                                  resource_definition=resource_definition)
+
+        self.assertEqual(resource_definition.metadata['labels'], {
+            'app': 'nginx',
+            'cloudify.co/deployment-id': _ctx.deployment.id,
+            'cloudify.co/tenant': 'default_tenant',
+            'cloudify.co/node-id': _ctx.node.id,
+            'cloudify.co/instance-id': _ctx.instance.id
+        })
+        # definition from node properties is not modified
+        self.assertEqual(definition['labels'], {'app': 'nginx'})
+
+    def test_label_value(self):
+        self.assertEqual(tasks._label_value('my deployment/1_'),
+                         'my-deployment-1')
+        self.assertEqual(len(tasks._label_value('a' * 100)), 63)
+
     def test_resource_create(self):
         _, _ctx = self._prepare_master_node()
+        _ctx.node.properties['ownership_labels'] = False
 
         mock_isfile = MagicMock(return_value=True)
 
@@ -599,6 +715,71 @@ class TestTasks(unittest.TestCase):
             }
         })
 
+    def _pod_response(self, phase):
+        return {'metadata': {'name': 'kubernetes_id'},
+                'status': {'phase': phase}}
+
+    def _resource_read(self, read_responses, wait, time_values):
+        _, _ctx = self._prepare_master_node()
+        _ctx.node.properties['definition']['kind'] = 'Pod'
+        _ctx.download_resource = MagicMock(return_value="downloaded_resource")
+        mock_time = MagicMock()
+        mock_time.time = MagicMock(side_effect=time_values)
+
+        with patch('os.path.isfile', MagicMock(return_value=True)):
+            with patch(
+                    'cloudify_kubernetes.k8s.config.'
+                    'kubernetes.config.load_kube_config',
+                    MagicMock()
+            ):
+                with patch('cloudify_kubernetes.tasks._do_resource_read',
+                           MagicMock(side_effect=read_responses)):
+                    with patch('cloudify_kubernetes.tasks.time', mock_time):
+                        tasks.resource_read(
+                            client=MagicMock(),
+                            api_mapping=MagicMock(),
+                            resource_definition=MagicMock(),
+                            wait=wait
+                        )
+
+        return _ctx, mock_time.sleep
+
+    def test_resource_read_wait(self):
+        _ctx, mock_sleep = self._resource_read(
+            [self._pod_response('Pending'),
+             self._pod_response('Pending'),
+             self._pod_response('Running')],
+            wait=30,
+            time_values=[0, 1, 3]
+        )
+
+        self.assertEqual(
+            [call[0][0] for call in mock_sleep.call_args_list], [1, 1.5])
+        self.assertEqual(_ctx.instance.runtime_properties['kubernetes'],
+                         self._pod_response('Running'))
+
+    def test_resource_read_wait_exhausted(self):
+        with self.assertRaises(OperationRetry) as error:
+            self._resource_read(
+                [self._pod_response('Pending'),
+                 self._pod_response('Pending')],
+                wait=2,
+                time_values=[0, 1.5, 2.5]
+            )
+
+        self.assertEqual(
+            str(error.exception),
+            "status Pending in phase ['Pending', 'Unknown'] [retry_after=15]"
+        )
+
+    def test_resource_read_without_wait(self):
+        with self.assertRaises(OperationRetry):
+            self._resource_read(
+                [self._pod_response('Pending')],
+                wait=0,
+                time_values=[0, 0]
+            )
+
     def test_resource_delete_RecoverableError(self):
         _, _ctx = self._prepare_master_node()
 
@@ -630,8 +811,8 @@ class TestTasks(unittest.TestCase):
                     MagicMock()
             ):
                 with patch(
-                        'cloudify_kubernetes.tasks._do_resource_read',
-                        MagicMock()):
+                        'cloudify_kubernetes.tasks._do_resource_read_metadata',
+                        MagicMock(return_value={'name': 'resource'})):
                     with self.assertRaises(OperationRetry):
                         tasks.resource_delete(
                             client=MagicMock(),
@@ -663,6 +844,28 @@ class TestTasks(unittest.TestCase):
         # TODO
         pass
 
+    def test_master_create(self):
+        _ctx = MockCloudifyContext(
+            node_id='master',
+            properties={'configuration': {
+                'blueprint_file_name': 'kubernetes.conf',
+                'api_options': {'host': 'https://cluster'}}},
+            runtime_properties={'configuration': {
+                'blueprint_file_name': ''}}
+        )
+        current_ctx.set(_ctx)
+
+        tasks.master_create()
+        self.assertEqual(
+            _ctx.instance.runtime_properties['resolved_configuration'][
+                'configuration'],
+            {'api_options': {'host': 'https://cluster'}})
+
+        _ctx.instance.runtime_properties['configuration'][
+            'api_options'] = None
+        with self.assertRaises(NonRecoverableError):
+            tasks.master_create()
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -247,6 +247,35 @@ class TestUtils(unittest.TestCase):
         self.assertEquals(result.metadata, 'ccc')
         self.assertEquals(result.spec, 'ddd')
 
+    def test_resource_definition_patch(self):
+        self._prepare_context(with_definition=False)
+        definition = {
+            'apiVersion': 'apps/v1',
+            'kind': 'Deployment',
+            'metadata': {'name': 'web', 'labels': {'app': 'web'}},
+            'spec': {'replicas': 1, 'template': {'spec': {'containers': [
+                {'name': 'web', 'image': 'web:1'},
+                {'name': 'sidecar', 'image': 'sidecar:1'}]}}}
+        }
+        changes = {'spec': {'template': {'spec': {'containers': [
+            {'name': 'web', 'image': 'web:2'}]}}}}
+
+        resource_definition = utils.resource_definition_from_blueprint(
+            definition=definition, definitions_additions=changes)
+        result = utils.resource_definition_patch(
+            resource_definition, definition=definition,
+            definitions_additions=changes)
+
+        self.assertEquals(result.kind, 'Deployment')
+        self.assertEquals(result.api_version, 'apps/v1')
+        self.assertEquals(result.metadata, {'name': 'web'})
+        self.assertEquals(result.spec, {'template': {'spec': {'containers': [
+            {'name': 'web', 'image': 'web:2'},
+            {'name': 'sidecar', 'image': 'sidecar:1'}]}}})
+
+        self.assertIsNone(utils.resource_definition_patch(
+            resource_definition, definition=definition))
+
     def test_resource_definition_from_blueprint_properties(self):
         self._prepare_context(with_definition=True, kind='Service')
         result = utils.resource_definition_from_blueprint()
@@ -14,14 +14,25 @@
 #  * limitations under the License.
 
 import os
-from mock import patch, MagicMock
+from mock import call, patch, MagicMock
 
 import testtools
 
+from cloudify.exceptions import NonRecoverableError
 from cloudify.mocks import MockCloudifyContext
 from cloudify.state import current_ctx
 from cloudify.test_utils import workflow_test
 
+from cloudify_kubernetes.workflows import (
+    MANAGED_BY_MASTER_RELATIONSHIP_TYPE,
+    definition_merge_patch,
+    drift_resources_by_master,
+    merge_definitions,
+    owned_resources_by_master,
+    select_node_instances,
+    update_resource_definitions
+)
+
 RESOURCE_CHANGES = {
     'metadata': {'resourceVersion': '0'},
     'spec': {
@@ -57,3 +68,233 @@ class TestUpdateResourceDefinition(testtools.TestCase):
                 cfy_local.execute(
                     'update_resource_definition',
                     parameters=_parameters)
+
+
+class TestMergeDefinitions(testtools.TestCase):
+
+    def _definition(self):
+        return {
+            'metadata': {'name': 'web', 'labels': {'app': 'web'}},
+            'spec': {
+                'containers': [{'name': 'web', 'image': 'web:1'},
+                               {'name': 'sidecar', 'image': 'sidecar:1'}],
+                'volumes': [{'name': 'data'}]
+            }
+        }
+
+    def test_merge_definitions(self):
+        old = self._definition()
+        changes = {'metadata': {'labels': {'tier': 'front'}},
+                   'spec': {'containers': [{'name': 'web', 'image': 'web:2'},
+                                           {'name': 'proxy'}]}}
+
+        merged = merge_definitions(old, changes)
+
+        self.assertEqual(merged, {
+            'metadata': {'name': 'web',
+                         'labels': {'app': 'web', 'tier': 'front'}},
+            'spec': {
+                'containers': [{'name': 'web', 'image': 'web:2'},
+                               {'name': 'sidecar', 'image': 'sidecar:1'},
+                               {'name': 'proxy'}],
+                'volumes': [{'name': 'data'}]
+            }
+        })
+        # not modified, unchanged subtrees are shared
+        self.assertEqual(old, self._definition())
+        self.assertIs(merged['spec']['volumes'], old['spec']['volumes'])
+        self.assertIs(merged['spec']['containers'][1],
+                      old['spec']['containers'][1])
+        self.assertIs(merged['spec']['containers'][2],
+                      changes['spec']['containers'][1])
+
+    def test_merge_definitions_replace(self):
+        self.assertEqual(
+            merge_definitions({'spec': {'ports': [{'port': 80}]}},
+                              {'spec': {'ports': [{'port': 8080}]}}),
+            {'spec': {'ports': [{'port': 8080}]}})
+        self.assertEqual(merge_definitions(None, {'spec': {}}),
+                         {'spec': {}})
+
+    def test_definition_merge_patch(self):
+        self.assertEqual(
+            definition_merge_patch(self._definition(), {
+                'metadata': {'labels': {'app': 'web'}},
+                'spec': {'containers': [{'name': 'web', 'image': 'web:2'}]}
+            }),
+            {'metadata': {'labels': {'app': 'web'}},
+             'spec': {'containers': [
+                 {'name': 'web', 'image': 'web:2'},
+                 {'name': 'sidecar', 'image': 'sidecar:1'}]}})
+
+
+class TestDeleteOwnedResources(testtools.TestCase):
+
+    def _node(self, kind, namespace='default', master_id='master',
+              type_hierarchy=None):
+        relationship = MagicMock(target_id=master_id)
+        relationship.is_derived_from = MagicMock(
+            side_effect=lambda type: type ==
+            MANAGED_BY_MASTER_RELATIONSHIP_TYPE)
+        return MagicMock(
+            type_hierarchy=type_hierarchy or [
+                'cloudify.nodes.Root',
+                'cloudify.kubernetes.resources.BlueprintDefinedResource'],
+            instances=[MagicMock()],
+            relationships=[relationship],
+            properties={
+                'definition': {'kind': kind, 'apiVersion': 'v1'},
+                'options': {'namespace': namespace}
+            })
+
+    def test_owned_resources_by_master(self):
+        first = self._node('Pod')
+        nodes = [
+            first,
+            self._node('Pod'),
+            self._node('Pod', namespace='other'),
+            self._node('Service', master_id='other-master'),
+            self._node('Pod', type_hierarchy=[
+                'cloudify.kubernetes.resources.FileDefinedResource'])
+        ]
+
+        groups = owned_resources_by_master(nodes)
+
+        self.assertEqual(list(groups), ['master', 'other-master'])
+        node_instance, resources = groups['master']
+        self.assertIs(node_instance, first.instances[0])
+        self.assertEqual(
+            [(resource['kind'], resource['namespace'])
+             for resource in resources],
+            [('Pod', 'default'), ('Pod', 'other')])
+        self.assertEqual(
+            [resource['kind'] for resource in groups['other-master'][1]],
+            ['Service'])
+
+    def test_owned_resources_by_master_without_kind(self):
+        node = self._node(None)
+        node.type = 'cloudify.kubernetes.resources.Pod'
+
+        _, resources = owned_resources_by_master([node])['master']
+
+        self.assertEqual(resources[0]['kind'],
+                         'cloudify.kubernetes.resources.Pod')
+        self.assertEqual(resources[0]['kind'].split('.')[-1], 'Pod')
+
+    def test_drift_resources_by_master(self):
+        blueprint_defined = self._node('Pod')
+        blueprint_defined.instances = [MagicMock(id='pod_1'),
+                                       MagicMock(id='pod_2')]
+        file_defined = self._node('Pod', type_hierarchy=[
+            'cloudify.kubernetes.resources.FileDefinedResource'])
+        file_defined.instances = [MagicMock(id='file_1')]
+        file_defined.properties = {'file': {'resource_path': 'pod.yaml'}}
+
+        node_instance, resources = drift_resources_by_master(
+            [blueprint_defined, file_defined, MagicMock(relationships=[])]
+        )['master']
+
+        self.assertIs(node_instance, blueprint_defined.instances[0])
+        self.assertEqual(resources, [
+            {'instances': ['pod_1', 'pod_2'],
+             'namespace': 'default',
+             'api_mapping': None,
+             'definition': {'kind': 'Pod', 'apiVersion': 'v1'}},
+            {'instances': ['file_1'],
+             'namespace': None,
+             'api_mapping': None,
+             'files': [{'resource_path': 'pod.yaml'}]}
+        ])
+
+
+class TestUpdateResourceDefinitions(testtools.TestCase):
+
+    def _node(self, node_id, instance_ids, type_hierarchy=None):
+        return MagicMock(
+            id=node_id,
+            type_hierarchy=type_hierarchy or [
+                'cloudify.nodes.Root',
+                'cloudify.kubernetes.resources.BlueprintDefinedResource'],
+            instances=[MagicMock(id=instance_id)
+                       for instance_id in instance_ids])
+
+    def test_select_node_instances(self):
+        nodes = [
+            self._node('master', ['master_1'], type_hierarchy=[
+                'cloudify.nodes.Root', 'cloudify.kubernetes.nodes.Master']),
+            self._node('pod', ['pod_1', 'pod_2']),
+            self._node('service', ['service_1']),
+            self._node('files', ['files_1'], type_hierarchy=[
+                'cloudify.kubernetes.resources.MultipleFileDefinedResources'
+            ])
+        ]
+
+        def _ids(**kwargs):
+            return [node_instance.id for node_instance
+                    in select_node_instances(nodes, **kwargs)]
+
+        # file defined resources do not apply definition changes
+        self.assertEqual(_ids(), ['pod_1', 'pod_2', 'service_1'])
+        self.assertEqual(_ids(node_ids=['pod']), ['pod_1', 'pod_2'])
+        self.assertEqual(_ids(node_instance_ids=['pod_2', 'files_1']),
+                         ['pod_2'])
+        self.assertEqual(
+            _ids(node_ids=['pod', 'service'],
+                 type_names=['cloudify.nodes.Root'],
+                 node_instance_ids=['pod_1', 'service_1', 'files_1']),
+            ['pod_1', 'service_1'])
+
+    @patch('cloudify_kubernetes.workflows.ctx')
+    def test_update_resource_definitions(self, mock_ctx):
+        mock_ctx.nodes = [self._node('pod', ['pod_1', 'pod_2', 'pod_3'])]
+        sequences = []
+        mock_ctx.graph_mode.return_value.sequence = MagicMock(
+            side_effect=lambda: sequences.append(MagicMock()) or
+            sequences[-1])
+        mock_ctx.local_task = MagicMock(
+            side_effect=lambda function, **kwargs: function)
+
+        update_resource_definitions(
+            "{'spec': {'replicas': 2}}", max_unavailable=2)
+
+        mock_ctx.graph_mode.return_value.execute.assert_called_once_with()
+        # two update lanes
+        self.assertEqual(
+            [len(sequence.add.call_args_list) for sequence in sequences],
+            [2, 1])
+
+        node_instance = mock_ctx.nodes[0].instances[0]
+        self.assertEqual(node_instance.execute_operation.call_args_list, [
+            call('cloudify.interfaces.lifecycle.update',
+                 kwargs={'definitions_additions': {'spec': {'replicas': 2}}}),
+            call('cloudify.interfaces.lifecycle.start')
+        ])
+
+        # progress is reported once per updated node instance
+        for sequence in sequences:
+            for args, _ in sequence.add.call_args_list:
+                args[2]()
+        mock_ctx.logger.info.assert_called_with(
+            'Updated 3 of 3 node instances')
+
+    @patch('cloudify_kubernetes.workflows.ctx')
+    def test_update_resource_definitions_without_filters(self, mock_ctx):
+        master = self._node('master', ['master_1'], type_hierarchy=[
+            'cloudify.nodes.Root', 'cloudify.kubernetes.nodes.Master'])
+        mock_ctx.nodes = [master, self._node('pod', ['pod_1'])]
+
+        update_resource_definitions({'spec': {'replicas': 2}})
+
+        self.assertFalse(master.instances[0].execute_operation.called)
+        self.assertEqual(
+            len(mock_ctx.nodes[1].instances[0].execute_operation
+                .call_args_list), 2)
+        mock_ctx.logger.info.assert_called_with('Updating 1 node instances')
+
+    @patch('cloudify_kubernetes.workflows.ctx')
+    def test_update_resource_definitions_no_instances(self, mock_ctx):
+        mock_ctx.nodes = [self._node('pod', ['pod_1'])]
+
+        self.assertRaises(NonRecoverableError, update_resource_definitions,
+                          {}, node_ids=['service'])
+        self.assertFalse(mock_ctx.graph_mode.called)
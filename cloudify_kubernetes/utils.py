@@ -15,22 +15,97 @@
 #
 
 import yaml
+import hashlib
+import jinja2
+import jinja2.meta
 
 
 from cloudify import ctx
+from cloudify.context import NODE_INSTANCE
+from cloudify.exceptions import NonRecoverableError
 
 from .k8s import (KubernetesApiMapping,
                   KuberentesInvalidDefinitionError,
                   KuberentesMappingNotFoundError,
                   KubernetesResourceDefinition,
                   get_mapping)
-from .workflows import merge_definitions, DEFINITION_ADDITIONS
+from .k8s.cache import (cache_key,
+                        KubernetesLocalCache,
+                        DEFAULT_CACHE_DIRECTORY,
+                        DEFAULT_CACHE_SIZE)
+from .workflows import (definition_merge_patch,
+                        merge_definitions,
+                        DEFINITION_ADDITIONS)
 
 
 NODE_PROPERTY_API_MAPPING = 'api_mapping'
 NODE_PROPERTY_DEFINITION = 'definition'
 NODE_PROPERTY_FILE = 'file'
 NODE_PROPERTY_OPTIONS = 'options'
+NODE_PROPERTY_TEMPLATE_CACHE = 'template_cache'
+
+
+def _template_cache():
+    # files are rendered also by deployment workflows
+    if ctx.type != NODE_INSTANCE:
+        return None
+
+    options = ctx.node.properties.get(NODE_PROPERTY_TEMPLATE_CACHE) or {}
+    if not options.get('enabled'):
+        return None
+
+    cache = KubernetesLocalCache(
+        options.get('size') or DEFAULT_CACHE_SIZE,
+        options.get('directory') or DEFAULT_CACHE_DIRECTORY
+    )
+    if not cache.available:
+        ctx.logger.warning(
+            'Template cache directory {0} is not private to the agent user, '
+            'files are not cached'.format(cache.directory))
+        return None
+    return cache
+
+
+def _render_template(source, template_variables):
+    """Render template the same way as ``download_resource_and_render``
+    (with ``ctx`` added to variables).
+
+    :return: Tuple of rendered content and flag whether template refers
+        to ``ctx`` (its result then depends on node instance).
+    """
+
+    if 'ctx' in template_variables:
+        raise NonRecoverableError(
+            'Key not allowed - a key named ctx is in template_variables')
+
+    environment = jinja2.Environment()
+    template = environment.parse(source.decode('utf-8'))
+    uses_ctx = 'ctx' in jinja2.meta.find_undeclared_variables(template)
+    rendered = environment.from_string(template).render(
+        dict(template_variables, ctx=ctx))
+    return rendered.encode('utf-8'), uses_ctx
+
+
+def _cached_file_content(cache, resource_path, template_variables):
+    """Rendered file content cached by hash of downloaded source and
+    template variables, so changed source (e.g. by deployment update) is
+    never served stale and entries are not shared by name between tenants.
+    Templates referring to ``ctx`` are rendered for each node instance.
+    """
+
+    with open(ctx.download_resource(resource_path), 'rb') as source_file:
+        source = source_file.read()
+
+    rendered_key = cache_key('rendered', hashlib.sha256(source).hexdigest(),
+                             template_variables)
+    content = cache.get(rendered_key)
+    if content is not None:
+        return content
+
+    content, uses_ctx = _render_template(source, template_variables)
+    if not uses_ctx:
+        cache.put(rendered_key, content)
+    return content
 
 
 def _yaml_from_file(
@@ -40,6 +115,12 @@ def _yaml_from_file(
 
     template_variables = template_variables or {}
 
+    cache = _template_cache() if not target_path else None
+    # content of external URL may change, blueprint resources cannot
+    if cache and '://' not in resource_path:
+        return yaml.load(_cached_file_content(
+            cache, resource_path, template_variables))
+
     downloaded_file_path = \
         ctx.download_resource_and_render(
             resource_path,
@@ -99,6 +180,31 @@ def resource_definition_from_blueprint(**kwargs):
     return KubernetesResourceDefinition(**definition)
 
 
+def resource_definition_patch(resource_definition, **kwargs):
+    """Definition of changes made by definition additions only, identified
+    by kind, apiVersion and name of merged resource_definition. None
+    without definition additions (whole definition has to be sent).
+    """
+
+    if DEFINITION_ADDITIONS not in kwargs:
+        return None
+
+    patch = definition_merge_patch(
+        kwargs.get(NODE_PROPERTY_DEFINITION,
+                   ctx.node.properties.get(NODE_PROPERTY_DEFINITION, None)),
+        kwargs[DEFINITION_ADDITIONS])
+    patch['kind'] = resource_definition.kind
+    patch['apiVersion'] = resource_definition.api_version
+    patch['metadata'] = dict(patch.get('metadata') or {},
+                             name=resource_definition.metadata['name'])
+    return KubernetesResourceDefinition(**patch)
+
+
+def definition_from_file(file_resource):
+    """Render file resource and return its definition (dictionary)."""
+    return _yaml_from_file(**file_resource)
+
+
 def resource_definition_from_file(**kwargs):
     file_resource = kwargs.get(
         NODE_PROPERTY_FILE,
@@ -111,5 +217,5 @@ def resource_definition_from_file(**kwargs):
         )
 
     return KubernetesResourceDefinition(
-        **_yaml_from_file(**file_resource)
+        **definition_from_file(file_resource)
     )
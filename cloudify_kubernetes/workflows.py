@@ -15,35 +15,100 @@
 
 import ast
 import collections
+import threading
 
 from cloudify.decorators import workflow
 from cloudify.exceptions import NonRecoverableError
 from cloudify.workflows import ctx
 
 RESOURCE_START_OPERATION = 'cloudify.interfaces.lifecycle.start'
+RESOURCE_DELETE_OWNED_OPERATION = \
+    'cloudify.interfaces.kubernetes.delete_owned_resources'
+RESOURCE_DETECT_DRIFT_OPERATION = \
+    'cloudify.interfaces.kubernetes.detect_drift'
 RESOURCE_UPDATE_OPERATION = 'cloudify.interfaces.lifecycle.update'
 DEFINITION_ADDITIONS = 'definitions_additions'
+BLUEPRINT_DEFINED_RESOURCE_TYPE = \
+    'cloudify.kubernetes.resources.BlueprintDefinedResource'
+FILE_DEFINED_RESOURCE_TYPE = \
+    'cloudify.kubernetes.resources.FileDefinedResource'
+MULTIPLE_FILE_DEFINED_RESOURCES_TYPE = \
+    'cloudify.kubernetes.resources.MultipleFileDefinedResources'
+MANAGED_BY_MASTER_RELATIONSHIP_TYPE = \
+    'cloudify.kubernetes.relationships.managed_by_master'
+# Types which update operation applies definition changes, other nodes
+# (e.g. Master, file defined resources) are never updated by
+# update_resource_definitions
+UPDATABLE_RESOURCE_TYPES = (BLUEPRINT_DEFINED_RESOURCE_TYPE,)
+
+
+def _is_named_list(value):
+    for item in value:
+        if not isinstance(item, dict) or 'name' not in item:
+            return False
+    return True
+
+
+def _merge(old, new):
+    """
+    Merge new into old without modifying them.
+
+    Only dictionaries on the path to changed values are copied, unchanged
+    subtrees are shared with old and changed ones with new. Lists of named
+    objects (e.g. containers) are merged by name, like strategic merge
+    patch does, other values are replaced.
+
+    :return: Tuple of merged value and JSON merge patch turning old into
+        the merged value.
+    """
+
+    if isinstance(old, dict) and isinstance(new, dict):
+        merged, patch = dict(old), {}
+        for k, v in new.iteritems():
+            if k in old and isinstance(v, (dict, list)):
+                merged[k], patch[k] = _merge(old[k], v)
+            else:
+                merged[k] = patch[k] = v
+        return merged, patch
+
+    if isinstance(old, list) and isinstance(new, list) and old and new and \
+            _is_named_list(old) and _is_named_list(new):
+        merged = list(old)
+        indexes = {item['name']: index for index, item in enumerate(old)}
+        for item in new:
+            index = indexes.get(item['name'])
+            if index is None:
+                merged.append(item)
+            else:
+                merged[index] = _merge(old[index], item)[0]
+        # merge patch replaces lists
+        return merged, merged
+
+    return new, new
 
 
 def merge_definitions(old, new):
     """
     Merge two resource definitions, or really any dictionary.
 
+    :param old: The original dictionary, it is not modified.
+    :param new: A dictionary containing changes to old.
+    :return: New dictionary sharing unchanged subtrees with old.
+    """
+
+    return _merge(old, new)[0]
+
+
+def definition_merge_patch(old, new):
+    """
+    JSON merge patch changing only fields set by new, lists of named
+    objects are sent whole, merged with old.
+
     :param old: The original dictionary.
     :param new: A dictionary containing changes to old.
     """
 
-    if isinstance(old, dict):
-        for k, v in new.iteritems():
-            if (k in old and isinstance(old[k], dict) and
-                    isinstance(new[k], collections.Mapping)):
-                old[k] = merge_definitions(
-                    old[k], new[k])
-            else:
-                old[k] = new[k]
-        return old
-    else:
-        return new
+    return _merge(old, new)[1]
 
 
 def execute_node_instance_operation(_node_instance,
@@ -119,16 +184,8 @@ def update_resource_definition(node_instance_id,
             'No such node_instance_id in deployment: {0}.'.format(
                 node_instance_id))
 
-    # Execute start operation to update to
-    # the latest version of the resource definition.
-    node_instance.logger.info(
-        'Executing start in order to get the current state.')
-    execute_node_instance_operation(
-        node_instance, RESOURCE_START_OPERATION)
-    node_instance.logger.info(
-        'Executed start in order to get the current state.')
-
-    # Execute update operation to push the change to Kubernetes.
+    # Execute update operation to push the change to Kubernetes, current
+    # state is read by the operation only when the stored one is outdated.
     node_instance.logger.info(
         'Executing update in order to push the new changes.')
     execute_node_instance_operation(
@@ -137,3 +194,218 @@ def update_resource_definition(node_instance_id,
         _params={DEFINITION_ADDITIONS: resource_definition_changes})
     node_instance.logger.info(
         'Executed update in order to push the new changes.')
+
+
+def _master_id(node):
+    return next(
+        (relationship.target_id for relationship in node.relationships
+         if relationship.is_derived_from(
+             MANAGED_BY_MASTER_RELATIONSHIP_TYPE)),
+        None)
+
+
+def owned_resources_by_master(nodes):
+    """Group kinds and namespaces of blueprint defined resources by their
+    master node.
+
+    :param nodes: nodes of the deployment.
+    :return: Dictionary of master node id to tuple of node instance
+        (which operations are executed on) and list of resources.
+    """
+
+    groups = collections.OrderedDict()
+
+    for node in nodes:
+        if BLUEPRINT_DEFINED_RESOURCE_TYPE not in node.type_hierarchy:
+            continue
+
+        instances = list(node.instances)
+        master_id = _master_id(node)
+        if not instances or master_id is None:
+            continue
+
+        definition = node.properties.get('definition') or {}
+        resource = {
+            # kind of node type is used when definition omits it
+            'kind': definition.get('kind') or node.type,
+            'apiVersion': definition.get('apiVersion'),
+            'namespace':
+                (node.properties.get('options') or {}).get('namespace') or
+                (definition.get('metadata') or {}).get('namespace'),
+            'api_mapping': node.properties.get('api_mapping')
+        }
+
+        _, resources = groups.setdefault(master_id, (instances[0], []))
+        if resource not in resources:
+            resources.append(resource)
+
+    return groups
+
+
+@workflow
+def delete_owned_resources(wait=0, **kwargs):
+    """
+    Deletes Kubernetes resources of blueprint defined nodes created by this
+    deployment, by single collection delete per kind and namespace.
+    Running it before uninstall makes delete operations of the nodes find
+    resources already removed.
+
+    :param wait: Seconds to wait for removal of the resources inside
+        operation before retry is requested.
+    """
+
+    for master_id, (node_instance, resources) in \
+            owned_resources_by_master(ctx.nodes).items():
+        node_instance.logger.info(
+            'Deleting resources managed by {0}: {1}'.format(
+                master_id, resources))
+        execute_node_instance_operation(
+            node_instance,
+            RESOURCE_DELETE_OWNED_OPERATION,
+            _params={'resources': resources, 'wait': wait})
+
+
+def drift_resources_by_master(nodes):
+    """Group definitions of resource nodes with their instances by master
+    node.
+
+    :param nodes: nodes of the deployment.
+    :return: Dictionary of master node id to tuple of node instance
+        (which operations are executed on) and list of resources.
+    """
+
+    groups = collections.OrderedDict()
+
+    for node in nodes:
+        instances = list(node.instances)
+        master_id = _master_id(node)
+        if not instances or master_id is None:
+            continue
+
+        resource = {
+            'instances': [instance.id for instance in instances],
+            'namespace':
+                (node.properties.get('options') or {}).get('namespace'),
+            'api_mapping': node.properties.get('api_mapping')
+        }
+        if BLUEPRINT_DEFINED_RESOURCE_TYPE in node.type_hierarchy:
+            definition = dict(node.properties.get('definition') or {})
+            definition.setdefault('kind', node.type)
+            resource['definition'] = definition
+        elif FILE_DEFINED_RESOURCE_TYPE in node.type_hierarchy:
+            resource['files'] = [node.properties.get('file')]
+        elif MULTIPLE_FILE_DEFINED_RESOURCES_TYPE in node.type_hierarchy:
+            resource['files'] = node.properties.get('files') or []
+        else:
+            continue
+
+        groups.setdefault(master_id, (instances[0], []))[1].append(resource)
+
+    return groups
+
+
+@workflow
+def detect_drift(workers=10, **kwargs):
+    """
+    Compares live Kubernetes resources of the deployment with their
+    definitions. Drift of each node instance is logged and the report is
+    stored in *drift_report* runtime property of the first node instance
+    managed by each master.
+
+    :param workers: Number of concurrent Kubernetes API requests.
+    """
+
+    for master_id, (node_instance, resources) in \
+            drift_resources_by_master(ctx.nodes).items():
+        node_instance.logger.info(
+            'Detecting drift of {0} resources managed by {1}'.format(
+                len(resources), master_id))
+        execute_node_instance_operation(
+            node_instance,
+            RESOURCE_DETECT_DRIFT_OPERATION,
+            _params={'resources': resources, 'workers': workers})
+
+
+def select_node_instances(nodes, node_ids=None, node_instance_ids=None,
+                          type_names=None):
+    """Node instances of blueprint defined resource nodes (which update
+    operation applies definition changes) matching all given filters
+    (empty filter matches every such node).
+    """
+
+    return [
+        node_instance
+        for node in nodes
+        if set(UPDATABLE_RESOURCE_TYPES) & set(node.type_hierarchy)
+        if not node_ids or node.id in node_ids
+        if not type_names or set(type_names) & set(node.type_hierarchy)
+        for node_instance in node.instances
+        if not node_instance_ids or node_instance.id in node_instance_ids
+    ]
+
+
+def _lanes(items, count):
+    """Split items into at most ``count`` lanes executed concurrently."""
+    count = max(1, int(count))
+    return [items[index::count] for index in range(min(count, len(items)))]
+
+
+@workflow
+def update_resource_definitions(resource_definition_changes,
+                                node_ids=None,
+                                node_instance_ids=None,
+                                type_names=None,
+                                max_unavailable=10,
+                                **kwargs):
+    """
+    Updates resource definition of many node instances by single task graph.
+
+    Update and readiness check (start operation) of up to
+    ``max_unavailable`` instances run concurrently, next instance is
+    updated only when previous one is ready again.
+
+    :param resource_definition_changes: A dictionary (or its string
+        representation) with changes of the resource definitions.
+    :param node_ids: Node ids of updated instances.
+    :param node_instance_ids: Ids of updated node instances.
+    :param type_names: Type names of nodes of updated instances.
+    :param max_unavailable: Number of instances updated at the same time.
+    """
+
+    if isinstance(resource_definition_changes, basestring):
+        resource_definition_changes = \
+            ast.literal_eval(resource_definition_changes)
+
+    node_instances = select_node_instances(
+        ctx.nodes, node_ids, node_instance_ids, type_names)
+    if not node_instances:
+        raise NonRecoverableError(
+            'No node instances match node_ids: {0}, node_instance_ids: {1}, '
+            'type_names: {2}.'.format(
+                node_ids, node_instance_ids, type_names))
+
+    logger = ctx.logger
+    lock = threading.Lock()
+    progress = {'updated': 0}
+
+    def _report_progress():
+        with lock:
+            progress['updated'] += 1
+            logger.info('Updated {0} of {1} node instances'.format(
+                progress['updated'], len(node_instances)))
+
+    graph = ctx.graph_mode()
+
+    for lane in _lanes(node_instances, max_unavailable):
+        sequence = graph.sequence()
+        for node_instance in lane:
+            sequence.add(
+                node_instance.execute_operation(
+                    RESOURCE_UPDATE_OPERATION, kwargs={
+                        DEFINITION_ADDITIONS: resource_definition_changes}),
+                node_instance.execute_operation(RESOURCE_START_OPERATION),
+                ctx.local_task(_report_progress,
+                               name='update_resource_definitions_progress'))
+
+    logger.info('Updating {0} node instances'.format(len(node_instances)))
+    return graph.execute()